@@ -5,6 +5,8 @@ from sqlalchemy.orm import Session
 from sqlalchemy import delete, select
 from app.dependencies import get_db
 from app import models
+from app.core.storage import collect_garbage, discard_upload
+from app.infra import cas
 
 router = APIRouter()
 
@@ -24,11 +26,50 @@ def cleanup_runs(
         .scalars()
         .all()
     )
-    if not old_runs:
-        return {"deleted_runs": 0}
-    db.execute(
-        delete(models.BlockQueue).where(models.BlockQueue.pipeline_run_id.in_(old_runs))
+    if old_runs:
+        db.execute(
+            delete(models.BlockQueue).where(models.BlockQueue.pipeline_run_id.in_(old_runs))
+        )
+        # explicit, like the queue: blob refcounts are recounted from artifacts
+        db.execute(
+            delete(models.ArtifactLineage).where(
+                models.ArtifactLineage.pipeline_run_id.in_(old_runs)
+            )
+        )
+        db.execute(delete(models.Artifact).where(models.Artifact.pipeline_run_id.in_(old_runs)))
+        db.execute(delete(models.PipelineRun).where(models.PipelineRun.id.in_(old_runs)))
+        db.commit()
+    # chunked uploads of deleted runs, and ones abandoned before the cutoff
+    stale = (
+        db.execute(
+            select(models.Upload.id).where(
+                models.Upload.pipeline_run_id.in_(old_runs)
+                | (models.Upload.artifact_id.is_(None) & (models.Upload.created_at < cutoff))
+            )
+        )
+        .scalars()
+        .all()
     )
-    db.execute(delete(models.PipelineRun).where(models.PipelineRun.id.in_(old_runs)))
-    db.commit()
-    return {"deleted_runs": len(old_runs)}
+    if stale:
+        db.execute(delete(models.UploadPart).where(models.UploadPart.upload_id.in_(stale)))
+        db.execute(delete(models.Upload).where(models.Upload.id.in_(stale)))
+        db.commit()
+        for upload_id in stale:
+            discard_upload(upload_id)
+    gc = collect_garbage(db)
+    return {
+        "deleted_runs": len(old_runs),
+        "deleted_uploads": len(stale),
+        "deleted_blobs": gc["blobs"],
+        "freed_bytes": gc["bytes"],
+    }
+
+
+@router.get("/admin/blobs/verify")
+def verify_blobs(db: Session = Depends(get_db)):
+    """Rehash every stored blob and list those whose content no longer matches."""
+    digests = db.scalars(select(models.Blob.digest)).all()
+    return {
+        "checked": len(digests),
+        "corrupt": [d for d in digests if not cas.verify(d)],
+    }
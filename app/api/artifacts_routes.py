@@ -1,12 +1,17 @@
 from __future__ import annotations
-from typing import Optional, List
-from fastapi import APIRouter, Depends, HTTPException, Query
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, List, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 
 from app.dependencies import get_db
 from app import models
-from app.api.schemas import ArtifactOut
+from app.api import pagination
+from app.api.schemas import ArtifactOut, ArtifactRowsOut
+from app.infra import cas, colstore, rowindex
+from app.steps._llm_common import output_dir_for_run
 
 router = APIRouter()
 
@@ -14,25 +19,32 @@ router = APIRouter()
 @router.get("/runs/{run_id}/artifacts", response_model=List[ArtifactOut])
 def list_run_artifacts(
     run_id: int,
+    response: Response,
     kind: Optional[str] = Query(default=None),
+    limit: Optional[int] = Query(default=None, ge=1, le=1000),
+    cursor: Optional[str] = Query(default=None),
     db: Session = Depends(get_db),
 ):
+    """
+    Artifacts of the run in id order; all of them, or `limit` at a time with
+    the cursor of the next page in the X-Next-Cursor header.
+    """
     run = db.get(models.PipelineRun, run_id)
     if not run:
         raise HTTPException(status_code=404, detail="Run not found")
-    q = (
-        select(models.Artifact)
-        .where(models.Artifact.pipeline_run_id == run_id)
-        .order_by(models.Artifact.id.asc())
-    )
-    rows = db.execute(q).scalars().all()
+    q = select(models.Artifact).where(models.Artifact.pipeline_run_id == run_id)
     if kind:
-        rows = [
-            r
-            for r in rows
-            if (getattr(r.kind, "value", str(r.kind)) == kind)
-            or (getattr(r.kind, "name", str(r.kind)) == kind)
-        ]
+        try:
+            q = q.where(models.Artifact.kind == models.ArtifactKind(kind))
+        except ValueError:
+            return []
+    key = pagination.SortKey("id", None, models.Artifact.id)
+    if limit is None and not cursor:
+        rows = db.execute(q.order_by(*key.order_by())).scalars().all()
+    else:
+        rows, next_cursor = pagination.page(db, q, key, limit or 1000, cursor=cursor)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
     return [
         ArtifactOut(
             id=r.id,
@@ -41,6 +53,81 @@ def list_run_artifacts(
             kind=r.kind.value if hasattr(r.kind, "value") else str(r.kind),
             uri=r.uri,
             preview_json=r.preview_json,
+            preview=bool(r.preview),
         )
         for r in rows
     ]
+
+
+# rows per /artifacts/{id}/rows page, and pages kept in memory
+MAX_PAGE_ROWS = 1000
+CACHED_PAGES = 256
+
+
+def _sidecar(art: models.Artifact, path: Path) -> Path:
+    """Where the row index of a CSV artifact lives (built on first use)."""
+    recorded = (art.meta_json or {}).get("row_index")
+    if recorded:
+        return Path(recorded)
+    digest = cas.digest_of(art.uri)
+    if digest:
+        return cas.index_path(digest)
+    return output_dir_for_run(art.pipeline_run_id) / f"artifact-{art.id}.rowidx"
+
+
+@lru_cache(maxsize=CACHED_PAGES)
+def _page(
+    path: str, stamp: int, sidecar: str, offset: int, limit: int, columns: Tuple[str, ...]
+) -> Tuple[int, List[str], List[Dict[str, str]]]:
+    # `stamp` (the file's mtime) keys out pages of a rewritten file
+    src = Path(path)
+    if colstore.is_store(src):
+        store = colstore.ColumnStore(src)
+        header = store.columns
+        return store.rows, header, store.window(offset, limit, columns or None)
+    index = rowindex.cached(src, Path(sidecar))
+    header = rowindex.read_header(src, index)
+    rows = rowindex.read_rows(src, index, offset, limit)
+    if columns:
+        rows = [{c: r.get(c) or "" for c in columns} for r in rows]
+    return index.rows, header, rows
+
+
+@router.get("/artifacts/{artifact_id}/rows", response_model=ArtifactRowsOut)
+def artifact_rows(
+    artifact_id: int,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=50, ge=1, le=MAX_PAGE_ROWS),
+    columns: Optional[str] = Query(default=None, description="Comma-separated column names"),
+    db: Session = Depends(get_db),
+):
+    """
+    A window of rows of a CSV or column-store artifact. CSV files are read
+    with one seek through their row-offset index, so any page costs O(limit).
+    """
+    art = db.get(models.Artifact, artifact_id)
+    if not art:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    path = cas.resolve_uri(art.uri or "")
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="File missing")
+    wanted = tuple(c.strip() for c in (columns or "").split(",") if c.strip())
+    stamp = (path / colstore.SCHEMA_FILE if path.is_dir() else path).stat().st_mtime_ns
+    try:
+        total, header, rows = _page(
+            str(path), stamp, str(_sidecar(art, path)), offset, limit, wanted
+        )
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Artifact is not tabular: {e}")
+    unknown = [c for c in wanted if c not in header]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(unknown)}")
+    end = offset + len(rows)
+    return ArtifactRowsOut(
+        artifact_id=art.id,
+        offset=offset,
+        total=total,
+        columns=list(wanted or header),
+        rows=rows,
+        next_offset=end if end < total else None,
+    )
@@ -9,23 +9,49 @@ from app.dependencies import get_db
 from app import models
 from app.core.scheduler import Scheduler
 from app.core.serialization import export_pipeline_spec
+from app.workers.fused import needs_queued
 
 router = APIRouter()
 
 
 class CsvReaderCfg(BaseModel):
-    input_path: str = Field(..., description="Path to input CSV")
+    input_path: str = Field(
+        ..., description="Path to input CSV, a directory or a glob; .gz/.bz2/.xz are decompressed"
+    )
+    workers: Optional[int] = Field(default=None, ge=1)
+    # Only publish rows past the watermark of the previous successful run
+    incremental: bool = Field(default=False)
+    watermark: Optional[str] = Field(default=None, pattern="^(offset|id)$")
+    watermark_column: Optional[str] = Field(default=None)
     delimiter: Optional[str] = Field(default=",", min_length=1, max_length=1)
 
 
-class LlmSentimentCfg(BaseModel):
+class ShardingCfg(BaseModel):
+    # Split a large input at row boundaries into parallel queue items
+    shards: Optional[int] = Field(default=None, ge=1)
+    shard_rows: Optional[int] = Field(default=None, ge=1)
+    shard_bytes: Optional[int] = Field(default=None, ge=1)
+
+
+class LlmSentimentCfg(ShardingCfg):
     model: Optional[str] = Field(default=None)
     temperature: Optional[float] = Field(default=0.0, ge=0.0, le=2.0)
+    checkpoint_every: Optional[int] = Field(default=None, ge=0)
+    segment_rows: Optional[int] = Field(default=None, ge=1)
 
 
-class LlmToxicityCfg(BaseModel):
+class LlmToxicityCfg(ShardingCfg):
     model: Optional[str] = Field(default=None)
     threshold: Optional[float] = Field(default=0.5, ge=0.0, le=1.0)
+    checkpoint_every: Optional[int] = Field(default=None, ge=0)
+    segment_rows: Optional[int] = Field(default=None, ge=1)
+
+
+class LlmMultiClassifyCfg(ShardingCfg):
+    model: Optional[str] = Field(default=None)
+    temperature: Optional[float] = Field(default=0.0, ge=0.0, le=2.0)
+    checkpoint_every: Optional[int] = Field(default=None, ge=0)
+    segment_rows: Optional[int] = Field(default=None, ge=1)
 
 
 class FileWriterCfg(BaseModel):
@@ -34,12 +60,20 @@ class FileWriterCfg(BaseModel):
 
 class CsvWriterCfg(BaseModel):
     output_path: str = Field(...)
+    # Which output to write when the upstream block emits several (LLM_MULTI_CLASSIFY)
+    source_kind: Optional[str] = Field(default=None)
+    # Seconds to wait for a streaming upstream to finish
+    stream_timeout: Optional[int] = Field(default=None, ge=1)
+    # overwrite the output, append the new rows, or upsert them by merge_key
+    write_mode: Optional[str] = Field(default=None, pattern="^(overwrite|append|merge)$")
+    merge_key: Optional[str] = Field(default=None)
 
 
 BLOCK_CFG_MODELS = {
     "CSV_READER": CsvReaderCfg,
     "LLM_SENTIMENT": LlmSentimentCfg,
     "LLM_TOXICITY": LlmToxicityCfg,
+    "LLM_MULTI_CLASSIFY": LlmMultiClassifyCfg,
     "FILE_WRITER": FileWriterCfg,
     "CSV_WRITER": CsvWriterCfg,
 }
@@ -58,14 +92,32 @@ class ImportBlock(BaseModel):
 class ImportEdge(BaseModel):
     from_: str = Field(..., alias="from")
     to: str
+    # "stream": the child consumes sealed output segments while the parent runs
+    mode: str = Field(default="batch")
+
+    @validator("mode")
+    def mode_known(cls, v: str) -> str:
+        v = v.lower()
+        if v not in ("batch", "stream"):
+            raise ValueError("mode must be 'batch' or 'stream'")
+        return v
 
 
 class PipelineImportIn(BaseModel):
     name: str = Field(..., min_length=1, max_length=200)
     replace_if_exists: bool = Field(default=False)
+    # "auto" fuses small pipelines (FUSED_MAX_BLOCKS); "fused" / "queued" force a mode
+    execution: str = Field(default="auto")
     blocks: List[ImportBlock]
     edges: List[ImportEdge]
 
+    @validator("execution")
+    def execution_known(cls, v: str) -> str:
+        v = v.lower()
+        if v not in ("auto", "queued", "fused"):
+            raise ValueError("execution must be 'auto', 'queued' or 'fused'")
+        return v
+
 
 class PipelineImportOut(BaseModel):
     pipeline_id: int
@@ -94,12 +146,29 @@ def _validate_spec(spec: PipelineImportIn) -> List[str]:
                 BLOCK_CFG_MODELS[t](**b.config)
             except Exception as e:
                 errors.append(f"Invalid config for block '{b.name}' ({t}): {e}")
+    if spec.execution == "fused":
+        for b in spec.blocks:
+            if needs_queued(b.config or {}):
+                errors.append(
+                    f"Block '{b.name}' is incremental or appends/merges its output, "
+                    "which fused execution does not support; use execution 'auto' or 'queued'."
+                )
     name_set = set(names)
     for e in spec.edges:
         if e.from_ not in name_set:
             errors.append(f"Edge.from '{e.from_}' does not match any block.")
         if e.to not in name_set:
             errors.append(f"Edge.to '{e.to}' does not match any block.")
+    # only checkpointed LLM steps seal segments, and only CSV_WRITER consumes them
+    types = {b.name: b.type.upper() for b in spec.blocks}
+    for e in spec.edges:
+        if e.mode != "stream" or e.from_ not in types or e.to not in types:
+            continue
+        if not types[e.from_].startswith("LLM_") or types[e.to] != "CSV_WRITER":
+            errors.append(
+                f"Stream edge '{e.from_}' -> '{e.to}' must go from an LLM_* block "
+                f"to a CSV_WRITER (got {types[e.from_]} -> {types[e.to]})."
+            )
     # cycle detection
     adj = {n: [] for n in names}
     for e in spec.edges:
@@ -213,7 +282,9 @@ def import_pipeline(
                 detail=f"Pipeline with name '{parsed.name}' already exists.",
             )
 
-    p = models.Pipeline(name=parsed.name, version=next_version)
+    p = models.Pipeline(
+        name=parsed.name, version=next_version, execution=parsed.execution
+    )
     db.add(p)
     db.flush()
 
@@ -236,6 +307,7 @@ def import_pipeline(
                 pipeline_id=p.id,
                 from_block_id=name_to_id[e.from_],
                 to_block_id=name_to_id[e.to],
+                mode=e.mode,
             )
         )
 
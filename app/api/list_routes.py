@@ -2,18 +2,23 @@ from __future__ import annotations
 from typing import Optional, List, Dict, Any
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func, desc
+from sqlalchemy import select, func
 from app.dependencies import get_db
 from app.core.auth import require_api_key
+from app.api import pagination
 from app import models
 
 router = APIRouter(dependencies=[Depends(require_api_key)])
 
 
-def _paginate(query, count_query, db: Session, page: int, page_size: int):
-    total = db.execute(count_query).scalar_one()
-    items = db.execute(query.limit(page_size).offset((page - 1) * page_size)).all()
-    return total, items
+def _paginate(
+    q, cq, db: Session, key, page: int, page_size: int, cursor: Optional[str], total: str, cache_key
+):
+    """Keyset page of `q` (OFFSET only for a legacy `page` > 1 without a cursor)."""
+    rows, next_cursor = pagination.page(
+        db, q, key, page_size, cursor=cursor, offset=(page - 1) * page_size
+    )
+    return pagination.total(db, cq, total, cache_key), rows, next_cursor
 
 
 @router.get("/runs")
@@ -24,7 +29,12 @@ def list_runs(
     page: int = Query(default=1, ge=1),
     page_size: int = Query(default=20, ge=1, le=200),
     order: str = Query(default="-started_at"),
+    cursor: Optional[str] = Query(default=None),
+    total: str = Query(default="exact", description="exact | cached | none"),
 ):
+    key = pagination.sort_key(
+        order, {"started_at": models.PipelineRun.started_at, "id": None}, models.PipelineRun.id
+    )
     q = select(models.PipelineRun)
     cq = select(func.count(models.PipelineRun.id))
     if status:
@@ -33,39 +43,36 @@ def list_runs(
     if pipeline_id:
         q = q.where(models.PipelineRun.pipeline_id == pipeline_id)
         cq = cq.where(models.PipelineRun.pipeline_id == pipeline_id)
-    if order.lstrip("-") == "started_at":
-        q = q.order_by(
-            desc(models.PipelineRun.started_at)
-            if order.startswith("-")
-            else models.PipelineRun.started_at
-        )
 
-    total, rows = _paginate(q, cq, db, page, page_size)
+    count, rows, next_cursor = _paginate(
+        q, cq, db, key, page, page_size, cursor, total, ("runs", status, pipeline_id)
+    )
 
     return {
         "page": page,
         "page_size": page_size,
-        "total": int(total),
+        "total": count,
+        "next_cursor": next_cursor,
         "items": [
             {
-                "id": r.PipelineRun.id,
-                "pipeline_id": r.PipelineRun.pipeline_id,
+                "id": r.id,
+                "pipeline_id": r.pipeline_id,
                 "status": (
-                    r.PipelineRun.status.value
-                    if hasattr(r.PipelineRun.status, "value")
-                    else str(r.PipelineRun.status)
+                    r.status.value
+                    if hasattr(r.status, "value")
+                    else str(r.status)
                 ),
                 "started_at": (
-                    r.PipelineRun.started_at.isoformat()
-                    if r.PipelineRun.started_at
+                    r.started_at.isoformat()
+                    if r.started_at
                     else None
                 ),
                 "finished_at": (
-                    r.PipelineRun.finished_at.isoformat()
-                    if r.PipelineRun.finished_at
+                    r.finished_at.isoformat()
+                    if r.finished_at
                     else None
                 ),
-                "correlation_id": r.PipelineRun.correlation_id,
+                "correlation_id": r.correlation_id,
             }
             for r in rows
         ],
@@ -79,37 +86,39 @@ def list_pipelines(
     page: int = Query(default=1, ge=1),
     page_size: int = Query(default=20, ge=1, le=200),
     order: str = Query(default="name"),
+    cursor: Optional[str] = Query(default=None),
+    total: str = Query(default="exact", description="exact | cached | none"),
 ):
+    key = pagination.sort_key(
+        order,
+        {"name": models.Pipeline.name, "created_at": models.Pipeline.created_at},
+        models.Pipeline.id,
+    )
     q = select(models.Pipeline)
     cq = select(func.count(models.Pipeline.id))
     if name:
         # basic contains filter (SQLite LIKE)
         q = q.where(models.Pipeline.name.like(f"%{name}%"))
         cq = cq.where(models.Pipeline.name.like(f"%{name}%"))
-    if order == "name":
-        q = q.order_by(models.Pipeline.name.asc())
-    elif order == "-name":
-        q = q.order_by(models.Pipeline.name.desc())
-    elif order == "-created_at":
-        q = q.order_by(models.Pipeline.created_at.desc())
-    else:
-        q = q.order_by(models.Pipeline.created_at.asc())
 
-    total, rows = _paginate(q, cq, db, page, page_size)
+    count, rows, next_cursor = _paginate(
+        q, cq, db, key, page, page_size, cursor, total, ("pipelines", name)
+    )
     return {
         "page": page,
         "page_size": page_size,
-        "total": int(total),
+        "total": count,
+        "next_cursor": next_cursor,
         "items": [
             {
-                "id": p.Pipeline.id,
-                "name": p.Pipeline.name,
-                "version": p.Pipeline.version,
+                "id": p.id,
+                "name": p.name,
+                "version": p.version,
                 "created_at": (
-                    p.Pipeline.created_at.isoformat() if p.Pipeline.created_at else None
+                    p.created_at.isoformat() if p.created_at else None
                 ),
                 "updated_at": (
-                    p.Pipeline.updated_at.isoformat() if p.Pipeline.updated_at else None
+                    p.updated_at.isoformat() if p.updated_at else None
                 ),
             }
             for p in rows
@@ -124,24 +133,21 @@ def list_block_runs(
     page: int = Query(default=1, ge=1),
     page_size: int = Query(default=50, ge=1, le=500),
     order: str = Query(default="id"),
+    cursor: Optional[str] = Query(default=None),
+    total: str = Query(default="exact", description="exact | cached | none"),
 ):
+    key = pagination.sort_key(
+        order, {"id": None, "started_at": models.BlockRun.started_at}, models.BlockRun.id
+    )
     q = select(models.BlockRun).where(models.BlockRun.pipeline_run_id == run_id)
     cq = select(func.count(models.BlockRun.id)).where(
         models.BlockRun.pipeline_run_id == run_id
     )
-    if order == "id":
-        q = q.order_by(models.BlockRun.id.asc())
-    elif order == "-id":
-        q = q.order_by(models.BlockRun.id.desc())
-    elif order == "-started_at":
-        q = q.order_by(models.BlockRun.started_at.desc())
-    else:
-        q = q.order_by(models.BlockRun.started_at.asc())
-    total, rows = _paginate(q, cq, db, page, page_size)
-    # fetch block names
+    count, rows, next_cursor = _paginate(
+        q, cq, db, key, page, page_size, cursor, total, ("block_runs", run_id)
+    )
     out = []
     for br in rows:
-        br = br.BlockRun
         out.append(
             {
                 "id": br.id,
@@ -156,4 +162,10 @@ def list_block_runs(
                 "error_msg": br.error_msg,
             }
         )
-    return {"page": page, "page_size": page_size, "total": int(total), "items": out}
+    return {
+        "page": page,
+        "page_size": page_size,
+        "total": count,
+        "next_cursor": next_cursor,
+        "items": out,
+    }
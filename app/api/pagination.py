@@ -0,0 +1,148 @@
+"""
+Keyset (cursor) pagination for list endpoints. A page is read by seeking
+past the sort key of the previous page's last row, ``WHERE (key, id) >
+(:key, :id) ORDER BY key, id LIMIT n``, which a composite (key, id) index
+answers without scanning the skipped rows, so page 10,000 costs what page
+1 does. Cursors are opaque (url-safe base64 of the last row's key and id,
+tied to the sort order) and returned as ``next_cursor``.
+
+Totals are optional: ``total=exact`` (default) counts on every page,
+``cached`` reuses a count for TOTAL_TTL_SECONDS and ``none`` skips counting.
+At most CACHED_TOTALS counts are kept, least recently used evicted first.
+Without a cursor, ``page`` > 1 still reads with OFFSET for older clients.
+An ``order`` that is not a sort key of the listing is rejected (400).
+"""
+
+from __future__ import annotations
+import base64
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, Select, and_, or_
+from sqlalchemy.orm import Session
+
+TOTALS = ("cached", "exact", "none")
+TOTAL_TTL_SECONDS = 30.0
+# counts kept for total=cached, one per distinct filter combination
+CACHED_TOTALS = 1024
+_totals: "OrderedDict[Any, Tuple[float, int]]" = OrderedDict()
+
+
+@dataclass
+class SortKey:
+    """Order by `column` (None: by id alone), ties broken by `id`."""
+
+    name: str
+    column: Any
+    id: Any
+    descending: bool = False
+
+    def order_by(self) -> List[Any]:
+        if self.column is None:
+            return [self.id.desc() if self.descending else self.id.asc()]
+        # NULLs last when descending, first when ascending, on every database
+        if self.descending:
+            return [self.column.desc().nulls_last(), self.id.desc()]
+        return [self.column.asc().nulls_first(), self.id.asc()]
+
+    def after(self, value: Any, last_id: int) -> Any:
+        """Rows that sort after (value, last_id)."""
+        col, id_ = self.column, self.id
+        if col is None:
+            return id_ < last_id if self.descending else id_ > last_id
+        if self.descending:
+            if value is None:
+                return and_(col.is_(None), id_ < last_id)
+            return or_(col < value, and_(col == value, id_ < last_id), col.is_(None))
+        if value is None:
+            return or_(and_(col.is_(None), id_ > last_id), col.is_not(None))
+        return or_(col > value, and_(col == value, id_ > last_id))
+
+    def value_of(self, row: Any) -> Any:
+        return None if self.column is None else getattr(row, self.column.key)
+
+
+def sort_key(order: str, keys: Dict[str, Any], id_column: Any) -> SortKey:
+    """SortKey of an ``order`` parameter ("name" or "-name") among `keys`."""
+    name = order.lstrip("-")
+    if name not in keys:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown order '{order}' (one of {', '.join(sorted(keys))})"
+        )
+    return SortKey(order, keys[name], id_column, descending=order.startswith("-"))
+
+
+def encode_cursor(key: SortKey, row: Any) -> str:
+    value = key.value_of(row)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([key.name, value, row.id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(key: SortKey, cursor: str) -> Tuple[Any, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        order, value, last_id = json.loads(raw)
+        if value is not None and key.column is not None and isinstance(key.column.type, DateTime):
+            value = datetime.fromisoformat(value)
+        last_id = int(last_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if order != key.name:
+        raise HTTPException(status_code=400, detail="Cursor was issued for another order")
+    return value, last_id
+
+
+def page(
+    db: Session,
+    q: Select,
+    key: SortKey,
+    limit: int,
+    cursor: Optional[str] = None,
+    offset: int = 0,
+) -> Tuple[List[Any], Optional[str]]:
+    """One page of entities of `q` and the cursor of the next (None on the last)."""
+    q = q.order_by(*key.order_by()).limit(limit + 1)
+    if cursor:
+        q = q.where(key.after(*decode_cursor(key, cursor)))
+    elif offset:
+        q = q.offset(offset)
+    rows = list(db.scalars(q))
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key, rows[-1])
+
+
+def total(db: Session, count_query: Select, mode: str, cache_key: Sequence[Any]) -> Optional[int]:
+    """Row count of a listing per the ``total`` parameter (see module docstring)."""
+    if mode not in TOTALS:
+        raise HTTPException(status_code=400, detail=f"total must be one of {', '.join(TOTALS)}")
+    if mode == "none":
+        return None
+    key = tuple(cache_key)
+    now = time.monotonic()
+    hit = _totals.get(key)
+    if mode == "cached" and hit and now - hit[0] < TOTAL_TTL_SECONDS:
+        _totals.move_to_end(key)
+        return hit[1]
+    n = int(db.execute(count_query).scalar_one())
+    _remember(key, now, n)
+    return n
+
+
+def _remember(key: Any, now: float, n: int) -> None:
+    _totals[key] = (now, n)
+    _totals.move_to_end(key)
+    # drop from the least recently used end: expired counts, then any excess
+    while _totals:
+        oldest, (at, _) = next(iter(_totals.items()))
+        if now - at < TOTAL_TTL_SECONDS and len(_totals) <= CACHED_TOTALS:
+            break
+        del _totals[oldest]
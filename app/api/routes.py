@@ -1,23 +1,60 @@
 from __future__ import annotations
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
 from app.dependencies import get_db
 from app import models
 from app.core.orchestrator import Orchestrator
+from app.infra import sampling
 from app.api.schemas import RunOut, RunStartResponse
 
 router = APIRouter()
 
 
+def _sample_spec(
+    sample: Optional[float], method: str, by: Optional[str], seed: int
+) -> Optional[Dict[str, Any]]:
+    if sample is None:
+        return None
+    if sample <= 0:
+        raise HTTPException(status_code=400, detail="sample must be > 0")
+    if method not in sampling.METHODS:
+        raise HTTPException(
+            status_code=400, detail=f"method must be one of {', '.join(sampling.METHODS)}"
+        )
+    if method == "stratified" and not by:
+        raise HTTPException(status_code=400, detail="stratified sampling requires 'by'")
+    spec: Dict[str, Any] = {"method": method, "by": by, "seed": seed}
+    if sample < 1:
+        spec["fraction"] = sample
+    elif sample == int(sample):
+        spec["rows"] = int(sample)
+    else:
+        raise HTTPException(
+            status_code=400, detail="sample is a row count (>= 1) or a fraction (< 1)"
+        )
+    return spec
+
+
 @router.post("/pipelines/{pipeline_id}/run", response_model=RunStartResponse)
-def start_pipeline_run(pipeline_id: int, db: Session = Depends(get_db)):
+def start_pipeline_run(
+    pipeline_id: int,
+    sample: Optional[float] = Query(
+        default=None, description="Preview run on N rows, or on a fraction (< 1) of them"
+    ),
+    method: str = Query(default="reservoir", description="reservoir | stratified"),
+    by: Optional[str] = Query(default=None, description="Column to stratify on"),
+    seed: int = Query(default=0),
+    db: Session = Depends(get_db),
+):
     p = db.get(models.Pipeline, pipeline_id)
     if not p:
         raise HTTPException(status_code=404, detail="Pipeline not found")
 
     orch = Orchestrator(db)
-    run = orch.start_run(pipeline_id)
+    run = orch.start_run(pipeline_id, sample=_sample_spec(sample, method, by, seed))
 
     enqueued_roots = (
         db.query(models.BlockQueue)
@@ -32,6 +69,7 @@ def start_pipeline_run(pipeline_id: int, db: Session = Depends(get_db)):
         correlation_id=run.correlation_id,
         started_at=run.started_at,
         finished_at=run.finished_at,
+        sample=run.sample_json,
     )
     return RunStartResponse(run=out, enqueued_roots=enqueued_roots)
 
@@ -48,4 +86,5 @@ def get_run(run_id: int, db: Session = Depends(get_db)):
         correlation_id=run.correlation_id,
         started_at=run.started_at,
         finished_at=run.finished_at,
+        sample=run.sample_json,
     )
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 from pydantic import BaseModel
 from enum import Enum
@@ -19,6 +19,8 @@ class RunOut(BaseModel):
     correlation_id: str
     started_at: datetime | None = None
     finished_at: datetime | None = None
+    # set on sampled preview runs
+    sample: dict | None = None
 
 
 class RunStartResponse(BaseModel):
@@ -33,6 +35,17 @@ class ArtifactOut(BaseModel):
     kind: str
     uri: str
     preview_json: dict | None = None
+    preview: bool = False
+
+
+class ArtifactRowsOut(BaseModel):
+    artifact_id: int
+    offset: int
+    total: int
+    columns: List[str]
+    rows: List[Dict[str, str]]
+    # offset of the next page; None on the last one
+    next_offset: int | None = None
 
 
 class GraphNodeOut(BaseModel):
@@ -1,7 +1,7 @@
 from __future__ import annotations
-from typing import Optional, Dict, Any
+import uuid
+from typing import Optional, Dict, Any, List
 from pathlib import Path
-from urllib.parse import urlparse, unquote
 from fastapi import (
     APIRouter,
     Depends,
@@ -9,23 +9,38 @@ from fastapi import (
     File,
     Form,
     HTTPException,
-    Response,
     Query,
+    Request,
+    Header,
 )
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 from app.dependencies import get_db
 from app import models
 from app.core.storage import (
+    PartWriter,
+    artifact_file,
+    assemble_upload,
+    discard_upload,
+    part_path,
+    safe_name,
     save_upload,
-    open_local_uri,
+    sign_for_bundle,
     sign_for_download,
     verify_signature,
 )
 from app.core.config import settings
+from app.infra import bundle, cas
+from app.infra.ranges import accepts_encoding, file_response, stream_response
 
 router = APIRouter()
 
+# chunked uploads: part numbers run from 1 to MAX_PARTS
+MAX_PARTS = 10000
+
 
 @router.post("/runs/{run_id}/artifacts/upload")
 async def upload_artifact(
@@ -39,13 +54,16 @@ async def upload_artifact(
     run = db.get(models.PipelineRun, run_id)
     if not run:
         raise HTTPException(status_code=404, detail="Run not found")
-    uri, size = save_upload(run_id, block_run_id, file, filename=filename)
+    # blocking file I/O stays off the event loop
+    uri, size = await run_in_threadpool(save_upload, file)
+    name = safe_name(filename or file.filename or "file.bin")
     art = models.Artifact(
         pipeline_run_id=run_id,
         block_run_id=block_run_id,
         uri=uri,
         kind=models.ArtifactKind[kind] if kind else models.ArtifactKind.GENERIC,
         preview_json={"size": size, "filename": filename or file.filename},
+        meta_json=cas.describe(name, cas.digest_of(uri), size),
     )
     db.add(art)
     db.commit()
@@ -53,6 +71,176 @@ async def upload_artifact(
     return {"id": art.id, "uri": art.uri, "size": size}
 
 
+class UploadInit(BaseModel):
+    filename: str = "file.bin"
+    kind: Optional[str] = None
+    block_run_id: Optional[int] = None
+
+
+class UploadComplete(BaseModel):
+    # part numbers in order; default: every part received, which must be 1..N
+    parts: Optional[List[int]] = None
+    # sha256 of the whole file, checked after assembly
+    sha256: Optional[str] = None
+
+
+def _open_upload(db: Session, upload_id: str) -> models.Upload:
+    up = db.get(models.Upload, upload_id)
+    if not up:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if up.artifact_id is not None:
+        raise HTTPException(status_code=409, detail="Upload already completed")
+    return up
+
+
+def _upload_parts(db: Session, upload_id: str) -> List[models.UploadPart]:
+    return list(
+        db.scalars(
+            select(models.UploadPart)
+            .where(models.UploadPart.upload_id == upload_id)
+            .order_by(models.UploadPart.number)
+        )
+    )
+
+
+def _upload_status(db: Session, up: models.Upload) -> Dict[str, Any]:
+    parts = _upload_parts(db, up.id)
+    return {
+        "upload_id": up.id,
+        "run_id": up.pipeline_run_id,
+        "filename": up.filename,
+        "kind": up.kind.value,
+        "artifact_id": up.artifact_id,
+        "parts": [{"number": p.number, "size": p.size, "sha256": p.sha256} for p in parts],
+        "bytes": sum(p.size for p in parts),
+    }
+
+
+def _record_part(db: Session, upload_id: str, number: int, size: int, digest: str) -> None:
+    part = db.scalars(
+        select(models.UploadPart).where(
+            models.UploadPart.upload_id == upload_id, models.UploadPart.number == number
+        )
+    ).first()
+    if part is None:
+        part = models.UploadPart(upload_id=upload_id, number=number)
+    part.size, part.sha256 = size, digest
+    db.add(part)
+    db.commit()
+
+
+@router.post("/runs/{run_id}/uploads")
+def initiate_upload(run_id: int, body: UploadInit, db: Session = Depends(get_db)):
+    """Start a chunked upload; PUT its parts, then POST .../complete."""
+    if not db.get(models.PipelineRun, run_id):
+        raise HTTPException(status_code=404, detail="Run not found")
+    if body.kind and body.kind not in models.ArtifactKind.__members__:
+        raise HTTPException(status_code=400, detail=f"Unknown artifact kind: {body.kind}")
+    up = models.Upload(
+        id=uuid.uuid4().hex,
+        pipeline_run_id=run_id,
+        block_run_id=body.block_run_id,
+        kind=models.ArtifactKind[body.kind] if body.kind else models.ArtifactKind.GENERIC,
+        filename=safe_name(body.filename),
+    )
+    db.add(up)
+    db.commit()
+    return _upload_status(db, up)
+
+
+@router.put("/uploads/{upload_id}/parts/{number}")
+async def upload_part(
+    upload_id: str,
+    number: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    x_checksum_sha256: Optional[str] = Header(default=None),
+):
+    """
+    Store one part from the raw request body. Parts may arrive in any order
+    and in parallel; re-sending a part replaces it. With X-Checksum-SHA256
+    the part is rejected (400) unless its content hashes to that value.
+    """
+    if not 1 <= number <= MAX_PARTS:
+        raise HTTPException(status_code=400, detail=f"Part number must be 1..{MAX_PARTS}")
+    await run_in_threadpool(_open_upload, db, upload_id)
+    writer = await run_in_threadpool(PartWriter, upload_id, number)
+    buf = bytearray()
+    try:
+        async for chunk in request.stream():
+            buf += chunk
+            if len(buf) >= cas.CHUNK:
+                await run_in_threadpool(writer.write, bytes(buf))
+                buf.clear()
+        if buf:
+            await run_in_threadpool(writer.write, bytes(buf))
+        digest = await run_in_threadpool(writer.close, x_checksum_sha256)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        await run_in_threadpool(writer.abort)
+        raise
+    await run_in_threadpool(_record_part, db, upload_id, number, writer.size, digest)
+    return {"number": number, "size": writer.size, "sha256": digest}
+
+
+@router.get("/uploads/{upload_id}")
+def get_upload(upload_id: str, db: Session = Depends(get_db)):
+    """Parts received so far, so an interrupted client re-sends only the rest."""
+    up = db.get(models.Upload, upload_id)
+    if not up:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return _upload_status(db, up)
+
+
+@router.post("/uploads/{upload_id}/complete")
+def complete_upload(upload_id: str, body: UploadComplete, db: Session = Depends(get_db)):
+    up = _open_upload(db, upload_id)
+    received = {p.number: p for p in _upload_parts(db, upload_id)}
+    numbers = body.parts or sorted(received)
+    if not numbers:
+        raise HTTPException(status_code=400, detail="Upload has no parts")
+    expected = numbers if body.parts else range(1, max(numbers) + 1)
+    missing = [n for n in expected if n not in received]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing parts: {missing}")
+    for n in numbers:
+        path = part_path(upload_id, n)
+        if not path.is_file() or path.stat().st_size != received[n].size:
+            raise HTTPException(status_code=409, detail=f"Part {n} changed on disk; re-send it")
+    uri, size = assemble_upload(upload_id, numbers)
+    digest = cas.digest_of(uri)
+    if body.sha256 and body.sha256.lower() != digest:
+        raise HTTPException(status_code=400, detail=f"Checksum mismatch: got sha256 {digest}")
+    art = models.Artifact(
+        pipeline_run_id=up.pipeline_run_id,
+        block_run_id=up.block_run_id,
+        uri=uri,
+        kind=up.kind,
+        preview_json={"size": size, "filename": up.filename},
+        meta_json={**cas.describe(up.filename, digest, size), "parts": len(numbers)},
+    )
+    db.add(art)
+    db.flush()
+    up.artifact_id = art.id
+    for part in received.values():
+        db.delete(part)
+    db.commit()
+    discard_upload(upload_id)
+    return {"id": art.id, "uri": art.uri, "size": size}
+
+
+@router.delete("/uploads/{upload_id}")
+def abort_upload(upload_id: str, db: Session = Depends(get_db)):
+    up = _open_upload(db, upload_id)
+    for part in _upload_parts(db, upload_id):
+        db.delete(part)
+    db.delete(up)
+    db.commit()
+    discard_upload(upload_id)
+    return {"aborted": upload_id}
+
+
 @router.get("/runs/{run_id}/artifacts")
 def list_artifacts(run_id: int, db: Session = Depends(get_db)):
     rows = (
@@ -74,6 +262,100 @@ def list_artifacts(run_id: int, db: Session = Depends(get_db)):
     ]
 
 
+@router.get("/runs/{run_id}/artifacts/bundle/sign")
+def sign_run_bundle(run_id: int, ttl: int = Query(default=None)):
+    exp = None
+    if ttl is not None:
+        import time
+
+        exp = int(time.time()) + int(ttl)
+    return {"url": sign_for_bundle(run_id, exp_ts=exp)}
+
+
+@router.get("/runs/{run_id}/artifacts/bundle")
+def download_run_bundle(
+    run_id: int,
+    format: str = Query(default="zip", description="zip | tar.gz"),
+    db: Session = Depends(get_db),
+    exp: Optional[int] = None,
+    sig: Optional[str] = None,
+):
+    """
+    Every artifact of the run in one streamed archive, one folder per
+    block, plus manifest.json (hashes, sizes and lineage of each member).
+    """
+    run = db.get(models.PipelineRun, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run not found")
+    if format not in bundle.FORMATS:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown format (use {' | '.join(bundle.FORMATS)})"
+        )
+    if settings.SIGNED_URLS_REQUIRED:
+        if not (exp and sig and verify_signature(f"run-{run_id}", int(exp), sig)):
+            raise HTTPException(status_code=401, detail="Invalid or expired signature")
+
+    arts = db.scalars(
+        select(models.Artifact)
+        .where(models.Artifact.pipeline_run_id == run_id)
+        .order_by(models.Artifact.id)
+    ).all()
+    blocks = dict(
+        db.execute(
+            select(models.Block.id, models.Block.name).where(
+                models.Block.pipeline_id == run.pipeline_id
+            )
+        ).all()
+    )
+    inputs: Dict[int, List[int]] = {}
+    for art_id, input_id in db.execute(
+        select(models.ArtifactLineage.artifact_id, models.ArtifactLineage.input_artifact_id)
+        .where(models.ArtifactLineage.pipeline_run_id == run_id)
+        .order_by(models.ArtifactLineage.input_artifact_id)
+    ):
+        inputs.setdefault(art_id, []).append(input_id)
+
+    # resolve every file before streaming: the session closes with the request
+    members: List[bundle.Member] = []
+    missing: List[int] = []
+    names = set()
+    for art in arts:
+        found = artifact_file(art)
+        if found is None:
+            missing.append(art.id)
+            continue
+        path, filename = found
+        block = blocks.get(art.block_id)
+        folder = safe_name(block) if block else "uploads"
+        name = f"{folder}/{filename}"
+        if name in names:
+            name = f"{folder}/{art.id}-{filename}"
+        names.add(name)
+        entry = {
+            "id": art.id,
+            "kind": art.kind.value,
+            "block": block,
+            "uri": art.uri,
+            "inputs": inputs.get(art.id, []),
+            "preview": bool(art.preview),
+        }
+        members.append(bundle.Member(name, path, entry))
+    manifest = {
+        "run_id": run.id,
+        "pipeline_id": run.pipeline_id,
+        "status": run.status.value,
+        "started_at": run.started_at,
+        "finished_at": run.finished_at,
+        "missing": missing,
+    }
+    filename = f"run-{run.id}.{format}"
+    return StreamingResponse(
+        bundle.stream(members, manifest, format),
+        media_type=bundle.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @router.get("/artifacts/{artifact_id}/sign")
 def sign_artifact_download(artifact_id: int, ttl: int = Query(default=None)):
     exp = None
@@ -84,9 +366,10 @@ def sign_artifact_download(artifact_id: int, ttl: int = Query(default=None)):
     return {"url": sign_for_download(artifact_id, exp_ts=exp)}
 
 
-@router.get("/artifacts/{artifact_id}/download")
+@router.api_route("/artifacts/{artifact_id}/download", methods=["GET", "HEAD"])
 def download_artifact(
     artifact_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     exp: Optional[int] = None,
     sig: Optional[str] = None,
@@ -98,21 +381,36 @@ def download_artifact(
     if settings.SIGNED_URLS_REQUIRED:
         if not (exp and sig and verify_signature(artifact_id, int(exp), sig)):
             raise HTTPException(status_code=401, detail="Invalid or expired signature")
-    # Support local:// scheme, file:// URIs, and plain filesystem paths
-    uri = art.uri or ""
-    if uri.startswith("local://"):
-        path = open_local_uri(uri)
-    elif uri.startswith("file://"):
-        parsed = urlparse(uri)
-        path = Path(unquote(parsed.path)).expanduser()
-    else:
-        # Treat as a direct filesystem path (absolute or relative)
-        path = Path(uri).expanduser()
-    if not path.exists():
+    digest = cas.digest_of(art.uri)
+    found = cas.fetch(digest) if digest else None
+    if found and found[1]:
+        name = Path((art.meta_json or {}).get("path") or digest).name
+        vary = {"Vary": "Accept-Encoding"}
+        if accepts_encoding(request.headers.get("accept-encoding"), found[1]):
+            # compressed blob: send its bytes as they are stored
+            return file_response(
+                request,
+                found[0],
+                name,
+                etag=f'"{digest}-{found[1]}"',
+                extra_headers={**vary, "Content-Encoding": found[1]},
+            )
+        plain = cas.plain_path(digest, decompress=False)
+        if not plain.exists() and not request.headers.get("range"):
+            # decompressed as it is sent; only range requests need a plain copy
+            return stream_response(
+                request,
+                lambda: cas.open_plain(digest),
+                name,
+                etag=f'"{digest}"',
+                size=(art.meta_json or {}).get("bytes"),
+                extra_headers=vary,
+            )
+        return file_response(
+            request, cas.plain_path(digest), name, etag=f'"{digest}"', extra_headers=vary
+        )
+    found = artifact_file(art)
+    if found is None:
         raise HTTPException(status_code=404, detail="File missing")
-    data = path.read_bytes()
-    return Response(
-        content=data,
-        media_type="application/octet-stream",
-        headers={"Content-Disposition": f"attachment; filename={path.name}"},
-    )
+    path, name = found
+    return file_response(request, path, name, etag=f'"{digest}"' if digest else None)
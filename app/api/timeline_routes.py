@@ -1,85 +1,135 @@
 from __future__ import annotations
-from typing import List, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException
+import heapq
+import json
+from datetime import datetime, timezone
+from typing import Iterator, List, Dict, Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import select, asc
+from sqlalchemy import select, asc, and_
 from app.dependencies import get_db
+from app.infra.db import SessionLocal
 from app import models
 
 router = APIRouter()
 
+# log rows fetched per round trip while streaming
+BATCH_ROWS = 1000
 
-@router.get("/runs/{run_id}/timeline")
-def get_run_timeline(
-    run_id: int, db: Session = Depends(get_db)
-) -> List[Dict[str, Any]]:
-    run = db.get(models.PipelineRun, run_id)
-    if not run:
-        raise HTTPException(status_code=404, detail="Run not found")
 
-    events: List[Dict[str, Any]] = []
-    if run.started_at:
-        events.append(
-            {
-                "ts": run.started_at.isoformat(),
-                "type": "run_started",
-                "run_id": run.id,
-                "status": (
-                    run.status.value
-                    if hasattr(run.status, "value")
-                    else str(run.status)
-                ),
-            }
-        )
-    logs = (
-        db.execute(
-            select(models.LogRecord)
-            .where(models.LogRecord.pipeline_run_id == run.id)
-            .order_by(asc(models.LogRecord.created_at), asc(models.LogRecord.id))
+def _status(run: models.PipelineRun) -> str:
+    return run.status.value if hasattr(run.status, "value") else str(run.status)
+
+
+def _run_events(run: models.PipelineRun, since: Optional[datetime]) -> List[Dict[str, Any]]:
+    events = []
+    for ts, kind in ((run.started_at, "run_started"), (run.finished_at, "run_finished")):
+        if ts and (since is None or ts >= since):
+            events.append(
+                {"ts": ts.isoformat(), "type": kind, "run_id": run.id, "status": _status(run)}
+            )
+    return events
+
+
+def _log_events(
+    db: Session, run: models.PipelineRun, since: Optional[datetime], limit: Optional[int]
+) -> Iterator[Dict[str, Any]]:
+    """
+    The run's log records in (created_at, id) order, with the name of the
+    block in their extra["block_id"], from one query read BATCH_ROWS at a time.
+    """
+    log = models.LogRecord
+    block = models.Block
+    q = (
+        select(
+            log.id,
+            log.created_at,
+            log.message,
+            log.level,
+            log.worker_id,
+            log.block_run_id,
+            log.extra_json,
+            block.name,
         )
-        .scalars()
-        .all()
-    )
-    brs = (
-        db.execute(
-            select(models.BlockRun).where(models.BlockRun.pipeline_run_id == run.id)
+        .outerjoin(
+            block,
+            and_(
+                block.id == log.extra_json["block_id"].as_integer(),
+                block.pipeline_id == run.pipeline_id,
+            ),
         )
-        .scalars()
-        .all()
+        .where(log.pipeline_run_id == run.id)
+        .order_by(asc(log.created_at), asc(log.id))
     )
-    block_name = {}
-    for br in brs:
-        b = db.get(models.Block, br.block_id)
-        if b:
-            block_name[br.block_id] = b.name
-
-    for l in logs:
-        ev = {
-            "ts": l.created_at.isoformat() if l.created_at else None,
-            "type": l.message,
-            "level": l.level,
-            "worker_id": l.worker_id,
-            "block_run_id": l.block_run_id,
-            "block_name": None,
-            "extra": l.extra_json or {},
+    if since is not None:
+        q = q.where(log.created_at >= since)
+    if limit is not None:
+        q = q.limit(limit)
+    for row in db.execute(q.execution_options(yield_per=BATCH_ROWS)):
+        yield {
+            "id": row.id,
+            "ts": row.created_at.isoformat() if row.created_at else None,
+            "type": row.message,
+            "level": row.level,
+            "worker_id": row.worker_id,
+            "block_run_id": row.block_run_id,
+            "block_name": row.name,
+            "extra": row.extra_json or {},
         }
-        if l.extra_json and "block_id" in l.extra_json:
-            ev["block_name"] = block_name.get(l.extra_json["block_id"])
-        events.append(ev)
-
-    if run.finished_at:
-        events.append(
-            {
-                "ts": run.finished_at.isoformat(),
-                "type": "run_finished",
-                "run_id": run.id,
-                "status": (
-                    run.status.value
-                    if hasattr(run.status, "value")
-                    else str(run.status)
-                ),
-            }
-        )
 
-    events.sort(key=lambda e: (e.get("ts") or "", e.get("type") or ""))
-    return events
+
+def _timeline(
+    db: Session, run: models.PipelineRun, since: Optional[datetime], limit: Optional[int]
+) -> Iterator[Dict[str, Any]]:
+    """Run and log events merged by timestamp; `limit` caps the log events."""
+    if since is not None and since.tzinfo is not None:
+        # stored timestamps are naive UTC
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return heapq.merge(
+        _run_events(run, since),
+        _log_events(db, run, since, limit),
+        key=lambda e: (e.get("ts") or "", e.get("type") or ""),
+    )
+
+
+def _get_run(db: Session, run_id: int) -> models.PipelineRun:
+    run = db.get(models.PipelineRun, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return run
+
+
+@router.get("/runs/{run_id}/timeline")
+def get_run_timeline(
+    run_id: int,
+    since: Optional[datetime] = Query(default=None),
+    limit: Optional[int] = Query(default=None, ge=1),
+    db: Session = Depends(get_db),
+) -> List[Dict[str, Any]]:
+    return list(_timeline(db, _get_run(db, run_id), since, limit))
+
+
+@router.get("/runs/{run_id}/timeline/stream")
+def stream_run_timeline(
+    run_id: int,
+    since: Optional[datetime] = Query(default=None),
+    limit: Optional[int] = Query(default=None, ge=1),
+    db: Session = Depends(get_db),
+):
+    """
+    The timeline as NDJSON (one event per line), written while the log rows
+    are read, so long runs are neither held in memory nor wait on a full read.
+    """
+    _get_run(db, run_id)
+
+    def lines() -> Iterator[bytes]:
+        # the request's session is closed once the response starts
+        session = SessionLocal()
+        try:
+            run = session.get(models.PipelineRun, run_id)
+            for event in _timeline(session, run, since, limit):
+                yield (json.dumps(event, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        finally:
+            session.close()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -16,6 +16,23 @@ class Settings(BaseSettings):
     # Retry defaults
     MAX_ATTEMPTS_DEFAULT: int = Field(default=1)
     BACKOFF_BASE_SECONDS: int = Field(default=0)
+    # LLM steps persist progress every N rows (0 = only when an attempt fails)
+    CHECKPOINT_EVERY_ROWS: int = Field(default=1000)
+    # Rows per record batch handed to batch steps
+    STEP_BATCH_ROWS: int = Field(default=256)
+    # Processes CSV_READER uses to decode multi-file/compressed inputs (0 = one per CPU)
+    CSV_READER_WORKERS: int = Field(default=0)
+    # Format of artifacts passed between blocks: csv | colstore (writers always emit CSV)
+    INTERMEDIATE_FORMAT: str = Field(default="csv")
+
+    # Streaming edges: producer seals a segment every N rows; consumers poll
+    STREAM_SEGMENT_ROWS: int = Field(default=500)
+    STREAM_POLL_SECONDS: float = Field(default=0.5)
+    STREAM_TIMEOUT_SECONDS: int = Field(default=3600)
+
+    # Fused execution of small pipelines ("auto" mode); 0 disables
+    FUSED_MAX_BLOCKS: int = Field(default=0)
+    FUSED_MAX_INPUT_BYTES: int = Field(default=1_000_000)
 
     # Notifications
     NOTIFY_WEBHOOK_URL: str | None = Field(default=None)
@@ -32,6 +49,28 @@ class Settings(BaseSettings):
     SECRET_KEY: str = Field(default="dev-secret")
     SIGNED_URL_TTL_SECONDS: int = Field(default=300)
     SIGNED_URLS_REQUIRED: bool = Field(default=False)
+    # blob store codec: none | gzip | zstd (zstd needs the zstandard package,
+    # else gzip is used); see app.infra.cas
+    ARTIFACT_CODEC: str = Field(default="none")
+    # bytes of decompressed copies kept for readers that seek (least recently
+    # read go first; 0 = no bound)
+    PLAIN_CACHE_MAX_BYTES: int = Field(default=256 * 1024 * 1024)
+    # where blobs are kept besides ARTIFACTS_DIR: local | s3 (see app.infra.objectstore)
+    STORAGE_BACKEND: str = Field(default="local")
+    S3_BUCKET: str = Field(default="artifacts")
+    S3_PREFIX: str = Field(default="")
+    # S3-compatible endpoint; file:///<dir> selects the filesystem emulator
+    S3_ENDPOINT_URL: str | None = Field(default=None)
+    S3_REGION: str | None = Field(default=None)
+    # multipart part / ranged GET size (S3 wants >= 5 MiB) and parallel transfers
+    S3_PART_SIZE: int = Field(default=8 * 1024 * 1024)
+    S3_TRANSFER_THREADS: int = Field(default=4)
+    # with a shared backend: bytes of fetched blobs and read-cache copies a
+    # node keeps (least recently used go first; 0 = no bound)
+    LOCAL_CACHE_MAX_BYTES: int = Field(default=0)
+    # with a shared backend: seconds a child block waits for the worker that
+    # ran its parent (and has its output on disk) before any worker may take it
+    LOCALITY_WINDOW_SECONDS: float = Field(default=2.0)
 
     # CORS (for UI)
     CORS_ALLOW_ORIGINS: list[str] = Field(
@@ -0,0 +1,83 @@
+from __future__ import annotations
+from typing import List, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+
+
+def parent_outputs(
+    db: Session,
+    run_id: int,
+    block_id: int,
+    kind: Optional[models.ArtifactKind] = None,
+) -> List[models.Artifact]:
+    """
+    Artifacts the parents of `block_id` produced in this run (optionally of
+    one `kind`), oldest first. Served by ix_artifacts_run_block_kind.
+    """
+    stmt = (
+        select(models.Artifact)
+        .join(models.Edge, models.Edge.from_block_id == models.Artifact.block_id)
+        .where(
+            models.Edge.to_block_id == block_id,
+            models.Artifact.pipeline_run_id == run_id,
+        )
+        .order_by(models.Artifact.id)
+    )
+    if kind is not None:
+        stmt = stmt.where(models.Artifact.kind == kind)
+    return list(db.execute(stmt).scalars())
+
+
+def block_outputs(
+    db: Session, run_id: int, block_id: int, kind: models.ArtifactKind
+) -> List[models.Artifact]:
+    """Artifacts of `kind` that `block_id` produced in this run."""
+    return list(
+        db.execute(
+            select(models.Artifact)
+            .where(
+                models.Artifact.pipeline_run_id == run_id,
+                models.Artifact.block_id == block_id,
+                models.Artifact.kind == kind,
+            )
+            .order_by(models.Artifact.id)
+        ).scalars()
+    )
+
+
+def record(
+    db: Session, artifact: models.Artifact, inputs: Sequence[models.Artifact]
+) -> None:
+    """Record that `artifact` was computed from `inputs` (flushes to get ids)."""
+    if not inputs:
+        return
+    db.flush()
+    seen = set()
+    for src in inputs:
+        if src.id in seen or src.id == artifact.id:
+            continue
+        seen.add(src.id)
+        db.add(
+            models.ArtifactLineage(
+                pipeline_run_id=artifact.pipeline_run_id,
+                artifact_id=artifact.id,
+                input_artifact_id=src.id,
+            )
+        )
+
+
+def inputs_of(db: Session, artifact_id: int) -> List[models.Artifact]:
+    return list(
+        db.execute(
+            select(models.Artifact)
+            .join(
+                models.ArtifactLineage,
+                models.ArtifactLineage.input_artifact_id == models.Artifact.id,
+            )
+            .where(models.ArtifactLineage.artifact_id == artifact_id)
+            .order_by(models.Artifact.id)
+        ).scalars()
+    )
@@ -1,6 +1,7 @@
 from __future__ import annotations
+import logging
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 
@@ -8,6 +9,10 @@ from app import models
 from app.core.scheduler import Scheduler
 from app.core.config import settings
 from app.core.notify import notify_run_finished
+from app.core import watermarks
+from app.workers.fused import should_fuse
+
+logger = logging.getLogger(__name__)
 
 
 class Orchestrator:
@@ -16,8 +21,16 @@ class Orchestrator:
         self.scheduler = Scheduler(db)
 
     def start_run(
-        self, pipeline_id: int, correlation_id: Optional[str] = None
+        self,
+        pipeline_id: int,
+        correlation_id: Optional[str] = None,
+        sample: Optional[Dict[str, Any]] = None,
     ) -> models.PipelineRun:
+        """
+        `sample` makes a preview run: CSV_READER publishes a deterministic
+        sample of its input (app.infra.sampling), artifacts are tagged as
+        preview, writers write under the run directory and watermarks stay.
+        """
         self.scheduler.validate_dag(pipeline_id)
         run = models.PipelineRun(
             pipeline_id=pipeline_id,
@@ -25,9 +38,16 @@ class Orchestrator:
             started_at=datetime.utcnow(),
             correlation_id=correlation_id
             or f"run-{int(datetime.utcnow().timestamp())}",
+            sample_json=sample,
         )
         self.db.add(run)
         self.db.flush()
+        pipeline = self.db.get(models.Pipeline, pipeline_id)
+        if not sample and pipeline is not None and should_fuse(self.db, pipeline):
+            # one queue item; a single worker runs the whole DAG in memory
+            self.scheduler.enqueue_fused(pipeline_id=pipeline_id, run_id=run.id)
+            self.db.commit()
+            return run
         # only enqueue ROOTS (defensive: use both strategies)
         self.scheduler.schedule_initial(run.id)
         # Ensure true roots (no inbound edges) are in the queue even if graph helpers differ
@@ -35,18 +55,53 @@ class Orchestrator:
         self.db.commit()
         return run
 
+    def _advance(self, run: models.PipelineRun) -> None:
+        try:
+            watermarks.advance(self.db, run)
+        except Exception as e:
+            # outputs could not be folded in: fail the run, watermarks stay put
+            logger.exception("Run %s: folding staged outputs failed: %s", run.id, e)
+            run.status = models.RunStatus.FAILED
+
     def mark_run_finished(self, run_id: int, success: bool) -> models.PipelineRun:
         run = self.db.get(models.PipelineRun, run_id)
         if not run:
             raise ValueError(f"PipelineRun {run_id} not found")
         run.status = models.RunStatus.SUCCEEDED if success else models.RunStatus.FAILED
         run.finished_at = datetime.utcnow()
+        if success:
+            self._advance(run)
         self.db.add(run)
         self.db.commit()
         self.db.refresh(run)
         notify_run_finished(self.db, run)
         return run
 
+    def _stream_producer_pending(self, run: models.PipelineRun) -> bool:
+        """True while a block feeding a stream edge is running or queued (a retry)."""
+        producers = select(models.Edge.from_block_id).where(
+            models.Edge.pipeline_id == run.pipeline_id, models.Edge.mode == "stream"
+        )
+        running = (
+            self.db.query(models.BlockRun)
+            .filter(
+                models.BlockRun.pipeline_run_id == run.id,
+                models.BlockRun.block_id.in_(producers),
+                models.BlockRun.status == models.RunStatus.RUNNING,
+            )
+            .count()
+        )
+        queued = (
+            self.db.query(models.BlockQueue)
+            .filter(
+                models.BlockQueue.pipeline_run_id == run.id,
+                models.BlockQueue.block_id.in_(producers),
+                models.BlockQueue.taken_by.is_(None),
+            )
+            .count()
+        )
+        return bool(running or queued)
+
     def reconcile_run(self, run_id: int) -> models.PipelineRun:
         run = self.db.get(models.PipelineRun, run_id)
         if not run:
@@ -89,6 +144,9 @@ class Orchestrator:
         terminal_fail = any(
             (br.attempts or 0) >= max_attempts_for(br.block_id) for br in failures
         )
+        if terminal_fail and self._stream_producer_pending(run):
+            # finish once the producer is done, so the run is finalized once
+            terminal_fail = False
 
         if terminal_fail and run.status != models.RunStatus.FAILED:
             run.status = models.RunStatus.FAILED
@@ -99,9 +157,13 @@ class Orchestrator:
             notify_run_finished(self.db, run)
             return run
 
-        if succeeded >= total_blocks and run.status != models.RunStatus.SUCCEEDED:
+        if succeeded >= total_blocks and run.status not in (
+            models.RunStatus.SUCCEEDED,
+            models.RunStatus.FAILED,
+        ):
             run.status = models.RunStatus.SUCCEEDED
             run.finished_at = datetime.utcnow()
+            self._advance(run)
             self.db.add(run)
             self.db.commit()
             self.db.refresh(run)
@@ -1,15 +1,42 @@
 from __future__ import annotations
-from typing import List, Tuple, Set
-from datetime import datetime
+from typing import Any, Dict, List, Tuple, Set
+from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import select, and_, func, exists
+from sqlalchemy import select, and_, exists
 
 from app import models
+from app.core.config import settings
 from app.core.dag import topological_sort, find_roots, next_runnables
+from app.infra import objectstore
 
 DEFAULT_PRIORITY = 100
 
 
+def locality_hint(db: Session, run_id: int, parent_block_id: int) -> Dict[str, Any]:
+    """
+    BlockQueue fields reserving a child of `parent_block_id` for the worker
+    that ran the parent, whose output is still on its disk. Only blobs kept
+    off-node (a shared storage backend) make that worth waiting for.
+    """
+    window = float(settings.LOCALITY_WINDOW_SECONDS or 0)
+    if window <= 0 or not objectstore.backend().shared:
+        return {}
+    worker = db.scalar(
+        select(models.BlockRun.worker_id).where(
+            and_(
+                models.BlockRun.pipeline_run_id == run_id,
+                models.BlockRun.block_id == parent_block_id,
+            )
+        )
+    )
+    if not worker:
+        return {}
+    return {
+        "preferred_worker": worker,
+        "prefer_until": datetime.utcnow() + timedelta(seconds=window),
+    }
+
+
 class Scheduler:
     def __init__(self, db: Session):
         self.db = db
@@ -122,6 +149,7 @@ class Scheduler:
                         models.BlockQueue.pipeline_run_id == run_id,
                         models.BlockQueue.block_id == bid,
                         models.BlockQueue.taken_by.is_(None),
+                        models.BlockQueue.shard_index.is_(None),
                     )
                 )
             ).scalar_one_or_none()
@@ -135,60 +163,103 @@ class Scheduler:
                 )
         self.db.commit()
 
+    def enqueue_fused(self, pipeline_id: int, run_id: int, priority: int = 100) -> None:
+        """
+        Enqueue the whole run as one fused queue item, keyed on the first block
+        in topological order. BlockRuns are written when the worker finishes.
+        """
+        order = self.validate_dag(pipeline_id)
+        if not order:
+            return
+        self.db.add(
+            models.BlockQueue(
+                pipeline_run_id=run_id,
+                block_id=order[0],
+                priority=priority,
+                fused=True,
+            )
+        )
+        self.db.commit()
+
     def on_block_finished(self, run_id: int, finished_block_id: int, priority: int = 100) -> int:
         """
         Enqueue children of `finished_block_id` only when all their parents have
         SUCCEEDED for this run. Returns the number of children enqueued.
         """
-        blk = self.db.get(models.Block, finished_block_id)
-        if not blk:
-            return 0
-        pipeline_id = blk.pipeline_id
+        return self._enqueue_ready_children(run_id, finished_block_id, priority)
 
-        child_ids = self.db.scalars(
-            select(models.Edge.to_block_id).where(
+    def on_stream_started(self, run_id: int, block_id: int, priority: int = 100) -> int:
+        """
+        Called when `block_id` seals its first output segment: enqueue the
+        children it feeds over stream edges so they consume while it runs.
+        """
+        return self._enqueue_ready_children(
+            run_id, block_id, priority, stream_only=True
+        )
+
+    def _parent_ready(self, run_id: int, parent_id: int, mode: str) -> bool:
+        status = self.db.scalar(
+            select(models.BlockRun.status).where(
                 and_(
-                    models.Edge.pipeline_id == pipeline_id,
-                    models.Edge.from_block_id == finished_block_id,
+                    models.BlockRun.pipeline_run_id == run_id,
+                    models.BlockRun.block_id == parent_id,
                 )
             )
-        ).all()
+        )
+        if status == models.RunStatus.SUCCEEDED:
+            return True
+        if mode != "stream":
+            return False
+        return self.db.scalar(
+            select(
+                exists().where(
+                    and_(
+                        models.StreamSegment.pipeline_run_id == run_id,
+                        models.StreamSegment.block_run_id == models.BlockRun.id,
+                        models.BlockRun.block_id == parent_id,
+                    )
+                )
+            )
+        )
+
+    def _enqueue_ready_children(
+        self, run_id: int, block_id: int, priority: int, stream_only: bool = False
+    ) -> int:
+        blk = self.db.get(models.Block, block_id)
+        if not blk:
+            return 0
+        pipeline_id = blk.pipeline_id
+
+        conds = [
+            models.Edge.pipeline_id == pipeline_id,
+            models.Edge.from_block_id == block_id,
+        ]
+        if stream_only:
+            conds.append(models.Edge.mode == "stream")
+        child_ids = self.db.scalars(select(models.Edge.to_block_id).where(and_(*conds))).all()
 
         enq = 0
         for cid in child_ids:
-            # Parents of the child
-            parent_ids = self.db.scalars(
-                select(models.Edge.from_block_id).where(
+            # Every parent must have SUCCEEDED, or be streaming into the child
+            parents = self.db.execute(
+                select(models.Edge.from_block_id, models.Edge.mode).where(
                     and_(
                         models.Edge.pipeline_id == pipeline_id,
                         models.Edge.to_block_id == cid,
                     )
                 )
             ).all()
-
-            # Ensure every parent has a SUCCEEDED BlockRun
-            succeeded_cnt = (
-                self.db.scalar(
-                    select(func.count(models.BlockRun.id)).where(
-                        and_(
-                            models.BlockRun.pipeline_run_id == run_id,
-                            models.BlockRun.block_id.in_(parent_ids if parent_ids else [0]),
-                            models.BlockRun.status == models.RunStatus.SUCCEEDED,
-                        )
-                    )
-                )
-                or 0
-            )
-            if succeeded_cnt != len(parent_ids):
+            if not all(self._parent_ready(run_id, pid, mode) for pid, mode in parents):
                 continue
 
-            # Skip if already queued (pending) or already succeeded
+            # Skip if already queued (pending), running or succeeded
             pending = self.db.execute(
                 select(models.BlockQueue).where(
                     and_(
                         models.BlockQueue.pipeline_run_id == run_id,
                         models.BlockQueue.block_id == cid,
                         models.BlockQueue.taken_by.is_(None),
+                        models.BlockQueue.shard_index.is_(None),
                     )
                 )
             ).scalar_one_or_none()
@@ -197,7 +268,9 @@ class Scheduler:
                     and_(
                         models.BlockRun.pipeline_run_id == run_id,
                         models.BlockRun.block_id == cid,
-                        models.BlockRun.status == models.RunStatus.SUCCEEDED,
+                        models.BlockRun.status.in_(
+                            [models.RunStatus.SUCCEEDED, models.RunStatus.RUNNING]
+                        ),
                     )
                 )
             ).scalar_one_or_none()
@@ -229,6 +302,7 @@ class Scheduler:
                     pipeline_run_id=run_id,
                     block_id=cid,
                     priority=priority,
+                    **locality_hint(self.db, run_id, block_id),
                 )
             )
             enq += 1
@@ -13,12 +13,12 @@ def export_pipeline_spec(db: Session, pipeline_id: int) -> Dict[str, Any]:
         select(models.Block).where(models.Block.pipeline_id == pipeline_id)
     ).all()
     edges = db.execute(
-        select(models.Edge.from_block_id, models.Edge.to_block_id).where(
+        select(models.Edge.from_block_id, models.Edge.to_block_id, models.Edge.mode).where(
             models.Edge.pipeline_id == pipeline_id
         )
     ).all()
     id_to_name = {b.id: b.name for b in blocks}
-    return {
+    spec: Dict[str, Any] = {
         "name": p.name,
         "version": p.version,
         "blocks": [
@@ -33,7 +33,12 @@ def export_pipeline_spec(db: Session, pipeline_id: int) -> Dict[str, Any]:
             {
                 "from": id_to_name[u],
                 "to": id_to_name[v],
+                # batch is the default; keep specs of batch-only pipelines unchanged
+                **({"mode": mode} if mode and mode != "batch" else {}),
             }
-            for (u, v) in edges
+            for (u, v, mode) in edges
         ],
     }
+    if p.execution and p.execution != "auto":
+        spec["execution"] = p.execution
+    return spec
@@ -1,66 +1,194 @@
 from __future__ import annotations
-import hmac, hashlib, time, os
+import hmac, hashlib, os, shutil, time
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 from fastapi import UploadFile
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app import models
 from app.core.config import settings
+from app.infra import cas, colstore
 
+# blobs (and stray temp files) this recently linked or written are never
+# collected: a worker may be about to commit the artifact that uses them
+GC_GRACE_SECONDS = 3600
 
-def _safe_name(name: str) -> str:
+
+def safe_name(name: str) -> str:
     keep = (c if c.isalnum() or c in ("-", "_", ".", "+") else "_" for c in name)
     out = "".join(keep)
     return out or "file"
 
 
-def artifact_dir_for(run_id: int, block_run_id: int | None) -> Path:
-    base = Path(settings.ARTIFACTS_DIR).expanduser().resolve()
-    sub = (
-        base / str(run_id) / (str(block_run_id) if block_run_id is not None else "run")
+def save_upload(file: UploadFile) -> Tuple[str, int]:
+    """Stream an upload into the blob store; returns (cas:// URI, size)."""
+    digest, size = cas.put_stream(iter(lambda: file.file.read(cas.CHUNK), b""))
+    return cas.uri_for(digest), size
+
+
+def upload_dir(upload_id: str) -> Path:
+    return cas.artifacts_root() / "uploads" / upload_id
+
+
+def part_path(upload_id: str, number: int) -> Path:
+    return upload_dir(upload_id) / f"{number:05d}.part"
+
+
+class PartWriter:
+    """
+    Writes one part of a chunked upload, hashing it as it goes. The part
+    lands under its final name only on close(), so a dropped connection
+    leaves the previous copy (if any) intact and the part can be re-sent.
+    """
+
+    def __init__(self, upload_id: str, number: int):
+        self.path = part_path(upload_id, number)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.{id(self)}.tmp")
+        self._f = self._tmp.open("wb")
+        self._sha = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        self._sha.update(chunk)
+        self._f.write(chunk)
+        self.size += len(chunk)
+
+    def close(self, expected_sha256: Optional[str] = None) -> str:
+        """Publish the part; raises ValueError when it does not match `expected_sha256`."""
+        self._f.close()
+        digest = self._sha.hexdigest()
+        if expected_sha256 and expected_sha256.lower() != digest:
+            self._tmp.unlink(missing_ok=True)
+            raise ValueError(f"Part checksum mismatch: got sha256 {digest}")
+        os.replace(self._tmp, self.path)
+        return digest
+
+    def abort(self) -> None:
+        self._f.close()
+        self._tmp.unlink(missing_ok=True)
+
+
+def _read_parts(paths: List[Path]) -> Iterator[bytes]:
+    for path in paths:
+        with path.open("rb") as f:
+            yield from iter(lambda: f.read(cas.CHUNK), b"")
+
+
+def assemble_upload(upload_id: str, numbers: List[int]) -> Tuple[str, int]:
+    """Concatenate the parts, in order, into the blob store; returns (cas:// URI, size)."""
+    digest, size = cas.put_stream(_read_parts([part_path(upload_id, n) for n in numbers]))
+    return cas.uri_for(digest), size
+
+
+def discard_upload(upload_id: str) -> None:
+    shutil.rmtree(upload_dir(upload_id), ignore_errors=True)
+
+
+def collect_garbage(db: Session, grace_seconds: int = GC_GRACE_SECONDS) -> Dict[str, int]:
+    """
+    Recount blob references from the artifacts table (runs and their
+    artifacts are deleted in bulk, bypassing the ORM) and delete unreferenced
+    blobs, files in the store that no blob row knows about, and read-cache
+    copies of compressed blobs not read within the grace period, along with
+    the row-index sidecars of deleted blobs. Returns {"blobs": deleted,
+    "bytes": freed}.
+    """
+    refs = dict(
+        db.execute(
+            select(models.Artifact.uri, func.count())
+            .where(models.Artifact.uri.like(f"{cas.SCHEME}%"))
+            .group_by(models.Artifact.uri)
+        ).all()
     )
-    sub.mkdir(parents=True, exist_ok=True)
-    return sub
-
-
-def save_upload(
-    run_id: int, block_run_id: int | None, file: UploadFile, filename: str | None = None
-) -> Tuple[str, int]:
-    dirp = artifact_dir_for(run_id, block_run_id)
-    name = _safe_name(filename or file.filename or "file.bin")
-    path = dirp / name
-    # write stream
-    size = 0
-    with open(path, "wb") as f:
-        while True:
-            chunk = file.file.read(1024 * 1024)
-            if not chunk:
-                break
-            size += len(chunk)
-            f.write(chunk)
-    # return URI (local:// relative path from ARTIFACTS_DIR root)
-    rel = path.relative_to(Path(settings.ARTIFACTS_DIR).expanduser().resolve())
-    return f"local://{rel.as_posix()}", size
-
-
-def open_local_uri(uri: str) -> Path:
-    assert uri.startswith("local://")
-    rel = uri[len("local://") :]
-    return Path(settings.ARTIFACTS_DIR).expanduser().resolve() / rel
+    cutoff = time.time() - grace_seconds
+    deleted = freed = 0
+    known = set()
+    for blob in db.scalars(select(models.Blob)).all():
+        blob.refcount = refs.get(cas.uri_for(blob.digest), 0)
+        found = cas.stored(blob.digest)
+        # a blob stored by another node (shared backend) only has its row's age
+        recent = (
+            found[0].stat().st_ctime > cutoff
+            if found
+            else blob.created_at > datetime.utcnow() - timedelta(seconds=grace_seconds)
+        )
+        if blob.refcount or recent:
+            known.add(blob.digest)
+            continue
+        cas.delete(blob.digest)
+        db.delete(blob)
+        deleted += 1
+        freed += blob.size
+    db.commit()
+    for path in cas.root().rglob("*"):
+        # blobs are named <digest>[.gz|.zst]; temp files start with "."
+        if (
+            path.is_file()
+            and path.name.split(".")[0] not in known
+            and path.stat().st_ctime <= cutoff
+        ):
+            freed += path.stat().st_size
+            path.unlink(missing_ok=True)
+            deleted += 1
+    for path in cas.index_root().rglob("*.rowidx"):
+        if path.stem not in known:
+            path.unlink(missing_ok=True)
+    for path in cas.cache_root().rglob("*"):
+        # a cache entry still linked from a run directory frees nothing
+        st = path.stat()
+        if path.is_file() and st.st_nlink == 1 and st.st_atime <= cutoff:
+            path.unlink(missing_ok=True)
+    return {"blobs": deleted, "bytes": freed}
 
 
-def sign_for_download(artifact_id: int, exp_ts: int | None = None) -> str:
+def artifact_file(art: models.Artifact) -> Optional[Tuple[Path, str]]:
+    """
+    (plain file, file name to hand out) of an artifact, or None when its
+    file is missing. Blobs are named by digest, so the name is the one the
+    file was written under; column stores are exported to CSV once, next to
+    the store (stores are never modified).
+    """
+    # cas:// blobs, local:// (under ARTIFACTS_DIR), file:// URIs and plain paths
+    path = cas.resolve_uri(art.uri or "")
+    if not path.exists():
+        return None
+    name = Path((art.meta_json or {}).get("path") or path.name).name
+    if colstore.is_store(path):
+        export = path.with_name(f"{path.name}.export.csv")
+        if not export.exists():
+            colstore.ColumnStore(path).to_csv(export)
+        return export, f"{path.stem}.csv"
+    return path, name
+
+
+def _signature(subject: str, exp_ts: int) -> str:
+    msg = f"{subject}.{exp_ts}".encode("utf-8")
+    return hmac.new(settings.SECRET_KEY.encode("utf-8"), msg, hashlib.sha256).hexdigest()
+
+
+def _expiry(exp_ts: int | None) -> int:
     if exp_ts is None:
-        exp_ts = int(time.time()) + int(settings.SIGNED_URL_TTL_SECONDS)
-    msg = f"{artifact_id}.{exp_ts}".encode("utf-8")
-    sig = hmac.new(settings.SECRET_KEY.encode("utf-8"), msg, hashlib.sha256).hexdigest()
+        return int(time.time()) + int(settings.SIGNED_URL_TTL_SECONDS)
+    return exp_ts
+
+
+def sign_for_download(artifact_id: int, exp_ts: int | None = None) -> str:
+    exp_ts = _expiry(exp_ts)
+    sig = _signature(str(artifact_id), exp_ts)
     return f"/artifacts/{artifact_id}/download?exp={exp_ts}&sig={sig}"
 
 
-def verify_signature(artifact_id: int, exp: int, sig: str) -> bool:
+def sign_for_bundle(run_id: int, exp_ts: int | None = None) -> str:
+    exp_ts = _expiry(exp_ts)
+    sig = _signature(f"run-{run_id}", exp_ts)
+    return f"/runs/{run_id}/artifacts/bundle?exp={exp_ts}&sig={sig}"
+
+
+def verify_signature(subject: int | str, exp: int, sig: str) -> bool:
+    """Check a signature made for an artifact id, or "run-<id>" for a run's bundle."""
     if int(exp) < int(time.time()):
         return False
-    msg = f"{artifact_id}.{int(exp)}".encode("utf-8")
-    good = hmac.new(
-        settings.SECRET_KEY.encode("utf-8"), msg, hashlib.sha256
-    ).hexdigest()
     # Timing-safe compare
-    return hmac.compare_digest(good, sig)
+    return hmac.compare_digest(_signature(str(subject), int(exp)), sig)
@@ -0,0 +1,48 @@
+from __future__ import annotations
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.steps.csv_writer import fold_staged
+
+
+def current(db: Session, block_id: int) -> Optional[models.InputWatermark]:
+    return db.execute(
+        select(models.InputWatermark).where(models.InputWatermark.block_id == block_id)
+    ).scalar_one_or_none()
+
+
+def advance(db: Session, run: models.PipelineRun) -> None:
+    """
+    Fold the staged rows of append/merge writers into their outputs, then
+    move the watermarks of the run's incremental readers to the positions
+    their CSV_ROWS artifacts recorded. Called when the run SUCCEEDED, in the
+    same transaction, so a failed run is reprocessed in full next time and
+    its rows reach the outputs only once. Preview runs never move watermarks.
+    """
+    if run.sample_json:
+        return
+    fold_staged(db, run)
+    arts = db.execute(
+        select(models.Artifact).where(
+            models.Artifact.pipeline_run_id == run.id,
+            models.Artifact.kind == models.ArtifactKind.CSV_ROWS,
+        )
+    ).scalars()
+    for art in arts:
+        mark = (art.meta_json or {}).get("watermark")
+        if not mark:
+            continue
+        wm = current(db, mark["block_id"])
+        if wm is None:
+            wm = models.InputWatermark(
+                pipeline_id=run.pipeline_id, block_id=mark["block_id"]
+            )
+        wm.source = mark["source"]
+        wm.byte_offset = mark["byte_offset"]
+        wm.max_id = mark["max_id"]
+        wm.rows = mark["rows"]
+        wm.pipeline_run_id = run.id
+        db.add(wm)
@@ -0,0 +1,125 @@
+"""
+Streamed archives of many files (zip or tar.gz), produced chunk by chunk as
+the response is sent: members are read from disk CHUNK bytes at a time and
+nothing is staged in temporary files or held whole in memory. Each member's
+SHA-256 and size are computed while it streams and written into
+``manifest.json``, the last member of the archive.
+"""
+
+from __future__ import annotations
+import hashlib
+import io
+import json
+import tarfile
+import time
+import zipfile
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+CHUNK = 1024 * 1024
+FORMATS = {"zip": "application/zip", "tar.gz": "application/gzip"}
+MANIFEST = "manifest.json"
+
+
+@dataclass
+class Member:
+    name: str
+    path: Path
+    # manifest entry of the member; sha256 and bytes are filled in as it streams
+    entry: Dict[str, Any]
+
+
+class _Sink(io.RawIOBase):
+    """Write-only, unseekable buffer the zip writer emits into; drained after each write."""
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _read(member: Member, size: int) -> Iterator[bytes]:
+    """The first `size` bytes of the member's file, hashed into its entry."""
+    sha = hashlib.sha256()
+    left = size
+    with member.path.open("rb") as f:
+        while left:
+            chunk = f.read(min(CHUNK, left))
+            if not chunk:
+                raise IOError(f"{member.path} shrank while being archived")
+            sha.update(chunk)
+            left -= len(chunk)
+            yield chunk
+    member.entry.update({"path": member.name, "sha256": sha.hexdigest(), "bytes": size})
+
+
+def _manifest(manifest: Dict[str, Any], members: List[Member]) -> bytes:
+    return json.dumps(
+        {**manifest, "artifacts": [m.entry for m in members]}, indent=2, default=str
+    ).encode("utf-8")
+
+
+def _zip(members: List[Member], manifest: Dict[str, Any]) -> Iterator[bytes]:
+    sink = _Sink()
+    # an unseekable target makes zipfile write data descriptors after each member
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for m in members:
+            st = m.path.stat()
+            info = zipfile.ZipInfo(m.name, date_time=time.localtime(st.st_mtime)[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with zf.open(info, "w", force_zip64=st.st_size >= zipfile.ZIP64_LIMIT) as w:
+                for chunk in _read(m, st.st_size):
+                    w.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+        zf.writestr(MANIFEST, _manifest(manifest, members))
+    yield sink.drain()  # central directory
+
+
+def _tar_gz(members: List[Member], manifest: Dict[str, Any]) -> Iterator[bytes]:
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip framing
+
+    def header(name: str, size: int, mtime: float) -> bytes:
+        info = tarfile.TarInfo(name)
+        info.size, info.mtime, info.mode = size, int(mtime), 0o644
+        return gz.compress(info.tobuf(format=tarfile.PAX_FORMAT))
+
+    def pad(size: int) -> bytes:
+        return gz.compress(b"\0" * (-size % tarfile.BLOCKSIZE))
+
+    for m in members:
+        st = m.path.stat()
+        yield header(m.name, st.st_size, st.st_mtime)
+        for chunk in _read(m, st.st_size):
+            yield gz.compress(chunk)
+        yield pad(st.st_size)
+    data = _manifest(manifest, members)
+    yield header(MANIFEST, len(data), time.time())
+    yield gz.compress(data)
+    yield pad(len(data))
+    # end of archive: two zero blocks
+    yield gz.compress(b"\0" * (2 * tarfile.BLOCKSIZE))
+    yield gz.flush()
+
+
+def stream(members: List[Member], manifest: Dict[str, Any], fmt: str = "zip") -> Iterator[bytes]:
+    """
+    Chunks of an archive of `members` plus ``manifest.json`` (`manifest`
+    with an "artifacts" list of the member entries).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown bundle format '{fmt}' ({' | '.join(FORMATS)})")
+    chunks = _zip(members, manifest) if fmt == "zip" else _tar_gz(members, manifest)
+    return (chunk for chunk in chunks if chunk)
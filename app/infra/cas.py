@@ -0,0 +1,544 @@
+"""
+Content-addressed blob store under ARTIFACTS_DIR. Artifact files are stored
+once under the SHA-256 of their content,
+
+    <ARTIFACTS_DIR>/cas/sha256/<first two hex digits>/<digest>[.gz|.zst]
+
+and artifacts point at them as ``cas://<digest>``. Run outputs (files under
+ARTIFACTS_DIR/runs, never modified once their block finished) are hard-linked
+into the store, and a run file whose content is already stored is replaced by
+a link to that blob, so identical outputs of repeated runs share one copy on
+disk. Files elsewhere (writer targets, even ones under ARTIFACTS_DIR) are
+copied, since their owner may change them later. Reference counts are kept in the blobs table
+(app.models.Blob); app.core.storage.collect_garbage() drops unused blobs.
+
+With ARTIFACT_CODEC set, blobs are stored compressed (the digest is still
+that of the plain content). Sequential readers take the path from
+resolve_uri(uri, decompress=False) and read it with open_source(), which
+decompresses as it reads. Readers that seek get a plain file from
+resolve_uri(), decompressed into a read cache (``cas/plain``) held to
+PLAIN_CACHE_MAX_BYTES; a run output is that cache entry until release().
+
+With a shared storage backend (app.infra.objectstore) every new blob is
+also uploaded, and fetch() downloads blobs this node does not have. The
+node's copies then form a cache keyed by digest, held to
+LOCAL_CACHE_MAX_BYTES by trim_cache() in least-recently-read order.
+"""
+
+from __future__ import annotations
+import gzip
+import hashlib
+import io
+import os
+import shutil
+import stat
+import tempfile
+import time
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from app.core.config import settings
+from app.infra import objectstore
+from app.infra.artifacts import materialize
+
+try:
+    import zstandard
+except ImportError:  # optional; ARTIFACT_CODEC=zstd then falls back to gzip
+    zstandard = None
+
+SCHEME = "cas://"
+CHUNK = 1024 * 1024
+# codec (HTTP content-coding name) -> blob file suffix
+SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def artifacts_root() -> Path:
+    return Path(settings.ARTIFACTS_DIR).expanduser().resolve()
+
+
+def root() -> Path:
+    return artifacts_root() / "cas" / "sha256"
+
+
+def cache_root() -> Path:
+    return artifacts_root() / "cas" / "plain"
+
+
+def index_root() -> Path:
+    return artifacts_root() / "cas" / "rowidx"
+
+
+def blob_path(digest: str) -> Path:
+    return root() / digest[:2] / digest
+
+
+def cache_path(digest: str) -> Path:
+    return cache_root() / digest[:2] / digest
+
+
+def index_path(digest: str) -> Path:
+    """Row-index sidecar of a stored CSV blob (see app.infra.rowindex)."""
+    return index_root() / digest[:2] / f"{digest}.rowidx"
+
+
+def uri_for(digest: str) -> str:
+    return f"{SCHEME}{digest}"
+
+
+def digest_of(uri: Optional[str]) -> Optional[str]:
+    """The digest a ``cas://`` URI names, else None."""
+    if uri and uri.startswith(SCHEME):
+        return uri[len(SCHEME) :]
+    return None
+
+
+def codec() -> Optional[str]:
+    """The codec new blobs are stored with (ARTIFACT_CODEC); None stores them plain."""
+    name = (settings.ARTIFACT_CODEC or "none").lower()
+    if name == "none":
+        return None
+    if name not in SUFFIXES:
+        raise ValueError(f"Unknown ARTIFACT_CODEC '{name}' (none | {' | '.join(SUFFIXES)})")
+    if name == "zstd" and zstandard is None:
+        return "gzip"
+    return name
+
+
+def stored(digest: str) -> Optional[Tuple[Path, Optional[str]]]:
+    """(file, codec) the blob is stored as, or None when it is not stored."""
+    plain = blob_path(digest)
+    if plain.exists():
+        return plain, None
+    for name, suffix in SUFFIXES.items():
+        path = plain.with_name(digest + suffix)
+        if path.exists():
+            return path, name
+    return None
+
+
+def remote_key(name: str) -> str:
+    """Backend key of the blob file called `name` (<digest>[.gz|.zst])."""
+    return f"sha256/{name}"
+
+
+def fetch(digest: str) -> Optional[Tuple[Path, Optional[str]]]:
+    """Like stored(), but downloads the blob from a shared backend when missing here."""
+    found = stored(digest)
+    backend = objectstore.backend()
+    if found or not backend.shared:
+        return found
+    for name in [digest, *(digest + suffix for suffix in SUFFIXES.values())]:
+        path = blob_path(digest).with_name(name)
+        if backend.get(remote_key(name), path):
+            trim_cache(keep=path)
+            return stored(digest)
+    return None
+
+
+def trim_cache(keep: Optional[Path] = None) -> int:
+    """
+    Evict the least recently read local copies, sparing `keep`; returns the
+    bytes freed. Read-cache entries are held to PLAIN_CACHE_MAX_BYTES and,
+    with a shared backend, read-cache entries and blobs together to
+    LOCAL_CACHE_MAX_BYTES (both can be decompressed or fetched again). Files
+    also linked from a run directory free nothing and stay.
+    """
+    freed = _trim([cache_root()], int(settings.PLAIN_CACHE_MAX_BYTES or 0), keep)
+    if objectstore.backend().shared:
+        limit = int(settings.LOCAL_CACHE_MAX_BYTES or 0)
+        freed += _trim([cache_root(), root()], limit, keep)
+    return freed
+
+
+def _trim(roots: Iterable[Path], limit: int, keep: Optional[Path]) -> int:
+    """Evict files under `roots` in least-recently-read order until they fit in `limit` (0 = no limit)."""
+    if limit <= 0:
+        return 0
+    entries = []
+    for top in roots:
+        for path in top.rglob("*"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            # temp files start with "."
+            if stat.S_ISREG(st.st_mode) and st.st_nlink == 1 and not path.name.startswith("."):
+                entries.append((st.st_atime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    freed = 0
+    for _, size, path in sorted(entries):
+        if total - freed <= limit:
+            break
+        if path != keep:
+            path.unlink(missing_ok=True)
+            freed += size
+    return freed
+
+
+def _push(digest: str) -> None:
+    backend = objectstore.backend()
+    found = stored(digest)
+    if backend.shared and found:
+        backend.put(remote_key(found[0].name), found[0])
+
+
+def delete(digest: str) -> None:
+    """Remove a blob: its stored file, read-cache copy, row index and remote copies."""
+    found = stored(digest)
+    if found:
+        found[0].unlink(missing_ok=True)
+    cache_path(digest).unlink(missing_ok=True)
+    index_path(digest).unlink(missing_ok=True)
+    backend = objectstore.backend()
+    if backend.shared:
+        for name in [digest, *(digest + suffix for suffix in SUFFIXES.values())]:
+            backend.delete(remote_key(name))
+
+
+def _encoder(name: str, f: IO[bytes]) -> IO[bytes]:
+    if name == "gzip":
+        return gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6, mtime=0)
+    return zstandard.ZstdCompressor().stream_writer(f, closefd=False)
+
+
+def _decoder(name: str, f: IO[bytes]) -> IO[bytes]:
+    if name == "gzip":
+        return gzip.GzipFile(fileobj=f, mode="rb")
+    if zstandard is None:
+        raise RuntimeError("zstd blob found but the zstandard package is not installed")
+    return zstandard.ZstdDecompressor().stream_reader(f)
+
+
+def _encode(src: Path, name: str, digest: str) -> None:
+    dst = blob_path(digest).with_name(digest + SUFFIXES[name])
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    with src.open("rb") as f_in, tmp.open("wb") as f_out:
+        with _encoder(name, f_out) as enc:
+            shutil.copyfileobj(f_in, enc, CHUNK)
+    os.replace(tmp, dst)
+
+
+def open_plain(digest: str) -> IO[bytes]:
+    """The plain content of a stored blob as a stream (decompressed if needed)."""
+    found = fetch(digest)
+    if found is None:
+        raise FileNotFoundError(f"Blob not stored: {digest}")
+    path, name = found
+    f = path.open("rb")
+    return _decoder(name, f) if name else f
+
+
+def _touch(path: Path) -> None:
+    # bump the access time only: mtime is what row-index sidecars check
+    st = path.stat()
+    os.utime(path, ns=(time.time_ns(), st.st_mtime_ns))
+
+
+def plain_path(digest: str, decompress: bool = True) -> Path:
+    """
+    A plain file with the blob's content, decompressed into the cache when
+    needed. With `decompress=False` a compressed blob's cache path is
+    returned as is, whether or not it exists (see open_source()).
+    """
+    found = stored(digest)
+    if found and not found[1]:
+        _touch(found[0])
+        return found[0]
+    cache = cache_path(digest)
+    if cache.exists():
+        _touch(cache)
+        return cache
+    if not decompress and found:
+        return cache
+    found = found or fetch(digest)
+    if not found:
+        return blob_path(digest)  # missing; callers report it
+    if not found[1]:
+        return found[0]
+    if not decompress:
+        return cache
+    cache.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache.with_name(f".{digest}.{os.getpid()}.tmp")
+    with open_plain(digest) as f_in, tmp.open("wb") as f_out:
+        shutil.copyfileobj(f_in, f_out, CHUNK)
+    os.replace(tmp, cache)
+    trim_cache(keep=cache)
+    return cache
+
+
+def resolve_uri(uri: str, decompress: bool = True) -> Path:
+    """
+    Filesystem path of an artifact URI: ``cas://<digest>`` (a plain file,
+    unless `decompress` is False, see plain_path()), ``local://<path under
+    ARTIFACTS_DIR>``, ``file://`` or a plain path.
+    """
+    digest = digest_of(uri)
+    if digest:
+        return plain_path(digest, decompress=decompress)
+    if uri.startswith("local://"):
+        return artifacts_root() / uri[len("local://") :]
+    if uri.startswith("file://"):
+        return Path(unquote(urlparse(uri).path)).expanduser()
+    return Path(uri).expanduser()
+
+
+def _cached_digest(path: Path) -> Optional[str]:
+    """The digest whose read-cache entry `path` is, else None."""
+    try:
+        rel = path.relative_to(cache_root())
+    except ValueError:
+        return None
+    return path.name if len(rel.parts) == 2 else None
+
+
+def exists(path: Path) -> bool:
+    """Like path.exists(), counting a compressed blob's cache path as present."""
+    if path.exists():
+        return True
+    digest = _cached_digest(path)
+    return bool(digest and fetch(digest))
+
+
+def open_source(path: Path) -> IO[bytes]:
+    """
+    Open a path from resolve_uri() for reading. A compressed blob whose
+    cache entry is not on disk is decompressed as it is read.
+    """
+    try:
+        return path.open("rb")
+    except FileNotFoundError:
+        digest = _cached_digest(path)
+        if not digest:
+            raise
+        return open_plain(digest)
+
+
+def local_file(path: Path) -> Path:
+    """A plain file at `path` for readers that seek, decompressing a blob if needed."""
+    digest = _cached_digest(path)
+    if digest and not path.exists():
+        return plain_path(digest)
+    return path
+
+
+def _hash_stream(f: IO[bytes]) -> Tuple[str, int]:
+    sha = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = f.read(CHUNK)
+        if not chunk:
+            break
+        sha.update(chunk)
+        size += len(chunk)
+    return sha.hexdigest(), size
+
+
+def hash_file(path: Path) -> Tuple[str, int]:
+    """(sha256 hex digest, size) of the file at `path`."""
+    with path.open("rb") as f:
+        return _hash_stream(f)
+
+
+class HashingWriter(io.RawIOBase):
+    """
+    Write-only file that hashes the bytes as they are written, so the file
+    can be ingested without being read back (ingest(path, hashed=...)).
+    With `resume`, the bytes already in the file are hashed first and
+    writing continues at its end.
+    """
+
+    def __init__(self, path: Path, resume: bool = False):
+        # unbuffered: what the text layer flushes is on disk (checkpoints, seals)
+        self._f = path.open("r+b" if resume else "wb", buffering=0)
+        self._sha = hashlib.sha256()
+        self._size = 0
+        if resume:
+            for chunk in iter(lambda: self._f.read(CHUNK), b""):
+                self._sha.update(chunk)
+                self._size += len(chunk)
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True  # only to report the position (tell())
+
+    def write(self, b) -> int:
+        view = memoryview(b)
+        done = 0
+        while done < len(view):
+            done += self._f.write(view[done:])
+        self._sha.update(view)
+        self._size += done
+        return done
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if (offset, whence) not in ((0, os.SEEK_CUR), (self._size, os.SEEK_SET)):
+            raise io.UnsupportedOperation("HashingWriter only appends")
+        return self._size
+
+    def tell(self) -> int:
+        return self._size
+
+    def flush(self) -> None:
+        self._f.flush()
+
+    def close(self) -> None:
+        super().close()  # flushes first
+        self._f.close()
+
+    def hashed(self) -> Tuple[str, int]:
+        """(sha256 hex digest, size) of everything written so far."""
+        return self._sha.hexdigest(), self._size
+
+
+def open_hashing(path: Path, resume: bool = False) -> Tuple[IO[str], HashingWriter]:
+    """A UTF-8 text file (newline="", for csv) over a HashingWriter."""
+    raw = HashingWriter(path, resume=resume)
+    return io.TextIOWrapper(io.BufferedWriter(raw), encoding="utf-8", newline=""), raw
+
+
+def verify(digest: str) -> bool:
+    """True when the stored blob still hashes (uncompressed) to its digest."""
+    try:
+        with open_plain(digest) as f:
+            return _hash_stream(f)[0] == digest
+    except (OSError, EOFError, RuntimeError):
+        return False
+
+
+def describe(path: Path | str, digest: str, size: int) -> Dict[str, Any]:
+    """Artifact metadata of a stored file: where it was written, hash and sizes."""
+    meta: Dict[str, Any] = {"path": str(path), "sha256": digest, "bytes": size}
+    found = stored(digest)
+    if found and found[1]:
+        packed = found[0].stat().st_size
+        meta.update(
+            {
+                "codec": found[1],
+                "stored_bytes": packed,
+                "ratio": round(size / packed, 3) if packed else None,
+            }
+        )
+    return meta
+
+
+def _has(digest: str, size: int) -> bool:
+    found = stored(digest)
+    if found is None:
+        return False
+    # a plain blob of the wrong size is damaged and gets rewritten
+    return found[1] is not None or found[0].stat().st_size == size
+
+
+def put_stream(chunks: Iterable[bytes]) -> Tuple[str, int]:
+    """
+    Store the bytes of `chunks`, hashing them as they are written to a
+    temporary file in the store, then move (or encode) it to its blob path,
+    or drop it when that content is already stored. Returns (digest, size).
+    """
+    root().mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=root(), prefix=".put-")
+    sha = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                sha.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        digest = sha.hexdigest()
+        name = codec()
+        new = not _has(digest, size)
+        if new:
+            blob_path(digest).parent.mkdir(parents=True, exist_ok=True)
+            if name:
+                _encode(Path(tmp), name, digest)
+            else:
+                os.replace(tmp, blob_path(digest))
+    finally:
+        Path(tmp).unlink(missing_ok=True)
+    if new:
+        _push(digest)
+    return digest, size
+
+
+def is_run_output(path: Path) -> bool:
+    # run directories and the store itself are written once and never modified
+    # afterwards, so they may share an inode with their blob; anything else
+    # under ARTIFACTS_DIR (e.g. a writer's output_path) belongs to its owner
+    resolved = path.resolve()
+    for owned in (artifacts_root() / "runs", artifacts_root() / "cas"):
+        try:
+            resolved.relative_to(owned)
+        except ValueError:
+            continue
+        return True
+    return False
+
+
+def _link_over(src: Path, dst: Path) -> None:
+    """Make `dst` a hard link to `src`, atomically replacing it."""
+    tmp = dst.with_name(f".{dst.name}.link")
+    tmp.unlink(missing_ok=True)
+    os.link(src, tmp)
+    os.replace(tmp, dst)
+
+
+def _share(path: Path, target: Path) -> None:
+    """Make the run file `path` and `target` one inode, keeping `target` if it exists."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        if not target.exists() or target.stat().st_size != path.stat().st_size:
+            # `path` was just hashed; a target of another size is damaged
+            _link_over(path, target)
+        elif not os.path.samefile(target, path):
+            _link_over(target, path)
+    except OSError:
+        pass  # e.g. another filesystem: keep the separate copy
+
+
+def ingest(path: Path, hashed: Optional[Tuple[str, int]] = None) -> Tuple[str, int]:
+    """
+    Store the file at `path` and return (digest, size). A run output is
+    linked into the store, or replaced by a link to the blob when the same
+    content is already stored; other files are copied (reflinked when the
+    filesystem can). With a codec the blob is a compressed copy, and a run
+    output is linked as its read-cache entry instead. `hashed` is the
+    (digest, size) its writer computed while writing (see HashingWriter);
+    without it the file is read once to hash it.
+    """
+    digest, size = hashed or hash_file(path)
+    blob = blob_path(digest)
+    blob.parent.mkdir(parents=True, exist_ok=True)
+    new = not _has(digest, size)
+    if new:
+        blob.unlink(missing_ok=True)
+        name = codec()
+        if name:
+            _encode(path, name, digest)
+    run_output = is_run_output(path)
+    if run_output:
+        found = stored(digest)
+        _share(path, cache_path(digest) if found and found[1] else blob)
+    if not stored(digest):  # plain, and not linked (not a run output, or EXDEV)
+        materialize(path, blob)
+    if new:
+        _push(digest)
+    return digest, size
+
+
+def release(path: Path, digest: str) -> None:
+    """
+    Drop a run file whose blob is stored compressed, and its read-cache
+    entry (the same inode): readers decompress the blob as they read it,
+    so only the compressed copy stays on disk.
+    """
+    found = stored(digest)
+    cache = cache_path(digest)
+    if not (found and found[1] and cache.exists() and path.exists()):
+        return
+    if os.path.samefile(cache, path):
+        path.unlink()
+        cache.unlink(missing_ok=True)
@@ -0,0 +1,268 @@
+"""
+Column store: the internal artifact format passed between blocks when
+INTERMEDIATE_FORMAT=colstore. A store is a directory with one file per
+column plus `_schema.json` ({"format", "columns", "files", "rows"}).
+
+A column file is a sequence of chunks, one per written batch:
+
+    <u32 count><u32 nbytes><count x u32 end offsets><nbytes of UTF-8 text>
+
+Offsets index the decoded text, so a chunk decodes with one bytes.decode()
+and slicing; no per-row dicts are built. Readers open only the columns they
+need, and a step adds columns by hard-linking the input column files into
+its output store next to the new ones.
+"""
+
+from __future__ import annotations
+import csv
+import io
+import json
+import os
+import shutil
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+FORMAT = "colstore/1"
+SCHEMA_FILE = "_schema.json"
+_HEAD = struct.Struct("<II")
+_SWAP = sys.byteorder != "little"
+
+
+def is_store(path: Path | str) -> bool:
+    return (Path(path) / SCHEMA_FILE).is_file()
+
+
+def column_file(index: int) -> str:
+    # names are arbitrary CSV headers; files are positional
+    return f"c{index:04d}.col"
+
+
+def encode_chunk(values: Sequence[Optional[str]]) -> bytes:
+    texts = ["" if v is None else str(v) for v in values]
+    offsets = array("I")
+    end = 0
+    for t in texts:
+        end += len(t)
+        offsets.append(end)
+    if _SWAP:
+        offsets.byteswap()
+    data = "".join(texts).encode("utf-8")
+    return _HEAD.pack(len(texts), len(data)) + offsets.tobytes() + data
+
+
+def _decode(f, count: int, nbytes: int) -> List[str]:
+    offsets = array("I")
+    offsets.frombytes(f.read(4 * count))
+    if _SWAP:
+        offsets.byteswap()
+    text = memoryview(f.read(nbytes)).tobytes().decode("utf-8")
+    start = 0
+    values = []
+    for end in offsets:
+        values.append(text[start:end])
+        start = end
+    return values
+
+
+def iter_chunks(path: Path) -> Iterator[List[str]]:
+    """Decode a column file chunk by chunk."""
+    with path.open("rb") as f:
+        while True:
+            head = f.read(_HEAD.size)
+            if len(head) < _HEAD.size:
+                return
+            yield _decode(f, *_HEAD.unpack(head))
+
+
+def read_window(path: Path, start: int, end: int) -> List[str]:
+    """
+    Values of rows [start, end) of a column file. Chunks before `start` are
+    skipped by their header without being read or decoded.
+    """
+    values: List[str] = []
+    row = 0
+    with path.open("rb") as f:
+        while row < end:
+            head = f.read(_HEAD.size)
+            if len(head) < _HEAD.size:
+                break
+            count, nbytes = _HEAD.unpack(head)
+            if row + count <= start:
+                f.seek(4 * count + nbytes, os.SEEK_CUR)
+            else:
+                chunk = _decode(f, count, nbytes)
+                values.extend(chunk[max(0, start - row) : end - row])
+            row += count
+    return values
+
+
+class ColumnStore:
+    """Read side of a finished store."""
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        schema = json.loads((self.path / SCHEMA_FILE).read_text(encoding="utf-8"))
+        if schema.get("format") != FORMAT:
+            raise ValueError(f"Unsupported column store format: {schema.get('format')}")
+        self.columns: List[str] = list(schema["columns"])
+        self.files: Dict[str, str] = dict(zip(self.columns, schema["files"]))
+        self.rows: int = int(schema["rows"])
+
+    def file_for(self, name: str) -> Path:
+        return self.path / self.files[name]
+
+    def iter_rows(
+        self, columns: Optional[Sequence[str]] = None
+    ) -> Iterator[Tuple[List[str], List[List[str]]]]:
+        """
+        Yield (names, column value lists) runs of rows, reading only `columns`.
+        Columns written by different steps may be chunked differently; runs
+        are cut at the union of their chunk boundaries.
+        """
+        names = [c for c in (columns or self.columns) if c in self.files]
+        if not names:
+            return
+        readers = [iter_chunks(self.file_for(n)) for n in names]
+        bufs: List[List[str]] = [[] for _ in names]
+        while True:
+            for i, r in enumerate(readers):
+                while not bufs[i]:
+                    chunk = next(r, None)
+                    if chunk is None:
+                        return
+                    bufs[i] = chunk
+            n = min(len(b) for b in bufs)
+            yield names, [b[:n] for b in bufs]
+            bufs = [b[n:] for b in bufs]
+
+    def to_csv(self, dst: Path) -> None:
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(dst.name + ".tmp")
+        with tmp.open("w", newline="", encoding="utf-8") as f:
+            self._write_csv(f)
+        os.replace(tmp, dst)
+
+    def head(self, limit: int) -> List[Dict[str, str]]:
+        rows: List[Dict[str, str]] = []
+        for names, chunk in self.iter_rows():
+            for values in zip(*chunk):
+                if len(rows) >= limit:
+                    return rows
+                rows.append(dict(zip(names, values)))
+        return rows
+
+    def window(
+        self, start: int, limit: int, columns: Optional[Sequence[str]] = None
+    ) -> List[Dict[str, str]]:
+        """Rows [start, start + limit), reading only `columns` (see read_window())."""
+        names = [c for c in (columns or self.columns) if c in self.files]
+        values = [read_window(self.file_for(n), start, start + limit) for n in names]
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+    def to_csv_bytes(self) -> bytes:
+        buf = io.StringIO(newline="")
+        self._write_csv(buf)
+        return buf.getvalue().encode("utf-8")
+
+    def _write_csv(self, f) -> None:
+        w = csv.writer(f)
+        w.writerow(self.columns)
+        for _, chunk in self.iter_rows():
+            w.writerows(zip(*chunk))
+
+
+class StoreWriter:
+    """
+    Write side of a store. `linked` columns are hard-linked from an existing
+    store (copied where links are not possible); the rest are appended chunk
+    by chunk. The schema is written by close(), which makes the store visible
+    to is_store().
+    """
+
+    def __init__(
+        self,
+        path: Path | str,
+        columns: Sequence[str],
+        linked: Optional[ColumnStore] = None,
+        resume: bool = False,
+    ):
+        self.path = Path(path)
+        self.columns = list(columns)
+        self.linked = {c for c in self.columns if linked and c in linked.files}
+        self.path.mkdir(parents=True, exist_ok=True)
+        if not resume:
+            schema = self.path / SCHEMA_FILE
+            if schema.exists():
+                schema.unlink()
+        for i, name in enumerate(self.columns):
+            dst = self.path / column_file(i)
+            if name in self.linked:
+                src = linked.file_for(name)
+                if dst.exists() and os.path.samefile(src, dst):
+                    continue
+                if dst.exists():
+                    dst.unlink()
+                try:
+                    os.link(src, dst)
+                except OSError:
+                    shutil.copyfile(src, dst)
+            elif not resume:
+                dst.write_bytes(b"")
+
+    def written_files(self) -> List[Path]:
+        """Column files this writer appends to (checkpointable)."""
+        return [
+            self.path / column_file(i)
+            for i, n in enumerate(self.columns)
+            if n not in self.linked
+        ]
+
+    def append(self, values_by_column: Dict[str, Sequence[Optional[str]]], n: int) -> None:
+        for i, name in enumerate(self.columns):
+            if name in self.linked:
+                continue
+            values = values_by_column.get(name) or [None] * n
+            with (self.path / column_file(i)).open("ab") as f:
+                f.write(encode_chunk(values[:n]))
+
+    def close(self, rows: int) -> None:
+        schema = {
+            "format": FORMAT,
+            "columns": self.columns,
+            "files": [column_file(i) for i, n in enumerate(self.columns)],
+            "rows": rows,
+        }
+        tmp = self.path / (SCHEMA_FILE + ".tmp")
+        tmp.write_text(json.dumps(schema), encoding="utf-8")
+        os.replace(tmp, self.path / SCHEMA_FILE)
+
+
+def from_csv(src: Path, dst: Path, batch_rows: int = 4096) -> ColumnStore:
+    """Convert a CSV file into a store (one chunk per `batch_rows` rows)."""
+    with src.open(newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, None) or []
+        writer = StoreWriter(dst, header)
+        rows = 0
+        buf: List[List[str]] = []
+
+        def flush() -> None:
+            cols = list(zip(*buf))
+            writer.append({name: cols[i] for i, name in enumerate(header)}, len(buf))
+
+        for rec in reader:
+            # pad short records like csv.DictReader does
+            buf.append((rec + [""] * len(header))[: len(header)])
+            if len(buf) >= batch_rows:
+                flush()
+                rows += len(buf)
+                buf = []
+        if buf:
+            flush()
+            rows += len(buf)
+    writer.close(rows)
+    return ColumnStore(dst)
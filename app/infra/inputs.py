@@ -0,0 +1,207 @@
+"""
+CSV_READER inputs: `input_path` may name a CSV file, a directory, or a glob,
+and files may be gzip/bz2/xz compressed. Anything other than a single plain
+CSV is decoded partition by partition in a process pool and combined into
+one CSV with a manifest recording which rows came from which file.
+Incremental readers slice out the rows past a byte offset or an id.
+"""
+
+from __future__ import annotations
+import bz2
+import csv
+import glob
+import gzip
+import lzma
+import os
+import shutil
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, List, Optional, Tuple
+
+from app.infra import rowindex
+
+CODECS: Dict[str, Callable[..., IO[str]]] = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+    ".xz": lzma.open,
+}
+_GLOB_CHARS = "*?["
+
+
+def codec(path: Path) -> Optional[str]:
+    suffix = path.suffix.lower()
+    return suffix[1:] if suffix in CODECS else None
+
+
+def resolve(input_path: str) -> List[Path]:
+    """Files named by `input_path`, in a stable (sorted) order."""
+    if any(c in input_path for c in _GLOB_CHARS):
+        paths = [Path(p) for p in sorted(glob.glob(input_path)) if Path(p).is_file()]
+    elif Path(input_path).is_dir():
+        paths = sorted(
+            p
+            for p in Path(input_path).iterdir()
+            if p.is_file() and not p.name.startswith(".")
+        )
+    else:
+        paths = [Path(input_path)] if Path(input_path).exists() else []
+    if not paths:
+        raise FileNotFoundError(f"CSV Reader: file not found: {input_path}")
+    return paths
+
+
+def is_plain(paths: List[Path]) -> bool:
+    """A single uncompressed CSV, which is used in place."""
+    return len(paths) == 1 and codec(paths[0]) is None
+
+
+def open_text(path: Path) -> IO[str]:
+    opener = CODECS.get(path.suffix.lower())
+    if opener:
+        return opener(path, "rt", newline="", encoding="utf-8")
+    return path.open("r", newline="", encoding="utf-8")
+
+
+def decode_part(src: str, dst: str) -> Tuple[List[str], int]:
+    """
+    Decompress and parse `src`, writing its data rows (no header) to `dst`.
+    Returns (header, rows). Runs in a pool process.
+    """
+    rows = 0
+    with open_text(Path(src)) as f_in, open(dst, "w", newline="", encoding="utf-8") as f_out:
+        reader = csv.reader(f_in)
+        header = next(reader, None) or []
+        writer = csv.writer(f_out)
+        for rec in reader:
+            if rec:
+                writer.writerow(rec)
+                rows += 1
+    return header, rows
+
+
+def combine(paths: List[Path], dst: Path, workers: int = 0) -> Dict[str, Any]:
+    """
+    Decode `paths` concurrently (`workers` processes, 0 = one per CPU) and
+    write them to `dst` as one CSV in path order. Every file must have the
+    same header. Returns the manifest:
+    {"files": [{"path", "codec", "rows", "row_start"}], "rows"}.
+    """
+    parts_dir = dst.with_name(dst.name + ".parts")
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    parts_dir.mkdir(parents=True)
+    parts = [parts_dir / f"{i:05d}.csv" for i in range(len(paths))]
+    workers = min(len(paths), workers or os.cpu_count() or 1)
+    try:
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(decode_part, map(str, paths), map(str, parts)))
+        else:
+            results = [decode_part(str(p), str(d)) for p, d in zip(paths, parts)]
+
+        header = results[0][0]
+        for path, (h, _) in zip(paths, results):
+            if h != header:
+                raise ValueError(
+                    f"CSV Reader: header of {path} differs from {paths[0]}: {h} != {header}"
+                )
+        tmp = dst.with_name(dst.name + ".tmp")
+        with tmp.open("w", newline="", encoding="utf-8") as out:
+            csv.writer(out).writerow(header)
+            for part in parts:
+                with part.open("r", newline="", encoding="utf-8") as f:
+                    shutil.copyfileobj(f, out, 1024 * 1024)
+        os.replace(tmp, dst)
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    files = []
+    start = 0
+    for path, (_, rows) in zip(paths, results):
+        files.append(
+            {"path": str(path), "codec": codec(path), "rows": rows, "row_start": start}
+        )
+        start += rows
+    return {"files": files, "rows": start}
+
+
+def rows_after_offset(src: Path, offset: int, dst: Path) -> Tuple[int, int]:
+    """
+    Write the header of `src` plus its complete rows starting at or after
+    byte `offset` to `dst`. A last row without a trailing newline may still
+    be being appended and is left for the next run. Returns (end offset,
+    rows written); the end offset is where the next run starts. `offset`
+    is a row boundary (a previous end offset), and only the bytes past it
+    are indexed and copied.
+    """
+    index = rowindex.build(src, start=offset)
+    first = bisect_left(index.offsets, max(offset, index.header_end), 0, index.rows)
+    last = index.rows
+    if last > first and not _ends_with_newline(src):
+        last -= 1
+    start, end = index.span(first, last)
+    if last <= first:
+        end = max(offset, index.header_end)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(dst.name + ".tmp")
+    with src.open("rb") as f, tmp.open("wb") as out:
+        out.write(f.read(index.header_end))
+        f.seek(start)
+        remaining = end - start if last > first else 0
+        while remaining > 0:
+            chunk = f.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            out.write(chunk)
+            remaining -= len(chunk)
+    os.replace(tmp, dst)
+    return end, max(0, last - first)
+
+
+def _ends_with_newline(src: Path) -> bool:
+    with src.open("rb") as f:
+        f.seek(0, os.SEEK_END)
+        if not f.tell():
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def _id_key(value: str) -> Tuple[int, float, str]:
+    # numeric ids compare numerically and sort before non-numeric ones
+    try:
+        return (0, float(value), "")
+    except ValueError:
+        return (1, 0.0, value)
+
+
+def rows_after_id(
+    src: Path, column: str, after: Optional[str], dst: Path
+) -> Tuple[Optional[str], int]:
+    """
+    Write the rows of `src` whose `column` value is greater than `after`
+    (all rows when None) to `dst`. Returns (largest value seen, rows written).
+    """
+    bound = _id_key(after) if after is not None else None
+    top = after
+    rows = 0
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(dst.name + ".tmp")
+    with open_text(src) as f_in, tmp.open("w", newline="", encoding="utf-8") as f_out:
+        reader = csv.DictReader(f_in)
+        header = list(reader.fieldnames or [])
+        if column not in header:
+            raise ValueError(f"CSV Reader: watermark column '{column}' not in {src}")
+        writer = csv.DictWriter(f_out, fieldnames=header)
+        writer.writeheader()
+        for row in reader:
+            value = row.get(column) or ""
+            key = _id_key(value)
+            if bound is not None and key <= bound:
+                continue
+            writer.writerow(row)
+            rows += 1
+            if top is None or key > _id_key(top):
+                top = value
+    os.replace(tmp, dst)
+    return top, rows
@@ -0,0 +1,195 @@
+"""
+Object storage behind the blob store (app.infra.cas). With
+STORAGE_BACKEND=local, ARTIFACTS_DIR is the only copy of every blob, so API
+and workers must share that volume. With STORAGE_BACKEND=s3, every blob is
+also written to a bucket,
+
+    s3://<S3_BUCKET>/<S3_PREFIX>sha256/<digest>[.gz|.zst]
+
+and a node that does not have a blob on its disk downloads it on first
+use, so workers on different nodes exchange artifacts through the bucket.
+Large files go up as parallel multipart uploads and come down as parallel
+ranged GETs (S3_PART_SIZE bytes each, S3_TRANSFER_THREADS at a time).
+
+The s3 backend needs boto3, unless S3_ENDPOINT_URL is ``file:///<dir>``:
+that selects the filesystem emulator in app.infra.s3local, which serves
+the same calls from a directory (tests, or nodes sharing only a bucket
+directory).
+"""
+
+from __future__ import annotations
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from app.core.config import settings
+
+try:
+    import boto3
+except ImportError:  # optional; only STORAGE_BACKEND=s3 against a real endpoint needs it
+    boto3 = None
+
+CHUNK = 1024 * 1024
+_MISSING = {"404", "NoSuchKey", "NotFound"}
+
+
+class Backend:
+    """Remote copy of the blob store. The base class keeps nothing remotely."""
+
+    # whether blobs can be fetched from here by other nodes
+    shared = False
+
+    def put(self, key: str, src: Path) -> None:
+        pass
+
+    def get(self, key: str, dst: Path) -> bool:
+        """Download `key` to `dst`; False when there is no such object."""
+        return False
+
+    def delete(self, key: str) -> None:
+        pass
+
+
+class LocalBackend(Backend):
+    """ARTIFACTS_DIR holds the only copy (a single node or a shared volume)."""
+
+
+def _missing(exc: Exception) -> bool:
+    # botocore's ClientError and the emulator's errors both carry .response
+    code = (getattr(exc, "response", None) or {}).get("Error", {}).get("Code")
+    return str(code) in _MISSING
+
+
+class S3Backend(Backend):
+    shared = True
+
+    def __init__(
+        self,
+        client: Any,
+        bucket: str,
+        prefix: str = "",
+        part_size: int = 8 * CHUNK,
+        threads: int = 4,
+    ):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.part_size = max(1, int(part_size))
+        self.threads = max(1, int(threads))
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def _spans(self, size: int) -> List[Tuple[int, int]]:
+        return [(a, min(size, a + self.part_size)) for a in range(0, size, self.part_size)]
+
+    def put(self, key: str, src: Path) -> None:
+        size = src.stat().st_size
+        if size <= self.part_size:
+            with src.open("rb") as f:
+                self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=f)
+            return
+        upload = self.client.create_multipart_upload(Bucket=self.bucket, Key=self._key(key))
+        upload_id = upload["UploadId"]
+
+        def send(number: int, span: Tuple[int, int]) -> dict:
+            # each part reads its own range, so parts go up concurrently
+            with src.open("rb") as f:
+                f.seek(span[0])
+                body = f.read(span[1] - span[0])
+            etag = self.client.upload_part(
+                Bucket=self.bucket,
+                Key=self._key(key),
+                UploadId=upload_id,
+                PartNumber=number,
+                Body=body,
+            )["ETag"]
+            return {"ETag": etag, "PartNumber": number}
+
+        spans = self._spans(size)
+        try:
+            with ThreadPoolExecutor(self.threads) as pool:
+                parts = list(pool.map(send, range(1, len(spans) + 1), spans))
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self._key(key),
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except Exception:
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self._key(key), UploadId=upload_id
+            )
+            raise
+
+    def get(self, key: str, dst: Path) -> bool:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except Exception as e:
+            if _missing(e):
+                return False
+            raise
+        size = int(head["ContentLength"])
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(f".{dst.name}.{os.getpid()}.{threading.get_ident()}.part")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+
+        def fetch(span: Tuple[int, int]) -> None:
+            # ranged GETs land at their offset in the preallocated file
+            start, end = span
+            body = self.client.get_object(
+                Bucket=self.bucket, Key=self._key(key), Range=f"bytes={start}-{end - 1}"
+            )["Body"]
+            pos = start
+            while pos < end:
+                chunk = body.read(min(CHUNK, end - pos))
+                if not chunk:
+                    raise IOError(f"Short read of {key} at {pos} (expected {end})")
+                os.pwrite(fd, chunk, pos)
+                pos += len(chunk)
+
+        try:
+            os.ftruncate(fd, size)
+            with ThreadPoolExecutor(self.threads) as pool:
+                list(pool.map(fetch, self._spans(size)))
+        except BaseException:
+            os.close(fd)
+            tmp.unlink(missing_ok=True)
+            raise
+        os.close(fd)
+        os.replace(tmp, dst)
+        return True
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+
+@lru_cache(maxsize=4)
+def _client(endpoint: Optional[str], region: Optional[str]) -> Any:
+    if endpoint and endpoint.startswith("file://"):
+        from app.infra.s3local import FilesystemS3
+
+        return FilesystemS3(Path(unquote(urlparse(endpoint).path)))
+    if boto3 is None:
+        raise RuntimeError("STORAGE_BACKEND=s3 needs boto3 (or a file:// S3_ENDPOINT_URL)")
+    return boto3.client("s3", endpoint_url=endpoint or None, region_name=region or None)
+
+
+def backend() -> Backend:
+    """The backend STORAGE_BACKEND selects."""
+    name = (settings.STORAGE_BACKEND or "local").lower()
+    if name == "local":
+        return LocalBackend()
+    if name != "s3":
+        raise ValueError(f"Unknown STORAGE_BACKEND '{name}' (local | s3)")
+    return S3Backend(
+        _client(settings.S3_ENDPOINT_URL, settings.S3_REGION),
+        settings.S3_BUCKET,
+        prefix=settings.S3_PREFIX,
+        part_size=settings.S3_PART_SIZE,
+        threads=settings.S3_TRANSFER_THREADS,
+    )
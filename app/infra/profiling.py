@@ -0,0 +1,112 @@
+"""
+Input profile of a CSV file, computed from the raw records of the row-index
+scan (rowindex.build(src, profile)) so the file is read once: row count,
+byte size, SHA-256 of the content, and per column the inferred type, null
+count and a histogram of value lengths (text columns).
+"""
+
+from __future__ import annotations
+import csv
+import hashlib
+from typing import Any, Dict, List, Optional
+
+# value length buckets: [0, 16), [16, 64), ... [4096, inf)
+LENGTH_EDGES = (16, 64, 256, 1024, 4096)
+_TYPES = ("int", "float", "bool")
+_BOOLS = {"true", "false"}
+_PARSE_EVERY = 1024
+
+
+def _bucket_labels() -> List[str]:
+    lows = (0,) + LENGTH_EDGES
+    labels = [f"{lo}-{hi - 1}" for lo, hi in zip(lows, LENGTH_EDGES)]
+    return labels + [f"{LENGTH_EDGES[-1]}+"]
+
+
+def _fits(kind: str, value: str) -> bool:
+    if kind == "bool":
+        return value.lower() in _BOOLS
+    try:
+        (int if kind == "int" else float)(value)
+    except ValueError:
+        return False
+    return True
+
+
+class _Column:
+    def __init__(self) -> None:
+        self.nulls = 0
+        self.values = 0
+        self.types = set(_TYPES)
+        self.lengths = [0] * (len(LENGTH_EDGES) + 1)
+
+    def add(self, value: Optional[str]) -> None:
+        if value is None or value == "":
+            self.nulls += 1
+            return
+        self.values += 1
+        if self.types:
+            self.types = {t for t in self.types if _fits(t, value)}
+        n = len(value)
+        i = 0
+        while i < len(LENGTH_EDGES) and n >= LENGTH_EDGES[i]:
+            i += 1
+        self.lengths[i] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        if not self.values:
+            kind = "empty"
+        else:
+            kind = next((t for t in _TYPES if t in self.types), "string")
+        out: Dict[str, Any] = {"type": kind, "nulls": self.nulls}
+        if kind == "string":
+            out["lengths"] = dict(zip(_bucket_labels(), self.lengths))
+        return out
+
+
+class Profiler:
+    """
+    Receives every record of a CSV file in order (header first, blank lines
+    included) as raw bytes. Records are parsed in groups to keep csv.reader
+    calls cheap.
+    """
+
+    def __init__(self) -> None:
+        self._sha = hashlib.sha256()
+        self._pending: List[str] = []
+        self.bytes = 0
+        self.rows = 0
+        self.header: Optional[List[str]] = None
+        self._columns: List[_Column] = []
+
+    def record(self, raw: bytes) -> None:
+        self._sha.update(raw)
+        self.bytes += len(raw)
+        self._pending.append(raw.decode("utf-8"))
+        if len(self._pending) >= _PARSE_EVERY:
+            self._parse()
+
+    def _parse(self) -> None:
+        for rec in csv.reader(self._pending):
+            if self.header is None:
+                self.header = rec
+                self._columns = [_Column() for _ in rec]
+                continue
+            if not rec:
+                continue  # blank line, skipped like csv.DictReader
+            self.rows += 1
+            for i, col in enumerate(self._columns):
+                col.add(rec[i] if i < len(rec) else None)
+        self._pending = []
+
+    def result(self) -> Dict[str, Any]:
+        self._parse()
+        return {
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "sha256": self._sha.hexdigest(),
+            "schema": [
+                {"name": name, **col.summary()}
+                for name, col in zip(self.header or [], self._columns)
+            ],
+        }
@@ -0,0 +1,168 @@
+"""
+File downloads that never load the file into memory. Whole files go out as
+a FileResponse (streamed from disk); on top of that this handles validators
+(ETag, If-None-Match -> 304), a single ``Range: bytes=...`` (206, 416 when
+unsatisfiable, honouring If-Range) and HEAD, so clients can resume or fetch
+parallel chunks of large artifacts. Content that is produced as it is read
+(a blob being decompressed) goes out whole with stream_response().
+"""
+
+from __future__ import annotations
+from pathlib import Path
+from typing import IO, Callable, Dict, Iterator, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+CHUNK = 1024 * 1024
+
+
+class Unsatisfiable(ValueError):
+    pass
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    [start, end) of a single ``bytes=`` range against a file of `size`
+    bytes. None means serve the whole file (other units, several ranges or a
+    malformed header); raises Unsatisfiable when no byte of it exists.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0 or not size:
+                raise Unsatisfiable(header)
+            return max(0, size - suffix), size
+        start = int(first)
+        end = min(size, int(last) + 1) if last else size
+    except Unsatisfiable:
+        raise
+    except ValueError:
+        return None
+    if end <= start and last:
+        return None  # last < first: malformed, ignored
+    if start >= size:
+        raise Unsatisfiable(header)
+    return start, end
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 asks for GET/HEAD)."""
+    if header.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in header.split(","))
+
+
+def accepts_encoding(header: Optional[str], coding: str) -> bool:
+    """Whether an Accept-Encoding header admits `coding` (q=0 refuses it)."""
+    for item in (header or "").split(","):
+        name, _, params = item.partition(";")
+        if name.strip().lower() in (coding, "*"):
+            q = params.strip().removeprefix("q=")
+            try:
+                return float(q or 1) > 0
+            except ValueError:
+                return True
+    return False
+
+
+def stat_etag(path: Path) -> str:
+    st = path.stat()
+    return f'W/"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def iter_stream(open_stream: Callable[[], IO[bytes]]) -> Iterator[bytes]:
+    with open_stream() as f:
+        while True:
+            chunk = f.read(CHUNK)
+            if not chunk:
+                break
+            yield chunk
+
+
+def iter_file(path: Path, start: int, end: int) -> Iterator[bytes]:
+    with path.open("rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def file_response(
+    request: Request,
+    path: Path,
+    filename: str,
+    etag: Optional[str] = None,
+    media_type: str = "application/octet-stream",
+    extra_headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """Serve `path` for a GET or HEAD `request` (see module docstring)."""
+    etag = etag or stat_etag(path)
+    size = path.stat().st_size
+    headers: Dict[str, str] = {"ETag": etag, "Accept-Ranges": "bytes", **(extra_headers or {})}
+    inm = request.headers.get("if-none-match")
+    if inm is not None and etag_matches(inm, etag):
+        return Response(status_code=304, headers=headers)
+
+    span = None
+    header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if header and (if_range is None or if_range.strip() == etag):
+        try:
+            span = parse_range(header, size)
+        except Unsatisfiable:
+            return Response(
+                status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"}
+            )
+    if span is None:
+        return FileResponse(path, media_type=media_type, filename=filename, headers=headers)
+
+    start, end = span
+    headers.update(
+        {
+            "Content-Range": f"bytes {start}-{end - 1}/{size}",
+            "Content-Length": str(end - start),
+            "Content-Disposition": f'attachment; filename="{filename}"',
+        }
+    )
+    if request.method == "HEAD":
+        return Response(status_code=206, headers=headers, media_type=media_type)
+    return StreamingResponse(
+        iter_file(path, start, end), status_code=206, headers=headers, media_type=media_type
+    )
+
+
+def stream_response(
+    request: Request,
+    open_stream: Callable[[], IO[bytes]],
+    filename: str,
+    etag: str,
+    size: Optional[int] = None,
+    media_type: str = "application/octet-stream",
+    extra_headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Serve the stream `open_stream()` returns for a GET or HEAD `request`,
+    whole (no ranges: it cannot seek), with validators like file_response().
+    """
+    headers: Dict[str, str] = {"ETag": etag, **(extra_headers or {})}
+    inm = request.headers.get("if-none-match")
+    if inm is not None and etag_matches(inm, etag):
+        return Response(status_code=304, headers=headers)
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    if size is not None:
+        headers["Content-Length"] = str(size)
+    if request.method == "HEAD":
+        return Response(headers=headers, media_type=media_type)
+    return StreamingResponse(iter_stream(open_stream), headers=headers, media_type=media_type)
@@ -0,0 +1,182 @@
+"""
+Row-offset index of a CSV file: an array('Q') with the byte offset where
+each data row starts, followed by the end offset of the last row, so row i
+spans [offsets[i], offsets[i + 1]). Built in one pass over an mmap of the
+file and persisted as a sidecar:
+
+    b"ROWIDX1\\0" <u64 size> <u64 mtime_ns> <u64 rows> <u64 header end> <offsets>
+
+A sidecar whose recorded size/mtime no longer match its source is ignored.
+cached() keeps the most recently used indexes in memory for paged reads.
+"""
+
+from __future__ import annotations
+import csv
+import io
+import mmap
+import os
+import struct
+import sys
+from array import array
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from app.infra.profiling import Profiler
+
+MAGIC = b"ROWIDX1\0"
+# indexes held by cached(); each costs 8 bytes per row
+CACHED_INDEXES = 16
+_HEAD = struct.Struct("<QQQQ")
+_SWAP = sys.byteorder != "little"
+
+
+class RowIndex:
+    def __init__(self, offsets: array, header_end: int, size: int, mtime_ns: int):
+        self.offsets = offsets
+        self.header_end = header_end
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    @property
+    def rows(self) -> int:
+        return max(0, len(self.offsets) - 1)
+
+    def span(self, start: int, end: Optional[int] = None) -> Tuple[int, int]:
+        """Byte range of data rows [start, end) (0-based, clamped)."""
+        end = self.rows if end is None else min(end, self.rows)
+        start = min(max(0, start), end)
+        return self.offsets[start], self.offsets[end]
+
+    def matches(self, src: Path) -> bool:
+        st = src.stat()
+        return st.st_size == self.size and st.st_mtime_ns == self.mtime_ns
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        offsets = array("Q", self.offsets)
+        if _SWAP:
+            offsets.byteswap()
+        tmp = path.with_name(path.name + ".tmp")
+        with tmp.open("wb") as f:
+            f.write(MAGIC)
+            f.write(_HEAD.pack(self.size, self.mtime_ns, self.rows, self.header_end))
+            f.write(offsets.tobytes())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "RowIndex":
+        with path.open("rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a row index: {path}")
+            size, mtime_ns, rows, header_end = _HEAD.unpack(f.read(_HEAD.size))
+            offsets = array("Q")
+            offsets.frombytes(f.read(8 * (rows + 1)))
+        if _SWAP:
+            offsets.byteswap()
+        return cls(offsets, header_end, size, mtime_ns)
+
+
+def build(
+    src: Path, profile: Optional["Profiler"] = None, start: int = 0
+) -> RowIndex:
+    """
+    Scan `src` once and record where every data row starts. Newlines inside
+    quoted fields do not end a row (a row ends at the first newline after an
+    even number of quote characters), and blank lines are skipped like
+    csv.DictReader does. Every record (header and blank lines included) is
+    also handed to `profile`, if given, in the same pass.
+
+    With `start` (a row boundary), the scan jumps there after the header, so
+    only the rows from that byte on are indexed and the bytes before it are
+    never read: the cost of indexing an append-only file's tail is that of
+    the tail. Such an index describes the tail only and is not saved as the
+    file's sidecar.
+    """
+    st = src.stat()
+    offsets = array("Q")
+    header_end = 0
+    if st.st_size:
+        with src.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            pos = row_start = quotes = 0
+            header = True
+            while row_start < size:
+                nl = mm.find(b"\n", pos)
+                stop = size if nl == -1 else nl + 1
+                line = mm[pos:stop]
+                quotes += line.count(b'"')
+                pos = stop
+                if quotes % 2 and nl != -1:
+                    continue  # newline inside a quoted field
+                record = mm[row_start:stop]
+                if profile is not None:
+                    profile.record(record)
+                if header:
+                    header, header_end = False, stop
+                    stop = pos = max(stop, min(start, size))
+                elif record.strip(b"\r\n"):
+                    offsets.append(row_start)
+                row_start, quotes = stop, 0
+    offsets.append(st.st_size)
+    return RowIndex(offsets, header_end, st.st_size, st.st_mtime_ns)
+
+
+def load_valid(path: Optional[Path | str], src: Path) -> Optional[RowIndex]:
+    """The sidecar at `path` if it still describes `src`, else None."""
+    if not path:
+        return None
+    try:
+        index = RowIndex.load(Path(path))
+    except (OSError, ValueError, struct.error):
+        return None
+    return index if index.matches(src) else None
+
+
+def cached(src: Path, sidecar: Path) -> RowIndex:
+    """
+    Index of `src`: from memory, else from the sidecar at `sidecar`, else
+    built and saved there. Entries are keyed by the file's size and mtime,
+    so a rewritten file is indexed afresh.
+    """
+    st = src.stat()
+    return _cached(str(src), st.st_size, st.st_mtime_ns, str(sidecar))
+
+
+@lru_cache(maxsize=CACHED_INDEXES)
+def _cached(src: str, size: int, mtime_ns: int, sidecar: str) -> RowIndex:
+    index = load_valid(sidecar, Path(src))
+    if index is None:
+        index = build(Path(src))
+        try:
+            index.save(Path(sidecar))
+        except OSError:
+            pass  # still usable from memory
+    return index
+
+
+def open_rows(src: Path, index: RowIndex, start: int) -> Tuple[List[str], io.TextIOWrapper]:
+    """
+    Return (header, text stream positioned at data row `start`) without
+    scanning the rows before it. The caller closes the stream.
+    """
+    f = src.open("rb")
+    header = next(csv.reader(io.StringIO(f.read(index.header_end).decode("utf-8"))), [])
+    f.seek(index.span(start)[0])
+    return header, io.TextIOWrapper(f, encoding="utf-8", newline="")
+
+
+def read_header(src: Path, index: RowIndex) -> List[str]:
+    with src.open("rb") as f:
+        return next(csv.reader(io.StringIO(f.read(index.header_end).decode("utf-8"))), [])
+
+
+def read_rows(src: Path, index: RowIndex, start: int, limit: int) -> List[Dict[str, str]]:
+    """Rows [start, start + limit) as dicts, read with one seek."""
+    a, b = index.span(start, start + limit)
+    header = read_header(src, index)
+    with src.open("rb") as f:
+        f.seek(a)
+        chunk = f.read(b - a).decode("utf-8")
+    return list(csv.DictReader(io.StringIO(chunk, newline=""), fieldnames=header))
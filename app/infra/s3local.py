@@ -0,0 +1,165 @@
+"""
+Filesystem stand-in for the S3 API: the subset of a boto3 S3 client that
+app.infra.objectstore calls, served from a directory,
+
+    <root>/<bucket>/<key>                       objects
+    <root>/.multipart/<upload id>/<part number>  parts of open uploads
+
+Errors carry a botocore-style ``response`` ({"Error": {"Code": ...}}).
+Objects are written to a temporary file and renamed, so readers on other
+processes never see a partial object.
+"""
+
+from __future__ import annotations
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+CHUNK = 1024 * 1024
+
+
+class S3Error(Exception):
+    def __init__(self, code: str, message: str):
+        super().__init__(f"{code}: {message}")
+        self.response = {"Error": {"Code": code, "Message": message}}
+
+
+class _Range:
+    """Read-only view of [start, end) of a file, like a streaming response body."""
+
+    def __init__(self, path: Path, start: int, end: int):
+        self._f = path.open("rb")
+        self._f.seek(start)
+        self._left = end - start
+
+    def read(self, n: int = -1) -> bytes:
+        if n < 0 or n > self._left:
+            n = self._left
+        data = self._f.read(n)
+        self._left -= len(data)
+        if not self._left:
+            self._f.close()
+        return data
+
+    def close(self) -> None:
+        self._f.close()
+
+
+def _write(dst: Path, body: Any) -> str:
+    """Write bytes or a file object to `dst` atomically; returns the MD5 ETag."""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(f".{dst.name}.{uuid.uuid4().hex}.tmp")
+    md5 = hashlib.md5()
+    with tmp.open("wb") as f:
+        if isinstance(body, (bytes, bytearray, memoryview)):
+            md5.update(body)
+            f.write(body)
+        else:
+            while True:
+                chunk = body.read(CHUNK)
+                if not chunk:
+                    break
+                md5.update(chunk)
+                f.write(chunk)
+    os.replace(tmp, dst)
+    return f'"{md5.hexdigest()}"'
+
+
+class FilesystemS3:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        # calls by operation name, for callers that want to see what was sent
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, op: str) -> None:
+        with self._lock:
+            self.calls[op] = self.calls.get(op, 0) + 1
+
+    def _object(self, bucket: str, key: str) -> Path:
+        path = (self.root / bucket / key).resolve()
+        if not path.is_relative_to(self.root.resolve() / bucket):
+            raise S3Error("InvalidKey", key)
+        return path
+
+    def _upload(self, upload_id: str) -> Path:
+        path = self.root / ".multipart" / upload_id
+        if not upload_id.isalnum() or not path.is_dir():
+            raise S3Error("NoSuchUpload", upload_id)
+        return path
+
+    def put_object(self, Bucket: str, Key: str, Body: Any = b"", **_: Any) -> Dict[str, Any]:
+        self._count("put_object")
+        return {"ETag": _write(self._object(Bucket, Key), Body)}
+
+    def head_object(self, Bucket: str, Key: str, **_: Any) -> Dict[str, Any]:
+        self._count("head_object")
+        path = self._object(Bucket, Key)
+        if not path.is_file():
+            raise S3Error("404", Key)
+        return {"ContentLength": path.stat().st_size}
+
+    def get_object(
+        self, Bucket: str, Key: str, Range: Optional[str] = None, **_: Any
+    ) -> Dict[str, Any]:
+        self._count("get_object")
+        path = self._object(Bucket, Key)
+        if not path.is_file():
+            raise S3Error("NoSuchKey", Key)
+        size = path.stat().st_size
+        start, end = 0, size
+        if Range:
+            first, _, last = Range.removeprefix("bytes=").partition("-")
+            start, end = int(first), min(size, int(last) + 1)
+            if start >= size:
+                raise S3Error("InvalidRange", Range)
+        return {"Body": _Range(path, start, end), "ContentLength": end - start}
+
+    def delete_object(self, Bucket: str, Key: str, **_: Any) -> Dict[str, Any]:
+        self._count("delete_object")
+        self._object(Bucket, Key).unlink(missing_ok=True)
+        return {}
+
+    def create_multipart_upload(self, Bucket: str, Key: str, **_: Any) -> Dict[str, Any]:
+        self._count("create_multipart_upload")
+        self._object(Bucket, Key)
+        upload_id = uuid.uuid4().hex
+        (self.root / ".multipart" / upload_id).mkdir(parents=True)
+        return {"UploadId": upload_id}
+
+    def upload_part(
+        self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: Any, **_: Any
+    ) -> Dict[str, Any]:
+        self._count("upload_part")
+        return {"ETag": _write(self._upload(UploadId) / str(int(PartNumber)), Body)}
+
+    def complete_multipart_upload(
+        self, Bucket: str, Key: str, UploadId: str, MultipartUpload: Dict[str, List], **_: Any
+    ) -> Dict[str, Any]:
+        self._count("complete_multipart_upload")
+        parts_dir = self._upload(UploadId)
+        parts = sorted(MultipartUpload["Parts"], key=lambda p: p["PartNumber"])
+        dst = self._object(Bucket, Key)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(f".{dst.name}.{UploadId}.tmp")
+        with tmp.open("wb") as out:
+            for part in parts:
+                path = parts_dir / str(part["PartNumber"])
+                if not path.is_file():
+                    raise S3Error("InvalidPart", str(part["PartNumber"]))
+                with path.open("rb") as f:
+                    shutil.copyfileobj(f, out, CHUNK)
+        os.replace(tmp, dst)
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        return {"ETag": f'"{UploadId}-{len(parts)}"'}
+
+    def abort_multipart_upload(
+        self, Bucket: str, Key: str, UploadId: str, **_: Any
+    ) -> Dict[str, Any]:
+        self._count("abort_multipart_upload")
+        shutil.rmtree(self.root / ".multipart" / UploadId, ignore_errors=True)
+        return {}
@@ -0,0 +1,113 @@
+"""
+Deterministic row samples of a CSV for preview runs. Rows are picked by
+index with a seeded RNG and copied byte for byte through the row-offset
+index, in their original order, so the same input, size and seed always
+give the same sample.
+"""
+
+from __future__ import annotations
+import csv
+import math
+import os
+import random
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.infra import cas, rowindex
+
+METHODS = ("reservoir", "stratified")
+
+
+def sample_size(total: int, rows: Optional[int], fraction: Optional[float]) -> int:
+    if rows is not None:
+        return min(total, max(0, int(rows)))
+    return min(total, math.ceil(total * float(fraction or 0)))
+
+
+def reservoir(total: int, k: int, rng: random.Random) -> List[int]:
+    """Algorithm R over row numbers 0..total-1; returns sorted picks."""
+    picks = list(range(min(k, total)))
+    for i in range(k, total):
+        j = rng.randint(0, i)
+        if j < k:
+            picks[j] = i
+    return sorted(picks)
+
+
+def stratified(groups: Dict[str, List[int]], total: int, k: int, rng: random.Random) -> List[int]:
+    """
+    Proportional allocation: each stratum gets round(k * size / total) rows
+    (at least one), sampled with reservoir(). Strata are visited in sorted
+    order so the draw does not depend on input order.
+    """
+    picks: List[int] = []
+    for key in sorted(groups):
+        members = groups[key]
+        share = min(len(members), max(1, round(k * len(members) / total)))
+        picks.extend(members[i] for i in reservoir(len(members), share, rng))
+    return sorted(picks)
+
+
+def _strata(src: Path, column: str) -> Dict[str, List[int]]:
+    groups: Dict[str, List[int]] = {}
+    with src.open(newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        if column not in (reader.fieldnames or []):
+            raise ValueError(f"Sample: stratify column '{column}' not in {src}")
+        for i, row in enumerate(reader):
+            groups.setdefault(row.get(column) or "", []).append(i)
+    return groups
+
+
+def sample_csv(
+    src: Path,
+    dst: Path,
+    rows: Optional[int] = None,
+    fraction: Optional[float] = None,
+    method: str = "reservoir",
+    by: Optional[str] = None,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Write a sample of `rows` rows (or `fraction` of them) of `src` to `dst`.
+    Returns {"rows": picked, "of": total}.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Sample: unknown method '{method}' ({' | '.join(METHODS)})")
+    index = rowindex.build(src)
+    total = index.rows
+    k = sample_size(total, rows, fraction)
+    rng = random.Random(seed)
+    if method == "stratified":
+        if not by:
+            raise ValueError("Sample: stratified sampling needs a column ('by')")
+        picks = stratified(_strata(src, by), total, k, rng)
+    else:
+        picks = reservoir(total, k, rng)
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(dst.name + ".tmp")
+    with src.open("rb") as f, tmp.open("wb") as out:
+        _copy(f, out, index.header_end)
+        i = 0
+        while i < len(picks):
+            # copy runs of consecutive rows as one range
+            j = i
+            while j + 1 < len(picks) and picks[j + 1] == picks[j] + 1:
+                j += 1
+            start, end = index.span(picks[i], picks[j] + 1)
+            f.seek(start)
+            _copy(f, out, end - start)
+            i = j + 1
+    os.replace(tmp, dst)
+    return {"rows": len(picks), "of": total}
+
+
+def _copy(f: Any, out: Any, n: int) -> None:
+    """Copy the next `n` bytes of `f` to `out`, at most cas.CHUNK at a time."""
+    while n > 0:
+        chunk = f.read(min(n, cas.CHUNK))
+        if not chunk:
+            break
+        out.write(chunk)
+        n -= len(chunk)
@@ -29,6 +29,12 @@ def _heuristic_toxic(text: str) -> str:
     t = text.lower()
     return "TOXIC" if any(w in t for w in _INSULTS) else "NON_TOXIC"
 
+def _heuristic(sys: str, text: str) -> str:
+    if "sentiment" in sys and "tox" in sys:
+        # multi-task prompt: "SENTIMENT,TOXICITY"
+        return f"{_heuristic_sentiment(text)},{_heuristic_toxic(text)}"
+    return _heuristic_sentiment(text) if "sentiment" in sys else _heuristic_toxic(text)
+
 # --- Public API used by steps & tests ----------------------------------------
 
 def llm_predict(prompt: str, system: Optional[str] = None) -> str:
@@ -48,10 +54,12 @@ def llm_predict(prompt: str, system: Optional[str] = None) -> str:
             api_key = getattr(settings, "GEMINI_API_KEY", None)
             if not api_key:
                 # No key → fall back to heuristic to avoid hard failures in tests
-                return _heuristic_sentiment(text) if "sentiment" in sys else _heuristic_toxic(text)
+                return _heuristic(sys, text)
             llm = ChatGoogleGenerativeAI(model=model, api_key=api_key)
             # Keep it simple; prompt already contains instruction + text
             out = llm.predict(prompt).strip().upper()
+            if "sentiment" in sys and "tox" in sys:
+                return out  # the step parses and coerces both labels
             if "sentiment" in sys:
                 return out if out in {"POSITIVE", "NEGATIVE", "NEUTRAL"} else _heuristic_sentiment(text)
             if "tox" in sys:
@@ -59,9 +67,11 @@ def llm_predict(prompt: str, system: Optional[str] = None) -> str:
             return out
         except Exception:
             # Any runtime/import error → safe heuristic
-            return _heuristic_sentiment(text) if "sentiment" in sys else _heuristic_toxic(text)
+            return _heuristic(sys, text)
 
     # Default: mock/heuristic (CI/static)
+    if "sentiment" in sys and "tox" in sys:
+        return _heuristic(sys, text)
     if "sentiment" in sys:
         return _heuristic_sentiment(text)
     if "tox" in sys:
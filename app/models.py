@@ -12,9 +12,15 @@ from sqlalchemy import (
     Text,
     UniqueConstraint,
     Index,
+    Boolean,
+    event,
     func,
+    insert,
+    select,
+    update,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from app.infra import cas
 from app.infra.db import Base
 
 
@@ -22,6 +28,7 @@ class BlockType(str, Enum):
     CSV_READER = "CSV_READER"
     LLM_SENTIMENT = "LLM_SENTIMENT"
     LLM_TOXICITY = "LLM_TOXICITY"
+    LLM_MULTI_CLASSIFY = "LLM_MULTI_CLASSIFY"
     FILE_WRITER = "FILE_WRITER"
     CSV_WRITER = "CSV_WRITER"
 
@@ -42,9 +49,13 @@ class ArtifactKind(str, Enum):
 
 class Pipeline(Base):
     __tablename__ = "pipelines"
+    # keyset pages of GET /pipelines (the unique name index serves order=name)
+    __table_args__ = (Index("ix_pipelines_created_at_id", "created_at", "id"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(200), unique=True, nullable=False)
     version: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    # "auto" | "queued" | "fused" (whole run in one worker, rows kept in memory)
+    execution: Mapped[str] = mapped_column(String(16), nullable=False, default="auto")
     created_at: Mapped[datetime] = mapped_column(
         DateTime, default=func.now(), nullable=False
     )
@@ -108,6 +119,9 @@ class Edge(Base):
     to_block_id: Mapped[int] = mapped_column(
         ForeignKey("blocks.id", ondelete="CASCADE"), nullable=False
     )
+    # "batch": child waits for the parent to finish; "stream": child starts as
+    # soon as the parent has sealed its first output segment
+    mode: Mapped[str] = mapped_column(String(16), default="batch", nullable=False)
 
     pipeline: Mapped["Pipeline"] = relationship(back_populates="edges")
     from_block: Mapped["Block"] = relationship(
@@ -121,8 +135,10 @@ class Edge(Base):
 class PipelineRun(Base):
     __tablename__ = "pipeline_runs"
     __table_args__ = (
-        Index("ix_pipeline_runs_status", "status"),
-        Index("ix_pipeline_runs_started_at", "started_at"),
+        # keyset pages of GET /runs, unfiltered and per status / pipeline
+        Index("ix_pipeline_runs_started_at_id", "started_at", "id"),
+        Index("ix_pipeline_runs_status_started_at_id", "status", "started_at", "id"),
+        Index("ix_pipeline_runs_pipeline_started_at_id", "pipeline_id", "started_at", "id"),
     )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     pipeline_id: Mapped[int] = mapped_column(
@@ -134,6 +150,8 @@ class PipelineRun(Base):
     correlation_id: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
     started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # preview runs: {"rows" | "fraction", "method", "by", "seed"} (see app.infra.sampling)
+    sample_json: Mapped[dict | None] = mapped_column(JSON, nullable=True)
 
     pipeline: Mapped["Pipeline"] = relationship(back_populates="runs")
     block_runs: Mapped[List["BlockRun"]] = relationship(
@@ -146,7 +164,11 @@ class PipelineRun(Base):
 
 class BlockRun(Base):
     __tablename__ = "block_runs"
-    __table_args__ = (Index("ix_block_runs_status", "status"),)
+    __table_args__ = (
+        Index("ix_block_runs_status", "status"),
+        # keyset pages of GET /runs/{id}/block_runs?order=started_at
+        Index("ix_block_runs_run_started_at_id", "pipeline_run_id", "started_at", "id"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     pipeline_run_id: Mapped[int] = mapped_column(
         ForeignKey("pipeline_runs.id", ondelete="CASCADE"), nullable=False, index=True
@@ -160,6 +182,12 @@ class BlockRun(Base):
     attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     worker_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
     error_msg: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # Streaming progress of the last attempt (rows written, output size) so a
+    # retry can resume mid-file instead of starting over.
+    checkpoint_json: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    # Sharded execution: number of planned shards and when a worker claimed the merge
+    shard_count: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    merge_started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
@@ -168,11 +196,46 @@ class BlockRun(Base):
     artifacts: Mapped[List["Artifact"]] = relationship(
         back_populates="block_run", cascade="all, delete-orphan"
     )
+    shards: Mapped[List["BlockShard"]] = relationship(
+        back_populates="block_run", cascade="all, delete-orphan"
+    )
+
+
+class BlockShard(Base):
+    """A contiguous row range [row_start, row_end) of a sharded BlockRun."""
+
+    __tablename__ = "block_shards"
+    __table_args__ = (
+        UniqueConstraint("block_run_id", "shard_index", name="uq_block_shard_index"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    block_run_id: Mapped[int] = mapped_column(
+        ForeignKey("block_runs.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    shard_index: Mapped[int] = mapped_column(Integer, nullable=False)
+    row_start: Mapped[int] = mapped_column(Integer, nullable=False)
+    row_end: Mapped[int] = mapped_column(Integer, nullable=False)
+    status: Mapped["RunStatus"] = mapped_column(
+        SAEnum(RunStatus), default=RunStatus.QUEUED, nullable=False
+    )
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    worker_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    error_msg: Mapped[str | None] = mapped_column(Text, nullable=True)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    block_run: Mapped["BlockRun"] = relationship(back_populates="shards")
 
 
 class Artifact(Base):
     __tablename__ = "artifacts"
-    __table_args__ = (Index("ix_artifacts_kind", "kind"),)
+    __table_args__ = (
+        Index("ix_artifacts_kind", "kind"),
+        # "outputs of my parents in this run" (app.core.lineage.parent_outputs)
+        Index("ix_artifacts_run_block_kind", "pipeline_run_id", "block_id", "kind"),
+        # GET /runs/{id}/artifacts?kind= in id order
+        Index("ix_artifacts_run_kind_id", "pipeline_run_id", "kind", "id"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     pipeline_run_id: Mapped[int] = mapped_column(
         ForeignKey("pipeline_runs.id", ondelete="CASCADE"), nullable=False, index=True
@@ -180,16 +243,152 @@ class Artifact(Base):
     block_run_id: Mapped[int | None] = mapped_column(
         ForeignKey("block_runs.id", ondelete="SET NULL"), nullable=True, index=True
     )
+    # producing block (copied from the BlockRun on insert)
+    block_id: Mapped[int | None] = mapped_column(
+        ForeignKey("blocks.id", ondelete="SET NULL"), nullable=True
+    )
     kind: Mapped["ArtifactKind"] = mapped_column(
         SAEnum(ArtifactKind), default=ArtifactKind.GENERIC, nullable=False
     )
     uri: Mapped[str] = mapped_column(String(500), nullable=False)
     preview_json: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    # storage details, e.g. {"format": "colstore", "rows": ..., "columns": [...]}
+    meta_json: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    # produced by a sampled preview run (set on insert from the run)
+    preview: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
 
     pipeline_run: Mapped["PipelineRun"] = relationship(back_populates="artifacts")
     block_run: Mapped["BlockRun"] = relationship(back_populates="artifacts")
 
 
+class ArtifactLineage(Base):
+    """Edge of the artifact graph: `artifact_id` was computed from `input_artifact_id`."""
+
+    __tablename__ = "artifact_lineage"
+    __table_args__ = (
+        UniqueConstraint("artifact_id", "input_artifact_id", name="uq_artifact_lineage"),
+        Index("ix_artifact_lineage_input", "input_artifact_id"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    pipeline_run_id: Mapped[int] = mapped_column(
+        ForeignKey("pipeline_runs.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    artifact_id: Mapped[int] = mapped_column(
+        ForeignKey("artifacts.id", ondelete="CASCADE"), nullable=False
+    )
+    input_artifact_id: Mapped[int] = mapped_column(
+        ForeignKey("artifacts.id", ondelete="CASCADE"), nullable=False
+    )
+
+
+class Blob(Base):
+    """
+    A file in the content-addressed store (app.infra.cas), named by its
+    SHA-256. `refcount` counts the artifacts whose uri is ``cas://<digest>``.
+    """
+
+    __tablename__ = "blobs"
+    digest: Mapped[str] = mapped_column(String(64), primary_key=True)
+    size: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    refcount: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=func.now(), nullable=False
+    )
+
+
+class Upload(Base):
+    """
+    A chunked upload in progress: parts are PUT independently (and may be
+    re-sent), then assembled into the blob store on completion.
+    """
+
+    __tablename__ = "uploads"
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    pipeline_run_id: Mapped[int] = mapped_column(
+        ForeignKey("pipeline_runs.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    block_run_id: Mapped[int | None] = mapped_column(
+        ForeignKey("block_runs.id", ondelete="SET NULL"), nullable=True
+    )
+    kind: Mapped["ArtifactKind"] = mapped_column(
+        SAEnum(ArtifactKind), default=ArtifactKind.GENERIC, nullable=False
+    )
+    filename: Mapped[str] = mapped_column(String(255), nullable=False)
+    # the artifact it became; NULL while parts are still coming in
+    artifact_id: Mapped[int | None] = mapped_column(
+        ForeignKey("artifacts.id", ondelete="SET NULL"), nullable=True
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=func.now(), nullable=False
+    )
+
+
+class UploadPart(Base):
+    __tablename__ = "upload_parts"
+    __table_args__ = (UniqueConstraint("upload_id", "number", name="uq_upload_part"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    upload_id: Mapped[str] = mapped_column(
+        ForeignKey("uploads.id", ondelete="CASCADE"), nullable=False
+    )
+    number: Mapped[int] = mapped_column(Integer, nullable=False)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    sha256: Mapped[str] = mapped_column(String(64), nullable=False)
+
+
+class StreamSegment(Base):
+    """
+    A sealed prefix of a block's growing output file: bytes [0, byte_end) are
+    final and safe for streaming consumers to read while the producer runs.
+    """
+
+    __tablename__ = "stream_segments"
+    __table_args__ = (
+        Index("ix_stream_segments_br_kind_seq", "block_run_id", "kind", "seq"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    pipeline_run_id: Mapped[int] = mapped_column(
+        ForeignKey("pipeline_runs.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    block_run_id: Mapped[int] = mapped_column(
+        ForeignKey("block_runs.id", ondelete="CASCADE"), nullable=False
+    )
+    kind: Mapped["ArtifactKind"] = mapped_column(SAEnum(ArtifactKind), nullable=False)
+    seq: Mapped[int] = mapped_column(Integer, nullable=False)
+    uri: Mapped[str] = mapped_column(String(500), nullable=False)
+    byte_end: Mapped[int] = mapped_column(Integer, nullable=False)
+    rows: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=func.now(), nullable=False
+    )
+
+
+class InputWatermark(Base):
+    """
+    How far an incremental CSV_READER has consumed its append-only input:
+    the byte offset after the last processed row, or the largest value of
+    its watermark column. Advanced only when a run succeeds.
+    """
+
+    __tablename__ = "input_watermarks"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    pipeline_id: Mapped[int] = mapped_column(
+        ForeignKey("pipelines.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    block_id: Mapped[int] = mapped_column(
+        ForeignKey("blocks.id", ondelete="CASCADE"), nullable=False, unique=True
+    )
+    source: Mapped[str] = mapped_column(String(500), nullable=False)
+    byte_offset: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    max_id: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    rows: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    pipeline_run_id: Mapped[int | None] = mapped_column(
+        ForeignKey("pipeline_runs.id", ondelete="SET NULL"), nullable=True
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=func.now(), onupdate=func.now(), nullable=False
+    )
+
+
 class BlockQueue(Base):
     __tablename__ = "block_queue"
     __table_args__ = (
@@ -211,13 +410,23 @@ class BlockQueue(Base):
     taken_by: Mapped[str | None] = mapped_column(String(64), nullable=True)
     taken_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     attempt: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # None = the whole block; otherwise one BlockShard of a sharded block
+    shard_index: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # the whole run executed in memory by one worker (block_id = first block)
+    fused: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    # locality hint: only this worker (which ran the parent) may claim the
+    # item until prefer_until
+    preferred_worker: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    prefer_until: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
 
 class LogRecord(Base):
     __tablename__ = "logs"
+    # a run's timeline in order (also serves lookups by pipeline_run_id alone)
+    __table_args__ = (Index("ix_logs_run_created_at_id", "pipeline_run_id", "created_at", "id"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     pipeline_run_id: Mapped[int | None] = mapped_column(
-        ForeignKey("pipeline_runs.id", ondelete="CASCADE"), nullable=True, index=True
+        ForeignKey("pipeline_runs.id", ondelete="CASCADE"), nullable=True
     )
     block_run_id: Mapped[int | None] = mapped_column(
         ForeignKey("block_runs.id", ondelete="SET NULL"), nullable=True, index=True
@@ -241,3 +450,34 @@ class PipelineHistory(Base):
         DateTime, default=func.now(), nullable=False
     )
     __table_args__ = (Index("ix_ph_name_version", "pipeline_name", "version"),)
+
+
+@event.listens_for(Artifact, "before_insert")
+def _fill_artifact_from_run(mapper, connection, target: Artifact) -> None:
+    sample = connection.scalar(
+        select(PipelineRun.sample_json).where(PipelineRun.id == target.pipeline_run_id)
+    )
+    target.preview = bool(sample)
+    if target.block_id is None and target.block_run_id is not None:
+        target.block_id = connection.scalar(
+            select(BlockRun.block_id).where(BlockRun.id == target.block_run_id)
+        )
+    digest = cas.digest_of(target.uri)
+    if digest:
+        _retain_blob(connection, digest)
+
+
+def _retain_blob(connection, digest: str) -> None:
+    bumped = connection.execute(
+        update(Blob).where(Blob.digest == digest).values(refcount=Blob.refcount + 1)
+    ).rowcount
+    if not bumped:
+        found = cas.stored(digest)
+        connection.execute(
+            insert(Blob).values(
+                digest=digest,
+                size=found[0].stat().st_size if found else 0,
+                refcount=1,
+                created_at=datetime.utcnow(),
+            )
+        )
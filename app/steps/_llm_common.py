@@ -1,18 +1,20 @@
 from __future__ import annotations
 from pathlib import Path
-from typing import Optional
-from sqlalchemy import select
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from app import models
 from app.core.config import settings
+from app.infra import cas, rowindex
 from app.infra.artifacts import ensure_dir
+from app.infra.logsink import log_event
+from app.steps.batch import map_rows, transform_csv
 
+RowFn = Callable[[Dict[str, str]], Dict[str, Any]]
 
-def fetch_csv_rows_artifact_path(db: Session, run_id: int) -> Path:
-    """
-    Return the filesystem Path of the CSV_ROWS artifact for a run.
-    Raises a clear error if not present or missing on disk.
-    """
+
+def fetch_csv_rows_artifact(db: Session, run_id: int) -> models.Artifact:
+    """Return the CSV_ROWS artifact of a run; raises if the block has not produced it."""
     csv_art: Optional[models.Artifact] = (
         db.execute(
             select(models.Artifact).where(
@@ -25,15 +27,222 @@ def fetch_csv_rows_artifact_path(db: Session, run_id: int) -> Path:
     )
     if not csv_art:
         raise RuntimeError("No CSV_ROWS artifact found for run")
-    path = Path(csv_art.uri)
+    return csv_art
+
+
+def fetch_csv_rows_artifact_path(db: Session, run_id: int) -> Path:
+    """
+    Return the filesystem Path of the CSV_ROWS artifact for a run.
+    Raises a clear error if not present or missing on disk.
+    """
+    path = cas.resolve_uri(fetch_csv_rows_artifact(db, run_id).uri)
     if not path.exists():
         raise FileNotFoundError(f"CSV_ROWS artifact path does not exist: {path}")
     return path
 
 
+def artifact_index(art: models.Artifact) -> Optional[rowindex.RowIndex]:
+    """Valid row-offset index recorded on a CSV artifact, if any."""
+    meta = art.meta_json or {}
+    path = cas.resolve_uri(art.uri, decompress=False)
+    if not path.exists():
+        return None  # compressed: read as it is decompressed, without seeks
+    return rowindex.load_valid(meta.get("row_index"), path)
+
+
 def output_dir_for_run(run_id: int) -> Path:
     """
     Create (if needed) and return an output directory for this run under ARTIFACTS_DIR.
     """
     base = Path(settings.ARTIFACTS_DIR)
     return ensure_dir(base / "runs" / str(run_id))
+
+
+def row_text(row: Dict[str, str]) -> str:
+    return str(row.get("text") or row.get("content") or "")
+
+
+def source_size(src: Path) -> Optional[int]:
+    """
+    Bytes of a CSV file, or of all files of a column store directory; None
+    for a blob's read-cache path, which its digest already identifies.
+    """
+    if cas.exists(src) and not src.exists():
+        return None
+    if src.is_dir():
+        return sum(f.stat().st_size for f in src.iterdir() if f.is_file())
+    return src.stat().st_size
+
+
+class BlockCheckpoint:
+    """
+    Streaming progress of a block, persisted on BlockRun.checkpoint_json.
+    A retry of the same BlockRun resumes after the last recorded row instead
+    of paying for every model call again.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        br: models.BlockRun,
+        src: Path,
+        out_paths: Sequence[Path],
+        every: int,
+    ):
+        self.db = db
+        self.br = br
+        self.every = max(0, int(every))
+        self._src = {"path": str(src), "size": source_size(src)}
+        self.rows = 0
+        self.sizes: Dict[str, int] = {}
+        state = br.checkpoint_json or {}
+        sizes = state.get("outputs") or {}
+        if (
+            state.get("source") == self._src
+            and set(sizes) == {str(p) for p in out_paths}
+            and all(
+                p.exists() and p.stat().st_size >= int(sizes[str(p)])
+                for p in out_paths
+            )
+        ):
+            self.rows = int(state.get("rows") or 0)
+            self.sizes = {k: int(v) for k, v in sizes.items()}
+
+    # seal a final checkpoint once the input is exhausted
+    seal_at_end = False
+
+    def save(self, rows: int, sizes: Dict[str, int]) -> None:
+        self.rows, self.sizes = rows, dict(sizes)
+        self.br.checkpoint_json = {
+            "rows": rows,
+            "outputs": self.sizes,
+            "source": self._src,
+        }
+        self.db.add(self.br)
+        self.db.commit()
+
+
+class StreamCheckpoint(BlockCheckpoint):
+    """
+    Checkpoint of a block with outgoing stream edges. Every save also seals a
+    StreamSegment per output, so consumers can read the output file up to the
+    sealed offset while this block is still running. The first seal enqueues
+    the stream children.
+    """
+
+    seal_at_end = True
+
+    def __init__(
+        self,
+        db: Session,
+        br: models.BlockRun,
+        src: Path,
+        outputs: Dict[Path, models.ArtifactKind],
+        every: int,
+    ):
+        super().__init__(db, br, src, list(outputs), every)
+        self._kinds = {str(p): kind for p, kind in outputs.items()}
+
+    def save(self, rows: int, sizes: Dict[str, int]) -> None:
+        sealed = self.rows
+        super().save(rows, sizes)
+        seq = self.db.scalar(
+            select(func.count(models.StreamSegment.id)).where(
+                models.StreamSegment.block_run_id == self.br.id
+            )
+        ) or 0
+        for path, size in sizes.items():
+            seq += 1
+            self.db.add(
+                models.StreamSegment(
+                    pipeline_run_id=self.br.pipeline_run_id,
+                    block_run_id=self.br.id,
+                    kind=self._kinds[path],
+                    seq=seq,
+                    uri=path,
+                    byte_end=size,
+                    rows=rows - sealed,
+                )
+            )
+        self.db.commit()
+        if seq == len(sizes):
+            from app.core.scheduler import Scheduler
+
+            Scheduler(self.db).on_stream_started(
+                self.br.pipeline_run_id, self.br.block_id
+            )
+
+
+def has_stream_children(db: Session, block: models.Block) -> bool:
+    return bool(
+        db.scalar(
+            select(func.count(models.Edge.id)).where(
+                models.Edge.from_block_id == block.id,
+                models.Edge.mode == "stream",
+            )
+        )
+    )
+
+
+def checkpoint_for(
+    db: Session,
+    br: models.BlockRun,
+    src: Path,
+    outputs: Dict[Path, models.ArtifactKind],
+) -> BlockCheckpoint:
+    block = db.get(models.Block, br.block_id)
+    cfg = (block.config_json or {}) if block else {}
+    every = cfg.get("checkpoint_every")
+    if every is None:
+        every = settings.CHECKPOINT_EVERY_ROWS
+    if block and has_stream_children(db, block):
+        seg = int(cfg.get("segment_rows") or settings.STREAM_SEGMENT_ROWS)
+        every = min(seg, every) if every else seg
+        ckpt: BlockCheckpoint = StreamCheckpoint(db, br, src, outputs, every)
+    else:
+        ckpt = BlockCheckpoint(db, br, src, list(outputs), every)
+    if ckpt.rows:
+        log_event(
+            db,
+            level="INFO",
+            message="block_resumed",
+            pipeline_run_id=br.pipeline_run_id,
+            block_run_id=br.id,
+            worker_id=br.worker_id,
+            extra={"block_id": br.block_id, "rows_done": ckpt.rows},
+        )
+    return ckpt
+
+
+def enrich_csv_multi(
+    src: Path,
+    sinks: Sequence[Tuple[Path, Sequence[str]]],
+    enrich: RowFn,
+    checkpoint: Optional[BlockCheckpoint] = None,
+    row_range: Optional[Tuple[int, int]] = None,
+    index: Optional[rowindex.RowIndex] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Row-function form of transform_csv: `enrich` returns the added values
+    of one row. Returns the first PREVIEW_ROWS rows of each sink.
+    """
+    return transform_csv(
+        src,
+        sinks,
+        map_rows(enrich),
+        checkpoint=checkpoint,
+        row_range=row_range,
+        batch_rows=settings.STEP_BATCH_ROWS,
+        index=index,
+    )
+
+
+def enrich_csv(
+    src: Path,
+    out_path: Path,
+    enrich: RowFn,
+    added: Sequence[str],
+    checkpoint: Optional[BlockCheckpoint] = None,
+) -> List[Dict[str, Any]]:
+    """Single-output enrich_csv_multi; returns the preview rows."""
+    return enrich_csv_multi(src, [(out_path, added)], enrich, checkpoint)[0]
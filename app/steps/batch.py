@@ -0,0 +1,427 @@
+from __future__ import annotations
+import csv
+import io
+import os
+from contextlib import ExitStack
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from app.infra import cas, colstore, rowindex
+from app.infra.artifacts import read_csv_head
+
+if TYPE_CHECKING:
+    from app.steps._llm_common import BlockCheckpoint
+
+PREVIEW_ROWS = 5
+
+# Added columns of a batch, one value per row
+Columns = Dict[str, List[Any]]
+
+
+@dataclass
+class RecordBatch:
+    """A fixed-size run of input rows stored column-wise."""
+
+    fieldnames: List[str]
+    columns: Columns
+    num_rows: int
+
+    @classmethod
+    def from_rows(
+        cls, fieldnames: Sequence[str], rows: Sequence[Dict[str, Any]]
+    ) -> "RecordBatch":
+        names = list(fieldnames)
+        return cls(
+            fieldnames=names,
+            columns={name: [r.get(name) for r in rows] for name in names},
+            num_rows=len(rows),
+        )
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def column(self, name: str) -> List[Any]:
+        return self.columns.get(name) or [None] * self.num_rows
+
+    def row(self, i: int) -> Dict[str, Any]:
+        return {name: values[i] for name, values in self.columns.items()}
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        for i in range(self.num_rows):
+            yield self.row(i)
+
+
+BatchFn = Callable[[RecordBatch], Columns]
+
+
+class BatchFailed(Exception):
+    """
+    Raised by a batch function that failed part way: `columns` hold the added
+    values of the first `done` rows, which the runtime still writes and
+    checkpoints before re-raising `cause`.
+    """
+
+    def __init__(self, done: int, columns: Columns, cause: Exception):
+        super().__init__(str(cause))
+        self.done = done
+        self.columns = columns
+        self.cause = cause
+
+
+def map_rows(fn: Callable[[Dict[str, Any]], Dict[str, Any]]) -> BatchFn:
+    """Lift a row function (row -> added values) to a batch function."""
+
+    def process(batch: RecordBatch) -> Columns:
+        out: Columns = {}
+        for i, row in enumerate(batch.rows()):
+            try:
+                values = fn(row)
+            except Exception as e:
+                raise BatchFailed(i, out, e) from e
+            for k, v in values.items():
+                out.setdefault(k, [None] * i).append(v)
+        return out
+
+    return process
+
+
+def output_fieldnames(
+    header: Optional[Sequence[str]], added: Sequence[str]
+) -> List[str]:
+    """Input header followed by the columns a step adds (existing names keep their slot)."""
+    base = list(header) if header else ["id", "text"]
+    return base + [c for c in added if c not in base]
+
+
+def input_header(src: Path) -> List[str]:
+    """Column names of a CSV file or column store."""
+    if colstore.is_store(src):
+        return colstore.ColumnStore(src).columns
+    with io.TextIOWrapper(cas.open_source(src), encoding="utf-8", newline="") as f:
+        return next(csv.reader(f), None) or []
+
+
+def _cut_batches(
+    runs: Iterator[Tuple[List[str], List[List[Any]]]],
+    skip: int,
+    end: Optional[int],
+    every: int,
+    batch_rows: int,
+    seen: int = 0,
+) -> Iterator[Tuple[int, RecordBatch]]:
+    """
+    Re-slice runs of column values into RecordBatches of at most `batch_rows`
+    rows, cut at multiples of `every` and restricted to rows (skip, end]
+    (1-based). `seen` is the number of rows the runs start after. Yields
+    (index of the batch's first row, batch).
+    """
+    names: List[str] = []
+    pending: Columns = {}
+    count = 0
+    first = 0
+    for names, cols in runs:
+        n = len(cols[0]) if cols else 0
+        pos = 0
+        while pos < n:
+            i = seen + pos + 1
+            if end is not None and i > end:
+                break
+            if i <= skip:
+                pos = min(n, skip - seen)
+                continue
+            limit = min(n, pos + batch_rows - count)
+            if every:
+                limit = min(limit, pos + every - (i - 1) % every)
+            if end is not None:
+                limit = min(limit, end - seen)
+            if not count:
+                first = i
+                pending = {name: [] for name in names}
+            for name, values in zip(names, cols):
+                pending[name].extend(values[pos:limit])
+            count += limit - pos
+            pos = limit
+            last = seen + limit
+            if count >= batch_rows or (every and last % every == 0):
+                yield first, RecordBatch(list(names), pending, count)
+                count = 0
+        seen += n
+        if end is not None and seen >= end:
+            break
+    if count:
+        yield first, RecordBatch(list(names), pending, count)
+
+
+def _dict_runs(reader: csv.DictReader, header: List[str]) -> Iterator[Tuple[List[str], List[List[Any]]]]:
+    for row in reader:
+        yield header, [[row.get(name)] for name in header]
+
+
+def read_batches(
+    stack: ExitStack,
+    src: Path,
+    batch_rows: int,
+    skip: int = 0,
+    end: Optional[int] = None,
+    every: int = 0,
+    columns: Optional[Sequence[str]] = None,
+    index: Optional[rowindex.RowIndex] = None,
+) -> Tuple[Optional[List[str]], Iterator[Tuple[int, RecordBatch]]]:
+    """
+    Open `src` (CSV file or column store) and return (header, batches). A
+    column store reads only `columns` (all when None); CSV always parses
+    whole rows. With a row `index` of the CSV, skipped rows are seeked over
+    instead of parsed. A compressed blob (see cas.open_source()) is read as
+    it is decompressed, unless the index has rows to seek over.
+    """
+    if colstore.is_store(src):
+        store = colstore.ColumnStore(src)
+        runs = store.iter_rows(columns)
+        return store.columns, _cut_batches(runs, skip, end, every, batch_rows)
+    if index is not None and skip:
+        skip = min(skip, index.rows)
+        header, f_in = rowindex.open_rows(cas.local_file(src), index, skip)
+        stack.enter_context(f_in)
+        reader = csv.DictReader(f_in, fieldnames=header)
+        runs = _dict_runs(reader, header)
+        return header or None, _cut_batches(runs, skip, end, every, batch_rows, seen=skip)
+    f_in = stack.enter_context(
+        io.TextIOWrapper(cas.open_source(src), encoding="utf-8", newline="")
+    )
+    reader = csv.DictReader(f_in)
+    header = list(reader.fieldnames) if reader.fieldnames else None
+    runs = _dict_runs(reader, header or [])
+    return header, _cut_batches(runs, skip, end, every, batch_rows)
+
+
+def truncate_private(path: Path, size: int) -> None:
+    """
+    Cut `path` back to `size` bytes for a resumed attempt. A file that is
+    also linked elsewhere (a stored output shares its inode with the blob)
+    is first replaced by a private copy of those bytes, so the blob is
+    never truncated.
+    """
+    if path.stat().st_nlink > 1:
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.resume")
+        try:
+            with path.open("rb") as f_in, tmp.open("wb") as f_out:
+                remaining = size
+                while remaining > 0:
+                    chunk = f_in.read(min(remaining, cas.CHUNK))
+                    if not chunk:
+                        break
+                    f_out.write(chunk)
+                    remaining -= len(chunk)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        return
+    with path.open("r+b") as f:
+        f.truncate(size)
+
+
+def transform_csv(
+    src: Path,
+    sinks: Sequence[Tuple[Path, Sequence[str]]],
+    process: BatchFn,
+    checkpoint: Optional["BlockCheckpoint"] = None,
+    row_range: Optional[Tuple[int, int]] = None,
+    batch_rows: int = 256,
+    index: Optional[rowindex.RowIndex] = None,
+    hashed: Optional[Dict[str, Tuple[str, int]]] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Stream `src` through `process` in record batches of up to `batch_rows`
+    rows and append each batch to every sink `(out_path, added_columns)`, so
+    memory stays bounded regardless of input size. Each sink gets the input
+    columns plus its own added columns. Returns the first PREVIEW_ROWS rows of
+    each sink.
+
+    With a `checkpoint`, batches are cut at multiples of `checkpoint.every` and
+    progress is recorded there and when an attempt fails (stream checkpoints
+    also seal the tail at the end); a resumed attempt truncates the outputs
+    back to the checkpoint, skips the rows already done and appends the rest.
+
+    `row_range=(start, end)` restricts processing to data rows [start, end)
+    (0-based), which is how shards of a block split the input. With the
+    input's row `index`, shards and resumed attempts seek straight to their
+    first row.
+
+    The sinks are hashed as they are written; when the transform completes,
+    `hashed` (if given) maps each out path to its (digest, size) so the blob
+    store need not read the outputs again (see cas.ingest()).
+    """
+    start, end = row_range if row_range else (0, None)
+    done = checkpoint.rows if checkpoint and checkpoint.sizes else 0
+    every = checkpoint.every if checkpoint else 0
+    batch_rows = max(1, int(batch_rows))
+    previews: List[List[Dict[str, Any]]] = []
+    for out_path, _ in sinks:
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        if done:
+            truncate_private(out_path, checkpoint.sizes[str(out_path)])
+            previews.append(read_csv_head(out_path, limit=PREVIEW_ROWS))
+        else:
+            # a finished output may be a link to a stored blob: never write through it
+            out_path.unlink(missing_ok=True)
+            previews.append([])
+
+    with ExitStack() as stack:
+        header, batches = read_batches(
+            stack,
+            src,
+            batch_rows,
+            skip=max(done, start),
+            end=end,
+            every=every,
+            index=index,
+        )
+        outs = []
+        raws = []
+        for out_path, added in sinks:
+            f_out, raw = cas.open_hashing(out_path, resume=bool(done))
+            stack.enter_context(f_out)
+            raws.append((str(out_path), raw))
+            fieldnames = output_fieldnames(header, added)
+            writer = csv.DictWriter(f_out, fieldnames=fieldnames, extrasaction="ignore")
+            if not done:
+                writer.writeheader()
+            outs.append((str(out_path), f_out, writer, fieldnames))
+
+        def save(rows: int) -> None:
+            for _, f_out, _, _ in outs:
+                f_out.flush()
+            checkpoint.save(rows, {name: f_out.tell() for name, f_out, _, _ in outs})
+
+        def write(batch: RecordBatch, added: Columns, n: int) -> None:
+            for j in range(n):
+                row = batch.row(j)
+                for name, values in added.items():
+                    row[name] = values[j]
+                for (_, _, writer, fieldnames), preview in zip(outs, previews):
+                    writer.writerow(row)
+                    if len(preview) < PREVIEW_ROWS:
+                        preview.append({k: row.get(k) for k in fieldnames})
+
+        written = done
+        try:
+            for first, batch in batches:
+                try:
+                    added = process(batch)
+                except BatchFailed as bf:
+                    # rows before the failing one are complete; keep them
+                    write(batch, bf.columns, bf.done)
+                    written = first + bf.done - 1
+                    raise bf.cause
+                write(batch, added, len(batch))
+                written = first + len(batch) - 1
+                if every and written % every == 0:
+                    save(written)
+            if checkpoint and checkpoint.seal_at_end and (
+                written > checkpoint.rows or not checkpoint.sizes
+            ):
+                save(written)
+        except Exception:
+            if checkpoint and written > checkpoint.rows:
+                save(written)
+            raise
+    if hashed is not None:
+        hashed.update((name, raw.hashed()) for name, raw in raws)
+    return previews
+
+
+def store_files(src: Path, dst: Path, added: Sequence[str]) -> List[Path]:
+    """Column files of the store `dst` that a transform of `src` writes itself."""
+    linked = set(input_header(src)) if colstore.is_store(src) else set()
+    names = output_fieldnames(input_header(src), added)
+    return [dst / colstore.column_file(i) for i, n in enumerate(names) if n not in linked]
+
+
+def transform_store(
+    src: Path,
+    sinks: Sequence[Tuple[Path, Sequence[str]]],
+    process: BatchFn,
+    checkpoint: Optional["BlockCheckpoint"] = None,
+    batch_rows: int = 256,
+    columns: Optional[Sequence[str]] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Column store counterpart of transform_csv: each sink `(store_dir, added)`
+    is a store holding the input columns plus `added`. When `src` is itself a
+    store, its column files are hard-linked into every sink and only
+    `columns` are read for `process`, so adding a column never rewrites the
+    others. Checkpoints track the column files written here (store_files).
+    """
+    done = checkpoint.rows if checkpoint and checkpoint.sizes else 0
+    every = checkpoint.every if checkpoint else 0
+    batch_rows = max(1, int(batch_rows))
+    source = colstore.ColumnStore(src) if colstore.is_store(src) else None
+    header = input_header(src)
+
+    writers = []
+    for dst, added in sinks:
+        w = colstore.StoreWriter(
+            dst, output_fieldnames(header, added), linked=source, resume=bool(done)
+        )
+        if done:
+            for f in w.written_files():
+                truncate_private(f, checkpoint.sizes[str(f)])
+        writers.append(w)
+
+    def save(rows: int) -> None:
+        checkpoint.save(
+            rows,
+            {str(f): f.stat().st_size for w in writers for f in w.written_files()},
+        )
+
+    def write(batch: RecordBatch, added: Columns, n: int) -> None:
+        values = dict(batch.columns)
+        values.update(added)
+        for w in writers:
+            w.append(values, n)
+
+    written = done
+    with ExitStack() as stack:
+        # a CSV source is written out in full; a store source only feeds `columns`
+        _, batches = read_batches(
+            stack,
+            src,
+            batch_rows,
+            skip=done,
+            every=every,
+            columns=columns if source else None,
+        )
+        try:
+            for first, batch in batches:
+                try:
+                    added = process(batch)
+                except BatchFailed as bf:
+                    write(batch, bf.columns, bf.done)
+                    written = first + bf.done - 1
+                    raise bf.cause
+                write(batch, added, len(batch))
+                written = first + len(batch) - 1
+                if every and written % every == 0:
+                    save(written)
+        except Exception:
+            if checkpoint and written > checkpoint.rows:
+                save(written)
+            raise
+
+    rows = source.rows if source else written
+    previews = []
+    for w in writers:
+        w.close(rows)
+        previews.append(colstore.ColumnStore(w.path).head(PREVIEW_ROWS))
+    return previews
@@ -1,52 +1,99 @@
 from __future__ import annotations
-import csv
 from pathlib import Path
-from typing import List, Dict
+from typing import Any, Dict, List
 
 from sqlalchemy.orm import Session
 from app import models
+from app.core import watermarks
+from app.core.config import settings
+from app.infra import inputs, sampling
+from app.steps._llm_common import output_dir_for_run
+from app.steps.runtime import BatchStep, StepContext, StepIO, StepOutput
+
+
+class CsvReaderStep(BatchStep):
+    """
+    Publishes the configured input CSV as the run's CSV_ROWS, in place. A
+    glob, a directory or compressed files are decoded in parallel into one
+    CSV under the run directory, with a manifest of the source files. With
+    `incremental: true` only rows past the pipeline's watermark (a byte
+    offset, or the largest `watermark_column` value) are published, and a
+    preview run publishes a deterministic sample of the rows. One
+    scan of the input records a row-offset index (so downstream steps,
+    shards and previews can seek) and a profile of the input (rows, bytes,
+    sha256, column types, nulls, value lengths) on the artifact metadata.
+    """
+
+    name = "CSV_READER"
+    profile_input = True
+
+    def bind(self, ctx: StepContext) -> StepIO:
+        input_path = ctx.cfg.get("input_path")
+        if not input_path:
+            raise ValueError("CSV_READER requires 'input_path' in config")
+        paths = inputs.resolve(str(input_path))
+        if inputs.is_plain(paths):
+            # The artifact points directly at the input CSV; nothing is copied
+            src = paths[0]
+        else:
+            src = output_dir_for_run(ctx.run.id) / "csv_rows.csv"
+            workers = ctx.cfg.get("workers") or settings.CSV_READER_WORKERS
+            ctx.state["manifest"] = inputs.combine(paths, src, workers=int(workers))
+        if ctx.cfg.get("incremental"):
+            src = self._new_rows(ctx, paths, src)
+        if ctx.run.sample_json:
+            sampled = output_dir_for_run(ctx.run.id) / "csv_rows.sample.csv"
+            ctx.state["sample"] = {
+                **ctx.run.sample_json,
+                **sampling.sample_csv(src, sampled, **ctx.run.sample_json),
+            }
+            src = sampled
+        return StepIO(input=src, outputs=[StepOutput(models.ArtifactKind.CSV_ROWS, src)])
+
+    def _new_rows(self, ctx: StepContext, paths: List[Path], src: Path) -> Path:
+        """
+        Incremental mode: copy only the rows past the pipeline's watermark to
+        the run directory and remember where the next run should start. The
+        watermark itself moves when the run succeeds (app.core.watermarks).
+        """
+        mode = ctx.cfg.get("watermark") or "offset"
+        dst = output_dir_for_run(ctx.run.id) / "csv_rows.new.csv"
+        source = str(ctx.cfg["input_path"])
+        wm = watermarks.current(ctx.db, ctx.block.id)
+        if wm is not None and wm.source != source:
+            wm = None  # input moved; start over
+        if mode == "offset":
+            if not inputs.is_plain(paths):
+                raise ValueError(
+                    "CSV_READER: incremental 'offset' watermarks need a single "
+                    "uncompressed file; use watermark: id"
+                )
+            if wm is not None and wm.byte_offset > src.stat().st_size:
+                wm = None  # truncated or rotated: reprocess from the start
+            end, rows = inputs.rows_after_offset(src, wm.byte_offset if wm else 0, dst)
+            mark = {"byte_offset": end, "max_id": None}
+        elif mode == "id":
+            column = ctx.cfg.get("watermark_column") or "id"
+            top, rows = inputs.rows_after_id(src, column, wm.max_id if wm else None, dst)
+            mark = {"byte_offset": 0, "max_id": top}
+        else:
+            raise ValueError(f"CSV_READER: unknown watermark '{mode}' (offset | id)")
+        ctx.state["watermark"] = {
+            "block_id": ctx.block.id,
+            "source": source,
+            "rows": (wm.rows if wm else 0) + rows,
+            "new_rows": rows,
+            **mark,
+        }
+        return dst
+
+    def artifact_meta(self, ctx: StepContext, output: StepOutput) -> Dict[str, Any]:
+        keys = ("manifest", "watermark", "sample")
+        return {k: ctx.state[k] for k in keys if k in ctx.state}
+
+
+STEP = CsvReaderStep()
 
 
 def run(db: Session, block_run_id: int) -> None:
-    br = db.get(models.BlockRun, block_run_id)
-    if not br:
-        raise RuntimeError(f"BlockRun not found: {block_run_id}")
-    block = db.get(models.Block, br.block_id)
-    if not block:
-        raise RuntimeError(f"Block not found: {br.block_id}")
-    run = db.get(models.PipelineRun, br.pipeline_run_id)
-    if not run:
-        raise RuntimeError(f"PipelineRun not found: {br.pipeline_run_id}")
-
-    cfg = block.config_json or {}
-    input_path = cfg.get("input_path")
-    if not input_path:
-        raise ValueError("CSV_READER requires 'input_path' in config")
-
-    src = Path(input_path)
-    if not src.exists():
-        raise FileNotFoundError(f"CSV Reader: file not found: {src}")
-
-    # Build a small preview for convenience (first 5 rows)
-    preview: List[Dict[str, str]] = []
-    try:
-        with src.open("r", newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for i, row in enumerate(reader):
-                if i >= 5:
-                    break
-                preview.append(dict(row))
-    except Exception:
-        # Preview is optional; don't fail the whole step if CSV is huge/oddly formatted
-        preview = []
-
-    # Persist artifact so downstream steps (sentiment/toxicity) can locate input rows
-    art = models.Artifact(
-        pipeline_run_id=run.id,
-        block_run_id=br.id,
-        kind=models.ArtifactKind.CSV_ROWS,
-        uri=str(src),  # Point directly at the input CSV
-        preview_json={"rows": preview},  # Keep tiny to avoid bloating DB
-    )
-    db.add(art)
-    db.commit()
+    STEP.run(db, block_run_id)
@@ -1,50 +1,77 @@
 from __future__ import annotations
 import csv
-import shutil
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app import models
-from app.llm import langchain_client as llm_client
-
-SENTIMENT_PROMPT = (
-    "You are a strict sentiment classifier.\n"
-    "Return exactly one of: POSITIVE, NEGATIVE, NEUTRAL.\n"
-    "Text: {text}\n"
-    "Answer:\n"
-)
-TOXIC_PROMPT = (
-    "You are a strict toxicity classifier.\n"
-    "Return exactly one of: TOXIC or NON_TOXIC.\n"
-    "Text: {text}\n"
-    "Answer:\n"
+from app.core import lineage
+from app.core.config import settings
+from app.infra import cas, rowindex
+from app.infra.artifacts import copy_file
+from app.steps._llm_common import output_dir_for_run
+from app.steps.runtime import (
+    BatchStep,
+    StepContext,
+    StepIO,
+    StepOutput,
+    load_context,
+    run_batch_step,
+    sink_path,
 )
-_SCORE_MAP: Dict[str, int] = {"NEGATIVE": 0, "NEUTRAL": 2, "POSITIVE": 5}
+
+WRITE_MODES = ("overwrite", "append", "merge")
+
+
+class StreamPaused(Exception):
+    """
+    The stream producer stopped (a failed attempt waiting for its retry):
+    the consumer gives its worker back and is requeued for `not_before`.
+    """
+
+    def __init__(self, not_before: Optional[datetime] = None):
+        super().__init__("upstream stream paused until its retry")
+        self.not_before = not_before
 
 
-def _get_upstream_block(db: Session, pipeline_id: int, this_block_id: int) -> models.Block:
-    edge = (
+def _upstream_edges(db: Session, this_block_id: int) -> List[models.Edge]:
+    edges = list(
         db.execute(
-            select(models.Edge).where(
-                models.Edge.pipeline_id == pipeline_id,
-                models.Edge.to_block_id == this_block_id,
-            )
-        )
-        .scalars()
-        .first()
+            select(models.Edge)
+            .where(models.Edge.to_block_id == this_block_id)
+            .order_by(models.Edge.id)
+        ).scalars()
     )
-    if not edge:
+    if not edges:
         raise RuntimeError(f"CSV_WRITER: no upstream edge found for block_id={this_block_id}")
+    return edges
+
+
+def _upstream_block(db: Session, edge: models.Edge) -> models.Block:
     up = db.get(models.Block, edge.from_block_id)
     if not up:
         raise RuntimeError(f"CSV_WRITER: upstream block not found: id={edge.from_block_id}")
     return up
 
 
-def _artifact_kind_for_upstream(up_type: models.BlockType) -> models.ArtifactKind:
+def _artifact_kind_for_upstream(
+    up_type: models.BlockType, source_kind: Optional[str] = None
+) -> models.ArtifactKind:
+    if up_type == models.BlockType.LLM_MULTI_CLASSIFY:
+        # Emits both SENTIMENT_CSV and TOXICITY_CSV; the writer picks one
+        if source_kind not in ("SENTIMENT_CSV", "TOXICITY_CSV"):
+            raise RuntimeError(
+                "CSV_WRITER: 'source_kind' (SENTIMENT_CSV or TOXICITY_CSV) is required "
+                "downstream of LLM_MULTI_CLASSIFY"
+            )
+        return models.ArtifactKind[source_kind]
     if up_type == models.BlockType.LLM_SENTIMENT:
         return models.ArtifactKind.SENTIMENT_CSV
     if up_type == models.BlockType.LLM_TOXICITY:
@@ -54,162 +81,322 @@ def _artifact_kind_for_upstream(up_type: models.BlockType) -> models.ArtifactKin
     raise RuntimeError(f"CSV_WRITER: unsupported upstream type {up_type}")
 
 
-def _find_artifact_for_upstream(
-    db: Session, run_id: int, upstream_block_id: int, kind: models.ArtifactKind
-) -> Optional[models.Artifact]:
-    # Prefer artifact produced by that specific upstream block
-    ar = (
-        db.execute(
-            select(models.Artifact)
-            .join(models.BlockRun, models.BlockRun.id == models.Artifact.block_run_id)
-            .where(
-                models.Artifact.pipeline_run_id == run_id,
-                models.BlockRun.block_id == upstream_block_id,
-                models.Artifact.kind == kind,
+def _upstream_artifact(ctx: StepContext) -> Tuple[models.ArtifactKind, models.Artifact]:
+    """
+    The single artifact this writer should write: the expected kind of each
+    parent (see _artifact_kind_for_upstream) looked up among that parent's
+    outputs in this run.
+    """
+    found = []
+    for edge in _upstream_edges(ctx.db, ctx.block.id):
+        up = _upstream_block(ctx.db, edge)
+        kind = _artifact_kind_for_upstream(up.type, ctx.cfg.get("source_kind"))
+        arts = lineage.block_outputs(ctx.db, ctx.run.id, up.id, kind)
+        if not arts:
+            raise RuntimeError(
+                f"CSV_WRITER: upstream block '{up.name}' produced no {kind.value} artifact "
+                f"in run {ctx.run.id}"
             )
-            .order_by(models.Artifact.id.desc())
+        found.append((kind, arts[-1]))
+    if len(found) > 1:
+        raise RuntimeError(
+            "CSV_WRITER: several upstream blocks; a writer takes exactly one input"
         )
-        .scalars()
-        .first()
-    )
-    if ar:
-        return ar
+    return found[0]
 
-    # Fallback: any artifact of that kind for the run
-    return (
-        db.execute(
-            select(models.Artifact)
-            .where(
-                models.Artifact.pipeline_run_id == run_id,
-                models.Artifact.kind == kind,
-            )
-            .order_by(models.Artifact.id.desc())
-        )
-        .scalars()
-        .first()
-    )
 
+def _copy_range(src: Path, dst, start: int, end: int) -> None:
+    with src.open("rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                raise RuntimeError(f"CSV_WRITER: stream source truncated: {src}")
+            dst.write(chunk)
+            remaining -= len(chunk)
 
-def _find_csv_rows_path(db: Session, run_id: int) -> Path:
-    art = (
-        db.execute(
-            select(models.Artifact)
-            .where(
-                models.Artifact.pipeline_run_id == run_id,
-                models.Artifact.kind == models.ArtifactKind.CSV_ROWS,
+
+def _stream_from_upstream(
+    db: Session,
+    run_id: int,
+    upstream_block_id: int,
+    kind: models.ArtifactKind,
+    outp: Path,
+    timeout: float,
+    poll: float,
+) -> Tuple[str, int]:
+    """
+    Consume the upstream output over a stream edge: append each newly sealed
+    segment to `outp` while the producer runs, then the tail once it has
+    SUCCEEDED. Sealed bytes never change, so a producer retry that resumes
+    from its checkpoint keeps what was already copied valid. Returns the
+    (digest, size) of `outp`, hashed as it was written. Raises StreamPaused
+    when the producer's failed attempt is queued for a retry.
+    """
+    deadline = time.monotonic() + timeout
+    pos = 0
+    outp.unlink(missing_ok=True)  # may be a link to a stored blob from an earlier run
+    with cas.HashingWriter(outp) as out:
+        while True:
+            db.expire_all()
+            up_br = db.execute(
+                select(models.BlockRun).where(
+                    models.BlockRun.pipeline_run_id == run_id,
+                    models.BlockRun.block_id == upstream_block_id,
+                )
+            ).scalar_one_or_none()
+            seg = (
+                db.execute(
+                    select(models.StreamSegment)
+                    .where(
+                        models.StreamSegment.block_run_id == (up_br.id if up_br else 0),
+                        models.StreamSegment.kind == kind,
+                    )
+                    .order_by(models.StreamSegment.seq.desc())
+                )
+                .scalars()
+                .first()
             )
-            .order_by(models.Artifact.id.asc())
+            finished = up_br is not None and up_br.status == models.RunStatus.SUCCEEDED
+            if finished:
+                arts = lineage.block_outputs(db, run_id, upstream_block_id, kind)
+                if not arts:
+                    raise FileNotFoundError(
+                        f"CSV_WRITER: upstream finished without a {kind.value} artifact"
+                    )
+                src = cas.resolve_uri(arts[-1].uri)
+                end = src.stat().st_size
+            elif seg:
+                src, end = Path(seg.uri), seg.byte_end
+            else:
+                src, end = None, pos
+            if src is not None and end > pos:
+                _copy_range(src, out, pos, end)
+                out.flush()
+                pos = end
+            if finished:
+                return out.hashed()
+            run = db.get(models.PipelineRun, run_id)
+            if run and run.status == models.RunStatus.FAILED:
+                raise RuntimeError("CSV_WRITER: upstream stream failed")
+            if up_br is not None and up_br.status != models.RunStatus.RUNNING:
+                retry = db.execute(
+                    select(models.BlockQueue).where(
+                        models.BlockQueue.pipeline_run_id == run_id,
+                        models.BlockQueue.block_id == upstream_block_id,
+                        models.BlockQueue.taken_by.is_(None),
+                    )
+                ).scalars().first()
+                if retry is not None:
+                    # don't hold a worker while the producer waits for its turn
+                    raise StreamPaused(retry.not_before_at)
+                if up_br.status == models.RunStatus.FAILED:
+                    raise RuntimeError("CSV_WRITER: upstream stream failed")
+            if time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"CSV_WRITER: upstream block {upstream_block_id} did not finish "
+                    f"within {timeout}s"
+                )
+            time.sleep(poll)
+
+
+def _read_header(path: Path) -> list:
+    with path.open(newline="", encoding="utf-8") as f:
+        return next(csv.reader(f), None) or []
+
+
+def _append_csv(src: Path, dst: Path) -> None:
+    """Append the data rows of `src` to `dst`; both must have the same header."""
+    if not dst.exists() or not dst.stat().st_size:
+        copy_file(src, dst)
+        return
+    if _read_header(src) != _read_header(dst):
+        raise ValueError(f"CSV_WRITER: cannot append to {dst}: header differs from the new rows")
+    if dst.stat().st_nlink > 1:
+        # an earlier overwrite may have hard-linked a run artifact here
+        copy_file(dst, dst)
+    header_end = rowindex.build(src).header_end
+    with dst.open("rb+") as out:
+        out.seek(-1, os.SEEK_END)
+        missing_newline = out.read(1) != b"\n"
+        out.seek(0, os.SEEK_END)
+        if missing_newline:
+            out.write(b"\r\n")
+        _copy_range(src, out, header_end, src.stat().st_size)
+
+
+def _merge_csv(src: Path, dst: Path, key: str) -> None:
+    """
+    Upsert the rows of `src` into `dst` by `key`: existing rows keep their
+    position and are replaced by newer versions, new keys are appended.
+    Rows are staged in a SQLite table on disk next to `dst`, so memory does
+    not grow with either file.
+    """
+    if not dst.exists() or not dst.stat().st_size:
+        copy_file(src, dst)
+        return
+    fieldnames: list = []
+    for path in (dst, src):
+        with path.open(newline="", encoding="utf-8") as f:
+            header = next(csv.reader(f), [])
+        if key not in header:
+            raise ValueError(f"CSV_WRITER: merge_key '{key}' not in {path}")
+        fieldnames += [c for c in header if c not in fieldnames]
+
+    def rows():
+        for path in (dst, src):
+            with path.open(newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    # rows without a key are never merged (NULLs are all distinct)
+                    yield row.get(key) or None, json.dumps(row)
+
+    tmp = dst.with_name(dst.name + ".tmp")
+    staged = dst.with_name(dst.name + ".merge.db")
+    staged.unlink(missing_ok=True)
+    conn = sqlite3.connect(staged)
+    try:
+        conn.execute("CREATE TABLE rows (seq INTEGER PRIMARY KEY, k TEXT UNIQUE, row TEXT)")
+        # a repeated key keeps its first position and takes the newer row
+        conn.executemany(
+            "INSERT INTO rows (k, row) VALUES (?, ?) "
+            "ON CONFLICT(k) DO UPDATE SET row = excluded.row",
+            rows(),
         )
-        .scalars()
-        .first()
-    )
-    if not art or not art.uri:
-        raise RuntimeError("CSV_WRITER: CSV_ROWS artifact not found for run")
-    p = Path(art.uri)
-    if not p.exists():
-        raise FileNotFoundError(f"CSV_WRITER: CSV_ROWS file missing: {p}")
-    return p
-
-
-def _compute_from_csv_rows_to_sentiment(src: Path, outp: Path) -> None:
-    rows_out: List[Dict[str, str]] = []
-    with src.open("r", newline="", encoding="utf-8") as f_in:
-        reader = csv.DictReader(f_in)
-        for row in reader:
-            text = str(row.get("text") or row.get("content") or "")
-            label = (llm_client.llm_predict(SENTIMENT_PROMPT.format(text=text), system="Sentiment") or "").strip().upper()
-            if label not in _SCORE_MAP:
-                label = "NEUTRAL"
-            score = _SCORE_MAP[label]
-            enriched = dict(row)
-            enriched.update({"sentiment": label, "score": score})
-            rows_out.append(enriched)
-
-    fieldnames = list(rows_out[0].keys()) if rows_out else ["id", "text", "sentiment", "score"]
-    outp.parent.mkdir(parents=True, exist_ok=True)
-    with outp.open("w", newline="", encoding="utf-8") as f_out:
-        writer = csv.DictWriter(f_out, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows_out)
-
-
-def _compute_from_csv_rows_to_toxicity(src: Path, outp: Path) -> None:
-    rows_out: List[Dict[str, str]] = []
-    with src.open("r", newline="", encoding="utf-8") as f_in:
-        reader = csv.DictReader(f_in)
-        for row in reader:
-            text = str(row.get("text") or row.get("content") or "")
-            label = (llm_client.llm_predict(TOXIC_PROMPT.format(text=text), system="Toxicity") or "").strip().upper()
-            if label not in {"TOXIC", "NON_TOXIC"}:
-                label = "NON_TOXIC"
-            enriched = dict(row)
-            enriched.update({"toxicity": label})
-            rows_out.append(enriched)
-
-    fieldnames = list(rows_out[0].keys()) if rows_out else ["id", "text", "toxicity"]
-    outp.parent.mkdir(parents=True, exist_ok=True)
-    with outp.open("w", newline="", encoding="utf-8") as f_out:
-        writer = csv.DictWriter(f_out, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows_out)
+        with tmp.open("w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+            writer.writeheader()
+            for (row,) in conn.execute("SELECT row FROM rows ORDER BY seq"):
+                writer.writerow(json.loads(row))
+    finally:
+        conn.close()
+        staged.unlink(missing_ok=True)
+    os.replace(tmp, dst)
 
 
-def run(db: Session, block_run_id: int) -> None:
-    br = db.get(models.BlockRun, block_run_id)
-    if not br:
-        raise RuntimeError(f"BlockRun not found: {block_run_id}")
-    this_block = db.get(models.Block, br.block_id)
-    if not this_block:
-        raise RuntimeError(f"Block not found: {br.block_id}")
-    run = db.get(models.PipelineRun, br.pipeline_run_id)
-    if not run:
-        raise RuntimeError(f"PipelineRun not found: {br.pipeline_run_id}")
-
-    cfg = this_block.config_json or {}
-    out_path = cfg.get("output_path")
-    if not out_path:
-        raise ValueError("CSV_WRITER requires 'output_path' in config")
-    outp = Path(out_path)
-    outp.parent.mkdir(parents=True, exist_ok=True)
-
-    upstream = _get_upstream_block(db, this_block.pipeline_id, this_block.id)
-    kind = _artifact_kind_for_upstream(upstream.type)
-
-    produced = False
-    # 1) Preferred: copy the upstream artifact (sentiment/toxicity CSV)
-    art = _find_artifact_for_upstream(db, run.id, upstream.id, kind)
-    if art and art.uri:
-        src = Path(art.uri)
-        if src.exists():
-            shutil.copyfile(src, outp)
-            produced = True
-
-    if not produced:
-        # 2) Fallback: compute from CSV_ROWS (keeps happy-path robust; failure test still fails by monkey-patch)
-        src_rows = _find_csv_rows_path(db, run.id)
-        if upstream.type == models.BlockType.LLM_SENTIMENT:
-            _compute_from_csv_rows_to_sentiment(src_rows, outp)
-            produced = True
-        elif upstream.type == models.BlockType.LLM_TOXICITY:
-            _compute_from_csv_rows_to_toxicity(src_rows, outp)
-            produced = True
-        elif upstream.type == models.BlockType.CSV_READER:
-            # 3) If upstream is CSV_READER and nothing else, just copy rows
-            shutil.copyfile(src_rows, outp)
-            produced = True
-
-    if not produced:
-        raise FileNotFoundError(
-            f"CSV_WRITER: could not produce output; upstream={upstream.type}, kind={kind}"
+def _write_mode(ctx: StepContext) -> str:
+    mode = ctx.cfg.get("write_mode") or "overwrite"
+    if mode not in WRITE_MODES:
+        raise ValueError(f"CSV_WRITER: unknown write_mode '{mode}' ({' | '.join(WRITE_MODES)})")
+    # a preview's output stands alone
+    return "overwrite" if ctx.run.sample_json else mode
+
+
+def _staged_path(ctx: StepContext) -> Path:
+    return output_dir_for_run(ctx.run.id) / f"csv_writer-{ctx.block.id}.staged.csv"
+
+
+def _fold_meta(ctx: StepContext, target: Path) -> Dict[str, Any]:
+    return {
+        "fold": {
+            "target": str(target),
+            "mode": _write_mode(ctx),
+            "merge_key": ctx.cfg.get("merge_key") or "id",
+        }
+    }
+
+
+def fold_staged(db: Session, run: models.PipelineRun) -> None:
+    """
+    Append or upsert the staged output of each append/merge writer of the run
+    into its target. Called once the run SUCCEEDED, together with advancing
+    the readers' watermarks, so a failed run leaves the targets untouched and
+    its rows are written exactly once, by the rerun.
+    """
+    arts = db.execute(
+        select(models.Artifact)
+        .where(models.Artifact.pipeline_run_id == run.id)
+        .order_by(models.Artifact.id)
+    ).scalars()
+    for art in arts:
+        fold = (art.meta_json or {}).get("fold")
+        if not fold:
+            continue
+        target = Path(fold["target"])
+        target.parent.mkdir(parents=True, exist_ok=True)
+        src = cas.resolve_uri(art.uri)
+        if fold["mode"] == "append":
+            _append_csv(src, target)
+        else:
+            _merge_csv(src, target, fold["merge_key"])
+
+
+class CsvWriterStep(BatchStep):
+    """
+    Writes the output of the upstream block to `output_path`, found through
+    the lineage index (outputs of this block's parents in the run). Fails
+    when that output is missing instead of recomputing upstream work.
+    Stream edges bypass the batch runtime and copy sealed segments instead.
+    `write_mode: append | merge` writes this run's rows to a staged file,
+    recorded as the artifact; once the run SUCCEEDED they are appended to,
+    or upserted by `merge_key` into, the existing output (see fold_staged).
+    """
+
+    name = "CSV_WRITER"
+    sink = True
+
+    def bind(self, ctx: StepContext) -> StepIO:
+        out_path = ctx.cfg.get("output_path")
+        if not out_path:
+            raise ValueError("CSV_WRITER requires 'output_path' in config")
+        outp = sink_path(ctx, Path(out_path))
+        if _write_mode(ctx) != "overwrite":
+            ctx.state["target"] = outp
+            outp = _staged_path(ctx)
+        kind, art = _upstream_artifact(ctx)
+        src = cas.resolve_uri(art.uri, decompress=False)
+        if not cas.exists(src):
+            raise FileNotFoundError(f"CSV_WRITER: upstream {kind.value} file missing: {src}")
+        return StepIO(input=src, outputs=[StepOutput(kind, outp)], sources=[art])
+
+    def artifact_meta(self, ctx: StepContext, output: StepOutput) -> Dict[str, Any]:
+        target = ctx.state.get("target")
+        return _fold_meta(ctx, target) if target is not None else {}
+
+    def run(self, db: Session, block_run_id: int) -> None:
+        ctx = load_context(db, block_run_id)
+        edge = next(
+            (e for e in _upstream_edges(db, ctx.block.id) if e.mode == "stream"), None
         )
+        if edge is None:
+            run_batch_step(self, db, block_run_id)
+            return
 
-    # Record an artifact for the produced file so downstream/UX can discover it
-    db.add(
-        models.Artifact(
-            pipeline_run_id=run.id,
-            block_run_id=br.id,
+        out_path = ctx.cfg.get("output_path")
+        if not out_path:
+            raise ValueError("CSV_WRITER requires 'output_path' in config")
+        target = sink_path(ctx, Path(out_path))
+        outp = target if _write_mode(ctx) == "overwrite" else _staged_path(ctx)
+        outp.parent.mkdir(parents=True, exist_ok=True)
+        upstream = _upstream_block(db, edge)
+        kind = _artifact_kind_for_upstream(upstream.type, ctx.cfg.get("source_kind"))
+        digest, size = _stream_from_upstream(
+            db,
+            ctx.run.id,
+            upstream.id,
+            kind,
+            outp,
+            timeout=float(ctx.cfg.get("stream_timeout") or settings.STREAM_TIMEOUT_SECONDS),
+            poll=settings.STREAM_POLL_SECONDS,
+        )
+        digest, size = cas.ingest(outp, hashed=(digest, size))
+        meta = cas.describe(outp, digest, size)
+        if outp != target:
+            meta.update(_fold_meta(ctx, target))
+        art = models.Artifact(
+            pipeline_run_id=ctx.run.id,
+            block_run_id=ctx.br.id,
             kind=kind,
-            uri=str(outp),
+            uri=cas.uri_for(digest),
+            meta_json=meta,
         )
-    )
-    db.commit()
+        db.add(art)
+        lineage.record(db, art, lineage.block_outputs(db, ctx.run.id, upstream.id, kind)[-1:])
+        db.commit()
+
+
+STEP = CsvWriterStep()
+
+
+def run(db: Session, block_run_id: int) -> None:
+    STEP.run(db, block_run_id)
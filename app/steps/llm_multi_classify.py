@@ -0,0 +1,40 @@
+from __future__ import annotations
+import re
+from typing import Any, Dict
+
+from sqlalchemy.orm import Session
+from app.llm import langchain_client as llm_client
+from app.steps import llm_sentiment, llm_toxicity
+from app.steps._llm_common import row_text
+from app.steps.runtime import ClassifyStep
+
+MULTI_PROMPT = (
+    "You are a strict text classifier.\n"
+    "Classify sentiment as exactly one of: POSITIVE, NEGATIVE, NEUTRAL.\n"
+    "Classify toxicity as exactly one of: TOXIC or NON_TOXIC.\n"
+    "Return both labels separated by a comma, sentiment first (e.g. NEUTRAL,NON_TOXIC).\n"
+    "Text: {text}\n"
+    "Answer:\n"
+)
+OUTPUTS = llm_sentiment.OUTPUTS + llm_toxicity.OUTPUTS
+
+def _parse_labels(x: str) -> tuple[str, str]:
+    parts = [p for p in re.split(r"[\s,;|]+", (x or "").strip().upper()) if p]
+    sentiment = next((p for p in parts if p in llm_sentiment._SCORE_MAP), "")
+    toxicity = next((p for p in parts if p in {"TOXIC", "NON_TOXIC"}), "")
+    return llm_sentiment._coerce_sentiment(sentiment), llm_toxicity._coerce_toxic(toxicity)
+
+def classify(row: Dict[str, str]) -> Dict[str, Any]:
+    # One model call per row for both tasks; exceptions propagate so the step FAILS
+    answer = llm_client.llm_predict(MULTI_PROMPT.format(text=row_text(row)), system="Sentiment+Toxicity")
+    sentiment, toxicity = _parse_labels(answer)
+    return {
+        "sentiment": sentiment,
+        "score": llm_sentiment._SCORE_MAP[sentiment],
+        "toxicity": toxicity,
+    }
+
+STEP = ClassifyStep("LLM_MULTI_CLASSIFY", OUTPUTS, classify)
+
+def run(db: Session, block_run_id: int) -> None:
+    STEP.run(db, block_run_id)
@@ -0,0 +1,360 @@
+"""
+Batch step protocol. A step declares, per block run, which file it reads and
+which outputs it produces (artifact kind, path and the columns it adds to the
+input schema) and turns record batches into added columns. The runtime owns
+reading, batching, writing, checkpoints and preview capture, so I/O changes
+are made once here for every step.
+"""
+
+from __future__ import annotations
+import os
+import shutil
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core import lineage
+from app.core.config import settings
+from app.infra import cas, colstore, objectstore, profiling, rowindex
+from app.infra.artifacts import materialize, read_csv_head
+from app.steps._llm_common import (
+    artifact_index,
+    checkpoint_for,
+    fetch_csv_rows_artifact,
+    has_stream_children,
+    output_dir_for_run,
+)
+from app.steps.batch import (
+    PREVIEW_ROWS,
+    Columns,
+    RecordBatch,
+    input_header,
+    map_rows,
+    store_files,
+    transform_csv,
+    transform_store,
+)
+
+
+@dataclass
+class StepOutput:
+    kind: models.ArtifactKind
+    path: Path
+    # columns appended to the input schema; () passes the input through
+    added: Sequence[str] = ()
+
+
+@dataclass
+class StepContext:
+    db: Session
+    br: models.BlockRun
+    block: models.Block
+    run: models.PipelineRun
+    cfg: Dict[str, Any]
+    # scratch space for bind() to hand decisions to process()
+    state: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class StepIO:
+    input: Path
+    outputs: List[StepOutput]
+    # row-offset index of a CSV input, used to seek on resume
+    index: Optional[rowindex.RowIndex] = None
+    # artifacts the input was taken from, recorded as the outputs' lineage
+    sources: List[models.Artifact] = field(default_factory=list)
+
+
+class BatchStep:
+    """
+    Base class of batch steps. Subclasses implement bind() and, when any
+    output adds columns, process(). `checkpointed` steps record progress so
+    retries resume mid-file.
+    """
+
+    name = "STEP"
+    checkpointed = False
+    # writers produce the external CSV; other steps emit INTERMEDIATE_FORMAT
+    sink = False
+    # columns process() reads; None = all. Column stores read only these.
+    input_columns: Optional[Sequence[str]] = None
+    # index and profile a CSV input in one pass and record both on the
+    # outputs' artifact metadata (see app.infra.rowindex / profiling)
+    profile_input = False
+
+    def bind(self, ctx: StepContext) -> StepIO:
+        raise NotImplementedError
+
+    def process(self, ctx: StepContext, batch: RecordBatch) -> Columns:
+        return {}
+
+    def artifact_meta(self, ctx: StepContext, output: StepOutput) -> Dict[str, Any]:
+        """Extra keys for the artifact metadata of `output`."""
+        return {}
+
+    def run(self, db: Session, block_run_id: int) -> None:
+        run_batch_step(self, db, block_run_id)
+
+
+class ClassifyStep(BatchStep):
+    """
+    LLM step: reads the run's CSV_ROWS and writes one CSV per
+    `(kind, filename, added_columns)` output under the run directory, adding
+    the values `classify(row)` returns.
+    """
+
+    checkpointed = True
+    input_columns = ("text", "content")
+
+    def __init__(
+        self,
+        name: str,
+        outputs: Sequence[Tuple[models.ArtifactKind, str, Sequence[str]]],
+        classify: Callable[[Dict[str, Any]], Dict[str, Any]],
+    ):
+        self.name = name
+        self.outputs = list(outputs)
+        self._process = map_rows(classify)
+
+    def bind(self, ctx: StepContext) -> StepIO:
+        out_dir = output_dir_for_run(ctx.run.id)
+        # the parent's rows; a step chained behind another LLM step reads the run's
+        parents = lineage.parent_outputs(
+            ctx.db, ctx.run.id, ctx.block.id, models.ArtifactKind.CSV_ROWS
+        )
+        src = parents[-1] if parents else fetch_csv_rows_artifact(ctx.db, ctx.run.id)
+        path = cas.resolve_uri(src.uri, decompress=False)
+        if not cas.exists(path):
+            raise FileNotFoundError(f"CSV_ROWS artifact path does not exist: {path}")
+        return StepIO(
+            input=path,
+            outputs=[
+                StepOutput(kind, out_dir / filename, added)
+                for kind, filename, added in self.outputs
+            ],
+            index=artifact_index(src),
+            sources=[src],
+        )
+
+    def process(self, ctx: StepContext, batch: RecordBatch) -> Columns:
+        return self._process(batch)
+
+
+def sink_path(ctx: StepContext, path: Path) -> Path:
+    """Where a writer puts `path`; preview runs write under the run directory."""
+    if ctx.run.sample_json:
+        return output_dir_for_run(ctx.run.id) / "preview" / path.name
+    return path
+
+
+def load_context(db: Session, block_run_id: int) -> StepContext:
+    br = db.get(models.BlockRun, block_run_id)
+    if not br:
+        raise RuntimeError(f"BlockRun not found: {block_run_id}")
+    block = db.get(models.Block, br.block_id)
+    if not block:
+        raise RuntimeError(f"Block not found: {br.block_id}")
+    run = db.get(models.PipelineRun, br.pipeline_run_id)
+    if not run:
+        raise RuntimeError(f"PipelineRun not found: {br.pipeline_run_id}")
+    return StepContext(db=db, br=br, block=block, run=run, cfg=block.config_json or {})
+
+
+def _preview(path: Path) -> List[Dict[str, Any]]:
+    try:
+        if colstore.is_store(path):
+            return colstore.ColumnStore(path).head(PREVIEW_ROWS)
+        return read_csv_head(path, limit=PREVIEW_ROWS)
+    except Exception:
+        # Preview is optional; don't fail the step if the CSV is huge/oddly formatted
+        return []
+
+
+def _passthrough(
+    src: Path, o: StepOutput, to_store: bool, sink: bool = False
+) -> Optional[str]:
+    """
+    Materialize the input unchanged at `o.path` in the output format. Returns
+    the copy method (see materialize()) when the file was copied as is. A
+    writer's (`sink`) target is user-visible and never shares the input's inode.
+    """
+    if o.path.resolve() == src.resolve():
+        return None
+    if to_store:
+        if colstore.is_store(src):
+            store = colstore.ColumnStore(src)
+            colstore.StoreWriter(o.path, store.columns, linked=store).close(store.rows)
+        else:
+            colstore.from_csv(cas.local_file(src), o.path, batch_rows=settings.STEP_BATCH_ROWS)
+    elif colstore.is_store(src):
+        colstore.ColumnStore(src).to_csv(o.path)
+    elif not src.exists():
+        # a compressed blob (see cas.open_source()): decompress into the target
+        _decompress(src, o.path)
+        return "decompress"
+    else:
+        # a link is only safe when both sides are ours: any other target may
+        # be edited in place, which would rewrite the blob
+        linked = not sink and cas.is_run_output(src) and cas.is_run_output(o.path)
+        return materialize(src, o.path, immutable=linked)
+    return None
+
+
+def _decompress(src: Path, dst: Path) -> None:
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    try:
+        with cas.open_source(src) as f_in, tmp.open("wb") as f_out:
+            shutil.copyfileobj(f_in, f_out, cas.CHUNK)
+        os.replace(tmp, dst)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _store(
+    path: Path, src: Path, hashed: Optional[Tuple[str, int]] = None
+) -> Optional[Tuple[str, int]]:
+    """
+    Put an output file in the blob store; returns (digest, size), or None for
+    column stores and for a reader's input used in place, which stay where
+    they are (unless blobs are shared between nodes, which may not see it).
+    `hashed` is the file's (digest, size) when it was hashed as written.
+    """
+    if path.is_dir():
+        return None
+    in_place = path.resolve() == src.resolve() and not cas.is_run_output(path)
+    if in_place and not objectstore.backend().shared:
+        return None
+    return cas.ingest(path, hashed=hashed)
+
+
+def _profile_input(run_id: int, src: Path) -> Tuple[Dict[str, Any], str]:
+    """Profile `src` and save its row index; returns (profile, index path)."""
+    profiler = profiling.Profiler()
+    index = rowindex.build(src, profiler)
+    path = output_dir_for_run(run_id) / "csv_rows.rowidx"
+    index.save(path)
+    return profiler.result(), str(path)
+
+
+def _use_store(step: BatchStep, ctx: StepContext) -> bool:
+    # stream consumers read byte ranges of a CSV, so streamed outputs stay CSV
+    return (
+        settings.INTERMEDIATE_FORMAT.lower() == "colstore"
+        and not step.sink
+        and not has_stream_children(ctx.db, ctx.block)
+    )
+
+
+def run_batch_step(step: BatchStep, db: Session, block_run_id: int) -> None:
+    ctx = load_context(db, block_run_id)
+    io = step.bind(ctx)
+    to_store = _use_store(step, ctx)
+    outputs = io.outputs
+    if to_store:
+        out_dir = output_dir_for_run(ctx.run.id)
+        outputs = [
+            StepOutput(o.kind, out_dir / f"{o.kind.value.lower()}.cols", o.added)
+            for o in io.outputs
+        ]
+
+    methods: Dict[Path, str] = {}
+    # (digest, size) of outputs hashed while written, by path
+    hashed: Dict[str, Tuple[str, int]] = {}
+    if not any(o.added for o in outputs):
+        # a verbatim copy of a stored blob has the blob's digest
+        known = [cas.digest_of(a.uri) for a in io.sources]
+        for o in outputs:
+            method = _passthrough(io.input, o, to_store, sink=step.sink)
+            if method:
+                methods[o.path] = method
+                if len(known) == 1 and known[0]:
+                    hashed[str(o.path)] = (known[0], o.path.stat().st_size)
+        previews = [_preview(o.path) for o in outputs]
+    elif to_store:
+        header = input_header(io.input)
+        columns = [c for c in (step.input_columns or ()) if c in header] or None
+        ckpt = (
+            checkpoint_for(
+                db,
+                ctx.br,
+                io.input,
+                {
+                    f: o.kind
+                    for o in outputs
+                    for f in store_files(io.input, o.path, o.added)
+                },
+            )
+            if step.checkpointed
+            else None
+        )
+        previews = transform_store(
+            io.input,
+            [(o.path, o.added) for o in outputs],
+            lambda batch: step.process(ctx, batch),
+            checkpoint=ckpt,
+            batch_rows=settings.STEP_BATCH_ROWS,
+            columns=columns,
+        )
+    else:
+        ckpt = (
+            checkpoint_for(db, ctx.br, io.input, {o.path: o.kind for o in outputs})
+            if step.checkpointed
+            else None
+        )
+        previews = transform_csv(
+            io.input,
+            [(o.path, o.added) for o in outputs],
+            lambda batch: step.process(ctx, batch),
+            checkpoint=ckpt,
+            batch_rows=settings.STEP_BATCH_ROWS,
+            index=io.index,
+            hashed=hashed,
+        )
+
+    # before profiling: storing may swap a run file for a link to its blob
+    stored = {o.path: _store(o.path, io.input, hashed.get(str(o.path))) for o in outputs}
+
+    profile, index_path = None, None
+    if step.profile_input and not colstore.is_store(io.input):
+        profile, index_path = _profile_input(ctx.run.id, io.input)
+    for o, preview in zip(outputs, previews):
+        meta = None
+        if colstore.is_store(o.path):
+            store = colstore.ColumnStore(o.path)
+            meta = {"format": "colstore", "rows": store.rows, "columns": store.columns}
+            if profile:
+                meta.update({k: v for k, v in profile.items() if k != "rows"})
+        elif profile:
+            meta = {"format": "csv", **profile}
+            if o.path.resolve() == io.input.resolve():
+                meta["row_index"] = index_path
+        if o.path in methods:
+            meta = {**(meta or {}), "materialized": methods[o.path]}
+        extra = step.artifact_meta(ctx, o)
+        if extra:
+            meta = {**(meta or {}), **extra}
+        uri = str(o.path)
+        if stored[o.path]:
+            digest, size = stored[o.path]
+            uri = cas.uri_for(digest)
+            meta = {**(meta or {}), **cas.describe(o.path, digest, size)}
+        art = models.Artifact(
+            pipeline_run_id=ctx.run.id,
+            block_run_id=ctx.br.id,
+            kind=o.kind,
+            uri=uri,
+            preview_json={"rows": preview},
+            meta_json=meta,
+        )
+        db.add(art)
+        lineage.record(db, art, io.sources)
+    db.commit()
+    if not step.sink and not has_stream_children(db, ctx.block):
+        # outputs stored compressed live on in the blob store's read cache
+        for path, found in stored.items():
+            if found:
+                cas.release(path, found[0])
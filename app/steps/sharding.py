@@ -0,0 +1,224 @@
+from __future__ import annotations
+import csv
+import math
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from types import ModuleType
+from typing import Dict, List, Sequence, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core import lineage
+from app.infra import cas, colstore
+from app.infra.artifacts import read_csv_head
+from app.steps import llm_sentiment, llm_toxicity, llm_multi_classify
+from app.steps._llm_common import (
+    artifact_index,
+    enrich_csv_multi,
+    fetch_csv_rows_artifact,
+    output_dir_for_run,
+    source_size,
+)
+from app.steps.batch import PREVIEW_ROWS
+
+# Row-wise steps whose input can be split at row boundaries. Each module
+# exposes OUTPUTS [(kind, filename, added_columns)] and classify(row).
+SHARDABLE: Dict[models.BlockType, ModuleType] = {
+    models.BlockType.LLM_SENTIMENT: llm_sentiment,
+    models.BlockType.LLM_TOXICITY: llm_toxicity,
+    models.BlockType.LLM_MULTI_CLASSIFY: llm_multi_classify,
+}
+
+
+def count_rows(src: Path) -> int:
+    if colstore.is_store(src):
+        return colstore.ColumnStore(src).rows
+    with src.open(newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        return sum(1 for _ in reader)
+
+
+def input_artifact(db: Session, br: models.BlockRun) -> models.Artifact:
+    """The CSV_ROWS the block reads: its parent's, else the run's (as ClassifyStep.bind)."""
+    parents = lineage.parent_outputs(
+        db, br.pipeline_run_id, br.block_id, models.ArtifactKind.CSV_ROWS
+    )
+    return parents[-1] if parents else fetch_csv_rows_artifact(db, br.pipeline_run_id)
+
+
+def input_stats(db: Session, br: models.BlockRun) -> Tuple[int, int]:
+    """
+    (rows, bytes) of the block's CSV_ROWS, from the profile CSV_READER
+    recorded on the artifact when there is one, else by reading the input.
+    """
+    art = input_artifact(db, br)
+    meta = art.meta_json or {}
+    src = cas.resolve_uri(art.uri)
+    rows = meta["rows"] if "rows" in meta else count_rows(src)
+    size = meta["bytes"] if "bytes" in meta else source_size(src)
+    return int(rows), int(size)
+
+
+def requested_shards(db: Session, br: models.BlockRun, block: models.Block) -> int:
+    """
+    Number of shards the block config asks for on this input: `shards: N`,
+    or a target size via `shard_rows` / `shard_bytes`. 1 means run unsharded.
+    """
+    if block.type not in SHARDABLE:
+        return 1
+    cfg = block.config_json or {}
+    if cfg.get("shards"):
+        return max(1, int(cfg["shards"]))
+    if cfg.get("shard_bytes"):
+        size = input_stats(db, br)[1]
+        return max(1, math.ceil(size / int(cfg["shard_bytes"])))
+    if cfg.get("shard_rows"):
+        rows = input_stats(db, br)[0]
+        return max(1, math.ceil(rows / int(cfg["shard_rows"])))
+    return 1
+
+
+def plan(db: Session, br: models.BlockRun, shards: int, priority: int = 100) -> int:
+    """
+    Split the block input into contiguous row ranges and enqueue one queue
+    item per shard so idle workers can process them in parallel.
+    Returns the number of shards created.
+    """
+    rows = input_stats(db, br)[0]
+    n = max(1, min(shards, rows))
+    bounds = [rows * i // n for i in range(n + 1)]
+    for i in range(n):
+        db.add(
+            models.BlockShard(
+                block_run_id=br.id,
+                shard_index=i,
+                row_start=bounds[i],
+                row_end=bounds[i + 1],
+                status=models.RunStatus.QUEUED,
+            )
+        )
+        db.add(
+            models.BlockQueue(
+                pipeline_run_id=br.pipeline_run_id,
+                block_id=br.block_id,
+                priority=priority,
+                shard_index=i,
+            )
+        )
+    br.shard_count = n
+    br.merge_started_at = None
+    db.add(br)
+    db.commit()
+    return n
+
+
+def _part_path(br: models.BlockRun, filename: str, index: int) -> Path:
+    name = Path(filename)
+    out_dir = output_dir_for_run(br.pipeline_run_id) / "shards" / str(br.id)
+    return out_dir / f"{name.stem}-{index:05d}{name.suffix}"
+
+
+def run_shard(db: Session, shard: models.BlockShard) -> None:
+    br = db.get(models.BlockRun, shard.block_run_id)
+    block = db.get(models.Block, br.block_id)
+    step = SHARDABLE[block.type]
+    art = input_artifact(db, br)
+    src = cas.resolve_uri(art.uri)
+    if not src.exists():
+        raise FileNotFoundError(f"CSV_ROWS artifact path does not exist: {src}")
+    enrich_csv_multi(
+        src,
+        [
+            (_part_path(br, filename, shard.shard_index), added)
+            for _, filename, added in step.OUTPUTS
+        ],
+        step.classify,
+        row_range=(shard.row_start, shard.row_end),
+        index=artifact_index(art),
+    )
+
+
+def concat_csv(parts: Sequence[Path], dst: Path) -> Tuple[str, int]:
+    """
+    Concatenate CSV parts in order, keeping only the first header. Returns
+    the (digest, size) of `dst`, hashed as it was written.
+    """
+    tmp = dst.with_name(dst.name + ".tmp")
+    with cas.HashingWriter(tmp) as out:
+        for i, part in enumerate(parts):
+            with part.open("rb") as f:
+                if i:
+                    f.readline()
+                shutil.copyfileobj(f, out, 1024 * 1024)
+    os.replace(tmp, dst)
+    return out.hashed()
+
+
+def try_merge(db: Session, br: models.BlockRun) -> bool:
+    """
+    Claim and run the merge once every shard SUCCEEDED. The conditional UPDATE
+    makes exactly one worker win the claim. Returns True if this call merged.
+    """
+    pending = (
+        select(models.BlockShard.id)
+        .where(
+            models.BlockShard.block_run_id == br.id,
+            models.BlockShard.status != models.RunStatus.SUCCEEDED,
+        )
+        .exists()
+    )
+    claimed = db.execute(
+        update(models.BlockRun)
+        .where(
+            models.BlockRun.id == br.id,
+            models.BlockRun.shard_count.is_not(None),
+            models.BlockRun.merge_started_at.is_(None),
+            ~pending,
+        )
+        .values(merge_started_at=datetime.utcnow())
+    ).rowcount
+    db.commit()
+    if claimed != 1:
+        return False
+    merge(db, br)
+    return True
+
+
+def merge(db: Session, br: models.BlockRun) -> None:
+    db.refresh(br)
+    block = db.get(models.Block, br.block_id)
+    step = SHARDABLE[block.type]
+    out_dir = output_dir_for_run(br.pipeline_run_id)
+    arts: List[models.Artifact] = []
+    for kind, filename, _ in step.OUTPUTS:
+        final = out_dir / filename
+        hashed = concat_csv(
+            [_part_path(br, filename, i) for i in range(br.shard_count)], final
+        )
+        digest, size = cas.ingest(final, hashed=hashed)
+        arts.append(
+            models.Artifact(
+                pipeline_run_id=br.pipeline_run_id,
+                block_run_id=br.id,
+                kind=kind,
+                uri=cas.uri_for(digest),
+                preview_json={
+                    "rows": read_csv_head(final, limit=PREVIEW_ROWS),
+                    "shards": br.shard_count,
+                },
+                meta_json=cas.describe(final, digest, size),
+            )
+        )
+    db.add_all(arts)
+    source = input_artifact(db, br)
+    for art in arts:
+        lineage.record(db, art, [source])
+    db.commit()
+    for art in arts:
+        cas.release(Path(art.meta_json["path"]), cas.digest_of(art.uri))
+    shutil.rmtree(out_dir / "shards" / str(br.id), ignore_errors=True)
@@ -0,0 +1,23 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import csv
+from pathlib import Path
+
+
+def read(config: Dict[str, Any]) -> Tuple[Optional[List[str]], List[Dict[str, Any]]]:
+    """Return (header, rows) of the configured input CSV."""
+    input_path = config.get("input_path")
+    if not input_path:
+        raise ValueError("CSV_READER requires 'input_path' in config")
+    src = Path(input_path)
+    if not src.exists():
+        raise FileNotFoundError(f"CSV Reader: file not found: {src}")
+    with src.open("r", newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        rows = [dict(r) for r in reader]
+        return (list(reader.fieldnames) if reader.fieldnames else None), rows
+
+
+def run(config: Dict[str, Any], rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # a source block: incoming rows are ignored
+    return read(config)[1]
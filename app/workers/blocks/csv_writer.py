@@ -7,22 +7,25 @@ from app.core.config import settings
 
 def run(config: Dict[str, Any], rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
     rows = list(rows)
-    if not rows:
+    # explicit column order (e.g. the upstream output header) wins
+    fieldnames = list(config.get("fieldnames") or [])
+    if not rows and not fieldnames:
         return rows
     out_path = config.get("output_path")
     if not out_path:
         name = config.get("name", "output")
         out_path = os.path.join(settings.ARTIFACTS_DIR, f"{name}.csv")
-    Path(os.path.dirname(out_path)).mkdir(parents=True, exist_ok=True)
-    # fieldnames = union of all keys
-    keys = set()
-    for r in rows:
-        keys.update(r.keys())
-    fieldnames = sorted(keys)
+    Path(os.path.dirname(out_path) or ".").mkdir(parents=True, exist_ok=True)
+    if not fieldnames:
+        # fieldnames = union of all keys, in first-seen order
+        for r in rows:
+            fieldnames.extend(k for k in r.keys() if k not in fieldnames)
+    # the previous file may be a link to a stored blob: replace, don't overwrite
+    Path(out_path).unlink(missing_ok=True)
     with open(out_path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
+        w = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
         w.writeheader()
         for r in rows:
-            w.writerow({k: r.get(k, "") for k in fieldnames})
+            w.writerow(r)
     # returning rows keeps runner behavior consistent
     return rows
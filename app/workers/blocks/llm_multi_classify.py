@@ -0,0 +1,8 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List
+from app.steps import llm_multi_classify as step
+
+
+def run(config: Dict[str, Any], rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # one model call per row for both labels, as in the queued step
+    return [{**r, **step.classify(r)} for r in rows]
@@ -0,0 +1,255 @@
+"""
+Fused execution: one worker runs a whole pipeline run in topological order,
+passing row lists between the row blocks in app/workers/blocks. Nothing goes
+through the queue between blocks; only the readers' inputs, sink outputs and
+one BlockRun summary per block are persisted. Lineage links each sink output
+to the nearest persisted artifacts its rows came from.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.config import settings
+from app.core.dag import topological_sort
+from app.infra import cas, inputs
+from app.steps import llm_multi_classify, llm_sentiment, llm_toxicity
+from app.steps._llm_common import output_dir_for_run
+from app.steps.batch import PREVIEW_ROWS, output_fieldnames
+from app.steps.csv_writer import _artifact_kind_for_upstream
+from app.workers.blocks import csv_reader as csv_reader_block
+from app.workers.blocks import csv_writer as csv_writer_block
+from app.workers.blocks import llm_multi_classify as llm_multi_classify_block
+from app.workers.blocks import llm_sentiment as llm_sentiment_block
+from app.workers.blocks import llm_toxicity as llm_toxicity_block
+
+# LLM block type -> (row block, step outputs [(kind, filename, added_columns)])
+LLM_BLOCKS = {
+    models.BlockType.LLM_SENTIMENT: (llm_sentiment_block, llm_sentiment.OUTPUTS),
+    models.BlockType.LLM_TOXICITY: (llm_toxicity_block, llm_toxicity.OUTPUTS),
+    models.BlockType.LLM_MULTI_CLASSIFY: (
+        llm_multi_classify_block,
+        llm_multi_classify.OUTPUTS,
+    ),
+}
+_SHARD_KEYS = ("shards", "shard_rows", "shard_bytes")
+
+
+@dataclass
+class Frame:
+    """Rows produced by a block, with the column order of each output kind."""
+
+    rows: List[Dict[str, Any]]
+    columns: Dict[models.ArtifactKind, List[str]]
+    # persisted artifacts the rows were computed from (lineage inputs)
+    sources: List[models.Artifact] = field(default_factory=list)
+
+
+@dataclass
+class BlockSummary:
+    block_id: int
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    rows: int = 0
+
+
+@dataclass
+class FusedResult:
+    summaries: List[BlockSummary] = field(default_factory=list)
+    # (block_id, unsaved artifact); block_run_id is set once summaries exist
+    artifacts: List[Tuple[int, models.Artifact]] = field(default_factory=list)
+    # (artifact, its inputs) to record with app.core.lineage once saved
+    lineage: List[Tuple[models.Artifact, List[models.Artifact]]] = field(default_factory=list)
+
+    def add(self, block_id: int, art: models.Artifact, inputs: List[models.Artifact]) -> None:
+        self.artifacts.append((block_id, art))
+        self.lineage.append((art, inputs))
+
+
+class FusedBlockFailed(Exception):
+    def __init__(self, block_id: int, result: FusedResult, cause: Exception):
+        super().__init__(str(cause))
+        self.block_id = block_id
+        self.result = result
+        self.cause = cause
+
+
+def needs_queued(cfg: Dict[str, Any]) -> bool:
+    """Incremental readers and append/merge writers only run as queued steps."""
+    return bool(cfg.get("incremental")) or (cfg.get("write_mode") or "overwrite") != "overwrite"
+
+
+def should_fuse(db: Session, pipeline: models.Pipeline) -> bool:
+    """
+    "queued" never fuses, and neither does a pipeline with a block that
+    needs_queued(). Otherwise "fused" always fuses and "auto" fuses small
+    pipelines: at most FUSED_MAX_BLOCKS blocks, no sharded blocks and CSV
+    inputs totalling at most FUSED_MAX_INPUT_BYTES.
+    """
+    mode = (pipeline.execution or "auto").lower()
+    if mode == "queued":
+        return False
+    blocks = db.scalars(
+        select(models.Block).where(models.Block.pipeline_id == pipeline.id)
+    ).all()
+    # import rejects "fused" for these; older pipelines fall back to queued
+    if any(needs_queued(b.config_json or {}) for b in blocks):
+        return False
+    if mode != "auto":
+        return mode == "fused"
+    if settings.FUSED_MAX_BLOCKS <= 0:
+        return False
+    if not blocks or len(blocks) > settings.FUSED_MAX_BLOCKS:
+        return False
+    total = 0
+    for b in blocks:
+        cfg = b.config_json or {}
+        if any(cfg.get(k) for k in _SHARD_KEYS):
+            return False
+        if b.type == models.BlockType.CSV_READER:
+            # globs, directories and compressed inputs go through the queued reader
+            src = Path(cfg.get("input_path") or "")
+            if not src.is_file() or inputs.codec(src):
+                return False
+            total += src.stat().st_size
+    return total <= settings.FUSED_MAX_INPUT_BYTES
+
+
+def _write(
+    run_id: int,
+    kind: models.ArtifactKind,
+    path: Path,
+    rows: List[Dict[str, Any]],
+    fieldnames: List[str],
+) -> models.Artifact:
+    csv_writer_block.run({"output_path": str(path), "fieldnames": fieldnames}, rows)
+    digest, size = cas.ingest(path)
+    return models.Artifact(
+        pipeline_run_id=run_id,
+        kind=kind,
+        uri=cas.uri_for(digest),
+        meta_json=cas.describe(path, digest, size),
+        preview_json={
+            "rows": [{k: r.get(k) for k in fieldnames} for r in rows[:PREVIEW_ROWS]]
+        },
+    )
+
+
+def execute(db: Session, run_id: int) -> FusedResult:
+    """
+    Run every block of the run's pipeline in memory. Returns the summaries and
+    the (unsaved) reader and sink artifacts with their lineage; raises
+    FusedBlockFailed with the partial result when a block fails.
+    """
+    run = db.get(models.PipelineRun, run_id)
+    if not run:
+        raise RuntimeError(f"PipelineRun not found: {run_id}")
+    blocks = {
+        b.id: b
+        for b in db.scalars(
+            select(models.Block).where(models.Block.pipeline_id == run.pipeline_id)
+        ).all()
+    }
+    edges: List[Tuple[int, int]] = [
+        (u, v)
+        for u, v in db.execute(
+            select(models.Edge.from_block_id, models.Edge.to_block_id)
+            .where(models.Edge.pipeline_id == run.pipeline_id)
+            .order_by(models.Edge.id)
+        ).all()
+    ]
+    parents: Dict[int, List[int]] = {bid: [] for bid in blocks}
+    has_children = set()
+    for u, v in edges:
+        parents[v].append(u)
+        has_children.add(u)
+
+    frames: Dict[int, Frame] = {}
+    result = FusedResult()
+
+    def frame_of_kind(kind: models.ArtifactKind) -> Frame:
+        # like the queued steps: the first block (by id) that produced this kind
+        for bid in sorted(frames):
+            if kind in frames[bid].columns:
+                return frames[bid]
+        raise RuntimeError(f"No upstream output for kind {kind.value}")
+
+    for bid in topological_sort(list(blocks), edges):
+        block = blocks[bid]
+        cfg = block.config_json or {}
+        summary = BlockSummary(block_id=bid, started_at=datetime.utcnow())
+        result.summaries.append(summary)
+        try:
+            if block.type == models.BlockType.CSV_READER:
+                header, rows = csv_reader_block.read(cfg)
+                # the input itself, used in place: the root of the run's lineage
+                art = models.Artifact(
+                    pipeline_run_id=run.id,
+                    kind=models.ArtifactKind.CSV_ROWS,
+                    uri=str(cfg["input_path"]),
+                    preview_json={"rows": rows[:PREVIEW_ROWS]},
+                )
+                result.add(bid, art, [])
+                frame = Frame(
+                    rows,
+                    {models.ArtifactKind.CSV_ROWS: output_fieldnames(header, ())},
+                    [art],
+                )
+            elif block.type in LLM_BLOCKS:
+                row_block, outputs = LLM_BLOCKS[block.type]
+                src = frame_of_kind(models.ArtifactKind.CSV_ROWS)
+                header = src.columns[models.ArtifactKind.CSV_ROWS]
+                frame = Frame(
+                    row_block.run(cfg, src.rows),
+                    {
+                        kind: output_fieldnames(header, added)
+                        for kind, _, added in outputs
+                    },
+                    src.sources,
+                )
+                if bid not in has_children:
+                    out_dir = output_dir_for_run(run.id)
+                    for kind, filename, _ in outputs:
+                        art = _write(
+                            run.id, kind, out_dir / filename, frame.rows, frame.columns[kind]
+                        )
+                        result.add(bid, art, src.sources)
+            elif block.type == models.BlockType.CSV_WRITER:
+                if not parents[bid]:
+                    raise RuntimeError(
+                        f"CSV_WRITER: no upstream edge found for block_id={bid}"
+                    )
+                if not cfg.get("output_path"):
+                    raise ValueError("CSV_WRITER requires 'output_path' in config")
+                up = blocks[parents[bid][0]]
+                kind = _artifact_kind_for_upstream(up.type, cfg.get("source_kind"))
+                src = frames[up.id]
+                art = _write(run.id, kind, Path(cfg["output_path"]), src.rows, src.columns[kind])
+                result.add(bid, art, src.sources)
+                frame = Frame(src.rows, {kind: src.columns[kind]}, [art])
+            elif block.type == models.BlockType.FILE_WRITER:
+                source_kind = cfg.get("source_kind")
+                if not source_kind:
+                    raise ValueError("FileWriter requires 'source_kind' in config")
+                kind = models.ArtifactKind[source_kind]
+                src = frame_of_kind(kind)
+                out_dir = Path(cfg.get("output_path", f"data/runs/{run.id}/outputs"))
+                dst = out_dir / cfg.get("filename", f"{source_kind.lower()}_out.csv")
+                art = _write(run.id, kind, dst, src.rows, src.columns[kind])
+                result.add(bid, art, src.sources)
+                frame = Frame(src.rows, {kind: src.columns[kind]}, [art])
+            else:
+                raise RuntimeError(f"No fused implementation for {block.type}")
+        except Exception as e:
+            summary.finished_at = datetime.utcnow()
+            raise FusedBlockFailed(bid, result, e) from e
+        frames[bid] = frame
+        summary.rows = len(frame.rows)
+        summary.finished_at = datetime.utcnow()
+    return result
@@ -12,14 +12,20 @@ class Claimed:
     pipeline_run_id: int
     block_id: int
     priority: int
+    shard_index: Optional[int] = None
+    fused: bool = False
 
 
 from sqlalchemy.orm import Session
-from sqlalchemy import select, and_, delete, or_, text, func
+from sqlalchemy import select, and_, case, delete, or_, text, func
 
 from app import models
 from app.steps.registry import REGISTRY
-from app.core.scheduler import Scheduler
+from app.steps.csv_writer import StreamPaused
+from app.steps import sharding
+from app.workers import fused
+from app.core import lineage
+from app.core.scheduler import Scheduler, locality_hint
 from app.core.orchestrator import Orchestrator
 from app.core.config import settings
 from app.infra.logsink import log_event
@@ -58,7 +64,9 @@ class WorkerRunner:
     def _ensure_downstream_enqueued(self, run_id: int, finished_block_id: int, priority: int = 100) -> None:
         """
         Safety-net scheduler: enqueue all immediate children of `finished_block_id`
-        unless they already have a pending queue item or a SUCCEEDED BlockRun.
+        unless they already have a pending queue item or a SUCCEEDED/RUNNING
+        BlockRun (stream consumers start before their producer finishes), or
+        failed with no attempts left.
         """
         # children of the finished block within the same pipeline
         pipeline_id = self.db.get(models.Block, finished_block_id).pipeline_id
@@ -72,7 +80,7 @@ class WorkerRunner:
         ).all()
 
         for cid in child_ids:
-            # Skip if child already SUCCEEDED
+            # Skip if child already SUCCEEDED or is streaming from its parent
             child_br = self.db.execute(
                 select(models.BlockRun).where(
                     and_(
@@ -81,7 +89,17 @@ class WorkerRunner:
                     )
                 )
             ).scalar_one_or_none()
-            if child_br and child_br.status == models.RunStatus.SUCCEEDED:
+            if child_br and child_br.status in (
+                models.RunStatus.SUCCEEDED,
+                models.RunStatus.RUNNING,
+            ):
+                continue
+            # a stream child that failed its last attempt stays failed
+            if (
+                child_br
+                and child_br.status == models.RunStatus.FAILED
+                and (child_br.attempts or 0) >= self._retry_policy(cid)[0]
+            ):
                 continue
 
             # Enqueue only if ALL parents have SUCCEEDED (mirror scheduler readiness)
@@ -113,6 +131,7 @@ class WorkerRunner:
                         models.BlockQueue.pipeline_run_id == run_id,
                         models.BlockQueue.block_id == cid,
                         models.BlockQueue.taken_by.is_(None),
+                        models.BlockQueue.shard_index.is_(None),
                     )
                 )
             ).scalar_one_or_none()
@@ -123,6 +142,7 @@ class WorkerRunner:
                         pipeline_run_id=run_id,
                         block_id=cid,
                         priority=priority,
+                        **locality_hint(self.db, run_id, finished_block_id),
                     )
                 )
         self.db.commit()
@@ -138,19 +158,20 @@ class WorkerRunner:
         for attempt in range(max_attempts):
             try:
                 now = datetime.utcnow()
-                # 1) Find earliest pending
+                q = models.BlockQueue
+                mine = q.preferred_worker == self.worker_id
+                # 1) Find earliest pending; items reserved for another worker
+                # (locality hint) wait until their window closes
                 pending = self.db.execute(
-                    select(models.BlockQueue)
+                    select(q)
                     .where(
                         and_(
-                            models.BlockQueue.taken_by.is_(None),
-                            or_(
-                                models.BlockQueue.not_before_at.is_(None),
-                                models.BlockQueue.not_before_at <= now,
-                            ),
+                            q.taken_by.is_(None),
+                            or_(q.not_before_at.is_(None), q.not_before_at <= now),
+                            or_(q.preferred_worker.is_(None), mine, q.prefer_until <= now),
                         )
                     )
-                    .order_by(models.BlockQueue.priority.asc(), models.BlockQueue.enqueued_at.asc())
+                    .order_by(q.priority.asc(), case((mine, 0), else_=1), q.enqueued_at.asc())
                     .limit(1)
                 ).scalar_one_or_none()
                 if not pending:
@@ -174,6 +195,8 @@ class WorkerRunner:
                         pipeline_run_id=pending.pipeline_run_id,
                         block_id=pending.block_id,
                         priority=pending.priority,
+                        shard_index=pending.shard_index,
+                        fused=bool(pending.fused),
                     )
                 # else: race, retry
                 time.sleep(base * (2**attempt) + random.random() * 0.01)
@@ -223,6 +246,11 @@ class WorkerRunner:
             if not claimed_id:
                 return False
 
+        if claimed_id.shard_index is not None:
+            return self._process_shard(claimed_id)
+        if claimed_id.fused:
+            return self._process_fused(claimed_id)
+
         # get or create BlockRun for (run, block)
         br = self.db.execute(
             select(models.BlockRun).where(
@@ -274,98 +302,375 @@ class WorkerRunner:
             if not step_fn:
                 raise RuntimeError(f"No step implementation for {getattr(block, 'type', None)}")
 
-            # run the step (it may do its own commits)
-            step_fn(self.db, br.id)
+            shards = br.shard_count or sharding.requested_shards(self.db, br, block)
+            if shards > 1 and not br.shard_count:
+                # fan out: shards are processed as separate queue items and the
+                # worker finishing the last one merges and completes the block
+                n = sharding.plan(self.db, br, shards, priority=claimed_id.priority)
+                log_event(
+                    self.db,
+                    level="INFO",
+                    message="block_sharded",
+                    pipeline_run_id=br.pipeline_run_id,
+                    block_run_id=br.id,
+                    worker_id=self.worker_id,
+                    extra={"block_id": br.block_id, "shards": n},
+                )
+                return True
+            if br.shard_count:
+                # retry of a failed merge: shards are done, merge again
+                br.merge_started_at = None
+                self.db.add(br)
+                self.db.commit()
+                if not sharding.try_merge(self.db, br):
+                    return True
+            else:
+                # run the step (it may do its own commits)
+                step_fn(self.db, br.id)
 
-            # ensure ORM state is fresh after any nested commits
-            self.db.expire_all()
-            br = self.db.get(models.BlockRun, br.id)
-            br.status = models.RunStatus.SUCCEEDED
-            br.finished_at = datetime.utcnow()
-            self.db.add(br)
-            self.db.commit()
+            self._block_succeeded(claimed_id, br.id)
 
-            log_event(
-                self.db,
-                level="INFO",
-                message="block_succeeded",
-                pipeline_run_id=br.pipeline_run_id,
-                block_run_id=br.id,
-                worker_id=self.worker_id,
-                extra={"block_id": br.block_id},
-            )
+        except StreamPaused as e:
+            self._block_paused(claimed_id, br.id, e)
+        except Exception as e:
+            self._block_failed(claimed_id, br.id, e)
+
+        return True
+
+    def _retry_policy(self, block_id: int) -> tuple[int, int]:
+        block = self.db.get(models.Block, block_id)
+        retry_cfg = (block.config_json or {}).get("retry", {}) if block else {}
+        max_attempts = int(retry_cfg.get("max_attempts", settings.MAX_ATTEMPTS_DEFAULT))
+        backoff_base = int(retry_cfg.get("backoff_seconds", settings.BACKOFF_BASE_SECONDS))
+        return max_attempts, backoff_base
+
+    def _block_succeeded(self, claimed_id: Claimed, br_id: int) -> None:
+        # ensure ORM state is fresh after any nested commits
+        self.db.expire_all()
+        br = self.db.get(models.BlockRun, br_id)
+        br.status = models.RunStatus.SUCCEEDED
+        br.error_msg = None
+        br.finished_at = datetime.utcnow()
+        self.db.add(br)
+        self.db.commit()
 
-            # schedule downstream via your scheduler
-            self.scheduler.on_block_finished(claimed_id.pipeline_run_id, claimed_id.block_id)
+        log_event(
+            self.db,
+            level="INFO",
+            message="block_succeeded",
+            pipeline_run_id=br.pipeline_run_id,
+            block_run_id=br.id,
+            worker_id=self.worker_id,
+            extra={"block_id": br.block_id},
+        )
+
+        # schedule downstream via your scheduler
+        self.scheduler.on_block_finished(claimed_id.pipeline_run_id, claimed_id.block_id)
+
+        # SAFETY NET: make sure children are actually queued
+        self._ensure_downstream_enqueued(
+            run_id=claimed_id.pipeline_run_id,
+            finished_block_id=claimed_id.block_id,
+            priority=getattr(claimed_id, "priority", 100),
+        )
+
+        Orchestrator(self.db).reconcile_run(claimed_id.pipeline_run_id)
 
-            # SAFETY NET: make sure children are actually queued
-            self._ensure_downstream_enqueued(
-                run_id=claimed_id.pipeline_run_id,
-                finished_block_id=claimed_id.block_id,
+    def _block_paused(self, claimed_id: Claimed, br_id: int, e: StreamPaused) -> None:
+        """
+        A stream consumer whose producer waits for a retry: not an attempt,
+        so put the block back in the queue behind the producer's retry.
+        """
+        try:
+            self.db.rollback()
+        except Exception:
+            pass
+        br = self.db.get(models.BlockRun, br_id)
+        br.status = models.RunStatus.QUEUED
+        br.attempts = max(0, (br.attempts or 1) - 1)
+        self.db.add(br)
+        self.db.add(
+            models.BlockQueue(
+                pipeline_run_id=claimed_id.pipeline_run_id,
+                block_id=claimed_id.block_id,
                 priority=getattr(claimed_id, "priority", 100),
+                not_before_at=e.not_before,
             )
+        )
+        self.db.commit()
+        log_event(
+            self.db,
+            level="INFO",
+            message="block_paused",
+            pipeline_run_id=br.pipeline_run_id,
+            block_run_id=br.id,
+            worker_id=self.worker_id,
+            extra={"block_id": br.block_id},
+        )
 
-            Orchestrator(self.db).reconcile_run(claimed_id.pipeline_run_id)
+    def _block_failed(self, claimed_id: Claimed, br_id: int, e: Exception) -> None:
+        # Ensure clean session after any flush/commit failure
+        try:
+            self.db.rollback()
+        except Exception:
+            pass
 
-        except Exception as e:
-            # Ensure clean session after any flush/commit failure
-            try:
-                self.db.rollback()
-            except Exception:
-                pass
+        # Reload fresh block run row
+        br = self.db.get(models.BlockRun, br_id)
+        if br is None:
+            br = models.BlockRun(
+                pipeline_run_id=claimed_id.pipeline_run_id,
+                block_id=claimed_id.block_id,
+            )
+            self.db.add(br)
+            self.db.flush()
+
+        # Mark this attempt failed
+        br.status = models.RunStatus.FAILED
+        br.error_msg = str(e)
+        br.finished_at = datetime.utcnow()
+        self.db.add(br)
+        self.db.commit()
+
+        log_event(
+            self.db,
+            level="ERROR",
+            message="block_failed",
+            pipeline_run_id=br.pipeline_run_id,
+            block_run_id=br.id,
+            worker_id=self.worker_id,
+            extra={"block_id": br.block_id, "error": str(e)},
+        )
+
+        # --- RETRY LOGIC (re-enqueue) ---
+        max_attempts, backoff_base = self._retry_policy(claimed_id.block_id)
 
-            # Reload fresh block run row
-            br = self.db.get(models.BlockRun, br.id)
-            if br is None:
-                br = models.BlockRun(
+        if (br.attempts or 1) < max_attempts:
+            # exponential backoff: 0, B, 2B, 4B ...
+            delay = backoff_base * (2 ** max(0, (br.attempts or 1) - 1))
+            not_before = datetime.utcnow() + timedelta(seconds=delay)
+            priority = getattr(claimed_id, "priority", 100)
+            self.db.add(
+                models.BlockQueue(
                     pipeline_run_id=claimed_id.pipeline_run_id,
                     block_id=claimed_id.block_id,
+                    priority=priority,
+                    not_before_at=not_before,
                 )
-                self.db.add(br)
-                self.db.flush()
+            )
+            self.db.commit()
+        # --- end retry logic ---
+
+        # Reconcile after (possibly) re-enqueuing so run stays RUNNING if there’s a retry
+        Orchestrator(self.db).reconcile_run(claimed_id.pipeline_run_id)
+
+    def _process_fused(self, claimed_id: Claimed) -> bool:
+        """
+        Run the whole pipeline run in memory, then persist one BlockRun summary
+        per block and the sink artifacts in a single transaction.
+        """
+        run_id = claimed_id.pipeline_run_id
+        self.db.execute(delete(models.BlockQueue).where(models.BlockQueue.id == claimed_id.id))
+        self.db.commit()
+        log_event(
+            self.db,
+            level="INFO",
+            message="fused_run_start",
+            pipeline_run_id=run_id,
+            worker_id=self.worker_id,
+        )
+
+        failed: Optional[fused.FusedBlockFailed] = None
+        try:
+            result = fused.execute(self.db, run_id)
+        except fused.FusedBlockFailed as e:
+            self.db.rollback()
+            failed, result = e, e.result
 
-            # Mark this attempt failed
-            br.status = models.RunStatus.FAILED
-            br.error_msg = str(e)
-            br.finished_at = datetime.utcnow()
+        existing = {
+            br.block_id: br
+            for br in self.db.scalars(
+                select(models.BlockRun).where(models.BlockRun.pipeline_run_id == run_id)
+            ).all()
+        }
+        br_ids = {}
+        for summary in result.summaries:
+            br = existing.get(summary.block_id) or models.BlockRun(
+                pipeline_run_id=run_id, block_id=summary.block_id
+            )
+            br.worker_id = self.worker_id
+            br.attempts = (br.attempts or 0) + 1
+            br.started_at = summary.started_at
+            br.finished_at = summary.finished_at
+            if failed and summary.block_id == failed.block_id:
+                br.status = models.RunStatus.FAILED
+                br.error_msg = str(failed)
+            else:
+                br.status = models.RunStatus.SUCCEEDED
+                br.error_msg = None
             self.db.add(br)
-            self.db.commit()
+            self.db.flush()
+            br_ids[summary.block_id] = br.id
+        if not failed:
+            for block_id, art in result.artifacts:
+                art.block_run_id = br_ids[block_id]
+                self.db.add(art)
+            for art, inputs in result.lineage:
+                lineage.record(self.db, art, inputs)
+        self.db.commit()
 
+        if failed:
             log_event(
                 self.db,
                 level="ERROR",
                 message="block_failed",
-                pipeline_run_id=br.pipeline_run_id,
-                block_run_id=br.id,
+                pipeline_run_id=run_id,
+                block_run_id=br_ids.get(failed.block_id),
                 worker_id=self.worker_id,
-                extra={"block_id": br.block_id, "error": str(e)},
+                extra={"block_id": failed.block_id, "error": str(failed), "fused": True},
+            )
+            br = self.db.get(models.BlockRun, br_ids[failed.block_id])
+            max_attempts, backoff_base = self._retry_policy(failed.block_id)
+            if (br.attempts or 1) < max_attempts:
+                # the retry re-runs the whole fused DAG
+                delay = backoff_base * (2 ** max(0, (br.attempts or 1) - 1))
+                self.db.add(
+                    models.BlockQueue(
+                        pipeline_run_id=run_id,
+                        block_id=claimed_id.block_id,
+                        priority=claimed_id.priority,
+                        not_before_at=datetime.utcnow() + timedelta(seconds=delay),
+                        fused=True,
+                    )
+                )
+                self.db.commit()
+        else:
+            log_event(
+                self.db,
+                level="INFO",
+                message="fused_run_succeeded",
+                pipeline_run_id=run_id,
+                worker_id=self.worker_id,
+                extra={"blocks": len(result.summaries)},
+            )
+        Orchestrator(self.db).reconcile_run(run_id)
+        return True
+
+    def _process_shard(self, claimed_id: Claimed) -> bool:
+        """Run one shard of a sharded block; the last shard to finish merges."""
+        br = self.db.execute(
+            select(models.BlockRun).where(
+                and_(
+                    models.BlockRun.pipeline_run_id == claimed_id.pipeline_run_id,
+                    models.BlockRun.block_id == claimed_id.block_id,
+                )
+            )
+        ).scalar_one()
+        shard = self.db.execute(
+            select(models.BlockShard).where(
+                and_(
+                    models.BlockShard.block_run_id == br.id,
+                    models.BlockShard.shard_index == claimed_id.shard_index,
+                )
             )
+        ).scalar_one()
 
-            # --- RETRY LOGIC (re-enqueue) ---
-            from app.core.config import settings  # avoid cycle
+        self.db.execute(delete(models.BlockQueue).where(models.BlockQueue.id == claimed_id.id))
+        if br.status == models.RunStatus.FAILED:
+            # another shard already failed the block for good
+            self.db.commit()
+            return True
+        shard.status = models.RunStatus.RUNNING
+        shard.worker_id = self.worker_id
+        shard.attempts = (shard.attempts or 0) + 1
+        shard.started_at = datetime.utcnow()
+        self.db.add(shard)
+        self.db.commit()
 
-            block = self.db.get(models.Block, claimed_id.block_id)
-            retry_cfg = (block.config_json or {}).get("retry", {}) if block else {}
-            max_attempts = int(retry_cfg.get("max_attempts", settings.MAX_ATTEMPTS_DEFAULT))
-            backoff_base = int(retry_cfg.get("backoff_seconds", settings.BACKOFF_BASE_SECONDS))
+        extra = {"block_id": br.block_id, "shard": shard.shard_index}
+        log_event(
+            self.db,
+            level="INFO",
+            message="shard_start",
+            pipeline_run_id=br.pipeline_run_id,
+            block_run_id=br.id,
+            worker_id=self.worker_id,
+            extra=extra,
+        )
 
-            if (br.attempts or 1) < max_attempts:
-                # exponential backoff: 0, B, 2B, 4B ...
-                delay = backoff_base * (2 ** max(0, (br.attempts or 1) - 1))
-                not_before = datetime.utcnow() + timedelta(seconds=delay)
-                priority = getattr(claimed_id, "priority", 100)
+        try:
+            sharding.run_shard(self.db, shard)
+        except Exception as e:
+            self.db.rollback()
+            shard = self.db.get(models.BlockShard, shard.id)
+            shard.status = models.RunStatus.FAILED
+            shard.error_msg = str(e)
+            shard.finished_at = datetime.utcnow()
+            self.db.add(shard)
+            self.db.commit()
+            log_event(
+                self.db,
+                level="ERROR",
+                message="shard_failed",
+                pipeline_run_id=br.pipeline_run_id,
+                block_run_id=br.id,
+                worker_id=self.worker_id,
+                extra={**extra, "error": str(e)},
+            )
+
+            max_attempts, backoff_base = self._retry_policy(claimed_id.block_id)
+            if shard.attempts < max_attempts:
+                delay = backoff_base * (2 ** max(0, shard.attempts - 1))
                 self.db.add(
                     models.BlockQueue(
                         pipeline_run_id=claimed_id.pipeline_run_id,
                         block_id=claimed_id.block_id,
-                        priority=priority,
-                        not_before_at=not_before,
+                        priority=claimed_id.priority,
+                        not_before_at=datetime.utcnow() + timedelta(seconds=delay),
+                        shard_index=shard.shard_index,
                     )
                 )
                 self.db.commit()
-            # --- end retry logic ---
-
-            # Reconcile after (possibly) re-enqueuing so run stays RUNNING if there’s a retry
+            else:
+                # out of attempts: the whole block fails terminally
+                br = self.db.get(models.BlockRun, br.id)
+                br.status = models.RunStatus.FAILED
+                br.error_msg = f"shard {shard.shard_index}: {e}"
+                br.attempts = max(br.attempts or 0, shard.attempts)
+                br.finished_at = datetime.utcnow()
+                self.db.add(br)
+                self.db.commit()
+                log_event(
+                    self.db,
+                    level="ERROR",
+                    message="block_failed",
+                    pipeline_run_id=br.pipeline_run_id,
+                    block_run_id=br.id,
+                    worker_id=self.worker_id,
+                    extra={"block_id": br.block_id, "error": br.error_msg},
+                )
             Orchestrator(self.db).reconcile_run(claimed_id.pipeline_run_id)
+            return True
+
+        shard.status = models.RunStatus.SUCCEEDED
+        shard.finished_at = datetime.utcnow()
+        self.db.add(shard)
+        self.db.commit()
+        log_event(
+            self.db,
+            level="INFO",
+            message="shard_succeeded",
+            pipeline_run_id=br.pipeline_run_id,
+            block_run_id=br.id,
+            worker_id=self.worker_id,
+            extra=extra,
+        )
 
-        return True
\ No newline at end of file
+        try:
+            merged = sharding.try_merge(self.db, br)
+        except Exception as e:
+            self._block_failed(claimed_id, br.id, e)
+            return True
+        if merged:
+            self._block_succeeded(claimed_id, br.id)
+        return True
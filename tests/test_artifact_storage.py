@@ -1,9 +1,16 @@
+import hashlib
+import io
+import json
+import tarfile
+import zipfile
 from fastapi.testclient import TestClient
+from sqlalchemy import select
 from app.main import app
 from app.infra.db import Base, engine, SessionLocal
 from app import models
 from app.core.orchestrator import Orchestrator
 from app.core.config import settings
+from app.workers.runner import WorkerRunner
 
 
 def setup_function():
@@ -64,3 +71,143 @@ def test_upload_list_and_signed_download(tmp_path):
     finally:
         settings.SIGNED_URLS_REQUIRED = False
         db.close()
+
+
+def test_download_ranges_and_conditional_requests(monkeypatch):
+    # ranges of the plain content (a compressed blob would be sent encoded)
+    monkeypatch.setattr(settings, "ARTIFACT_CODEC", "none")
+    client = TestClient(app)
+    db = SessionLocal()
+    try:
+        run = _mk_run(db)
+        data = bytes(range(256)) * 40
+        art_id = client.post(
+            f"/runs/{run.id}/artifacts/upload",
+            files={"file": ("blob.bin", data, "application/octet-stream")},
+        ).json()["id"]
+        url = f"/artifacts/{art_id}/download"
+
+        full = client.get(url)
+        assert full.status_code == 200 and full.content == data
+        etag = full.headers["etag"]
+        assert full.headers["accept-ranges"] == "bytes"
+
+        part = client.get(url, headers={"Range": "bytes=100-199"})
+        assert part.status_code == 206
+        assert part.content == data[100:200]
+        assert part.headers["content-range"] == f"bytes 100-199/{len(data)}"
+        tail = client.get(url, headers={"Range": "bytes=-10"})
+        assert tail.status_code == 206 and tail.content == data[-10:]
+        assert client.get(url, headers={"Range": f"bytes={len(data)}-"}).status_code == 416
+        # a stale If-Range falls back to the whole file
+        stale = client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"other"'})
+        assert stale.status_code == 200 and stale.content == data
+
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+        head = client.head(url)
+        assert head.status_code == 200 and head.content == b""
+        assert head.headers["content-length"] == str(len(data))
+        head_part = client.head(url, headers={"Range": "bytes=0-9"})
+        assert head_part.status_code == 206 and head_part.headers["content-length"] == "10"
+    finally:
+        db.close()
+
+
+def test_chunked_upload_resumes_and_verifies_parts():
+    import hashlib
+
+    client = TestClient(app)
+    db = SessionLocal()
+    try:
+        run = _mk_run(db)
+        data = b"".join(f"row {i}\n".encode() for i in range(3000))
+        parts = [data[i : i + 8000] for i in range(0, len(data), 8000)]
+        init = client.post(f"/runs/{run.id}/uploads", json={"filename": "big.csv", "kind": "CSV_ROWS"})
+        assert init.status_code == 200, init.text
+        upload_id = init.json()["upload_id"]
+        url = f"/uploads/{upload_id}"
+
+        # parts arrive out of order; a corrupted one is rejected
+        for n in reversed(range(2, len(parts) + 1)):
+            res = client.put(
+                f"{url}/parts/{n}",
+                content=parts[n - 1],
+                headers={"X-Checksum-SHA256": hashlib.sha256(parts[n - 1]).hexdigest()},
+            )
+            assert res.status_code == 200 and res.json()["size"] == len(parts[n - 1])
+        bad = client.put(
+            f"{url}/parts/1",
+            content=b"garbage",
+            headers={"X-Checksum-SHA256": hashlib.sha256(parts[0]).hexdigest()},
+        )
+        assert bad.status_code == 400
+        assert client.post(f"{url}/complete", json={}).status_code == 400
+
+        # the client resumes by sending only what the status lacks
+        have = {p["number"] for p in client.get(url).json()["parts"]}
+        assert have == set(range(2, len(parts) + 1))
+        assert client.put(f"{url}/parts/1", content=parts[0]).status_code == 200
+
+        done = client.post(f"{url}/complete", json={"sha256": hashlib.sha256(data).hexdigest()})
+        assert done.status_code == 200, done.text
+        assert done.json()["size"] == len(data)
+        assert client.post(f"{url}/complete", json={}).status_code == 409
+        got = client.get(f"/artifacts/{done.json()['id']}/download")
+        assert got.content == data
+        assert 'filename="big.csv"' in got.headers["content-disposition"]
+        assert db.get(models.Artifact, done.json()["id"]).kind == models.ArtifactKind.CSV_ROWS
+    finally:
+        db.close()
+
+
+def test_run_bundle_streams_every_artifact_with_a_manifest(tmp_path):
+    src = tmp_path / "in.csv"
+    src.write_text("id,text\n" + "".join(f"{i},good {i}\n" for i in range(100)), encoding="utf-8")
+    out = tmp_path / "out.csv"
+    db = SessionLocal()
+    try:
+        p = models.Pipeline(name="bundle")
+        db.add(p)
+        db.flush()
+        blocks = [
+            models.Block(pipeline_id=p.id, type=models.BlockType.CSV_READER, name="csv", config_json={"input_path": str(src)}),
+            models.Block(pipeline_id=p.id, type=models.BlockType.LLM_SENTIMENT, name="sent", config_json={}),
+            models.Block(pipeline_id=p.id, type=models.BlockType.CSV_WRITER, name="out", config_json={"output_path": str(out)}),
+        ]
+        db.add_all(blocks)
+        db.flush()
+        for a, b in zip(blocks, blocks[1:]):
+            db.add(models.Edge(pipeline_id=p.id, from_block_id=a.id, to_block_id=b.id))
+        db.commit()
+        run = Orchestrator(db).start_run(p.id)
+        w = WorkerRunner(db, worker_id="t")
+        while w.process_next():
+            pass
+        arts = db.scalars(
+            select(models.Artifact).where(models.Artifact.pipeline_run_id == run.id)
+        ).all()
+
+        client = TestClient(app)
+        res = client.get(f"/runs/{run.id}/artifacts/bundle")
+        assert res.status_code == 200
+        assert res.headers["content-type"] == "application/zip"
+        with zipfile.ZipFile(io.BytesIO(res.content)) as zf:
+            manifest = json.loads(zf.read("manifest.json"))
+            assert [e["id"] for e in manifest["artifacts"]] == [a.id for a in arts]
+            for entry in manifest["artifacts"]:
+                data = zf.read(entry["path"])
+                assert hashlib.sha256(data).hexdigest() == entry["sha256"]
+                assert len(data) == entry["bytes"]
+        by_block = {e["block"]: e for e in manifest["artifacts"]}
+        assert by_block["out"]["path"] == "out/out.csv"
+        assert by_block["out"]["inputs"] == [by_block["sent"]["id"]]
+        assert by_block["sent"]["inputs"] == [by_block["csv"]["id"]]
+
+        res = client.get(f"/runs/{run.id}/artifacts/bundle", params={"format": "tar.gz"})
+        with tarfile.open(fileobj=io.BytesIO(res.content), mode="r:gz") as tf:
+            names = tf.getnames()
+            assert names[-1] == "manifest.json"
+            assert tf.extractfile("out/out.csv").read() == out.read_bytes()
+        assert client.get(f"/runs/{run.id}/artifacts/bundle", params={"format": "rar"}).status_code == 400
+    finally:
+        db.close()
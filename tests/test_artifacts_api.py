@@ -1,4 +1,6 @@
+import csv
 from fastapi.testclient import TestClient
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from app.infra.db import Base, engine, SessionLocal
 from app import models
@@ -48,3 +50,71 @@ def test_list_artifacts_for_run(tmp_path):
         assert "CSV_ROWS" in kinds
     finally:
         db.close()
+
+
+def test_list_artifacts_filters_by_kind_and_pages_by_cursor():
+    db = SessionLocal()
+    try:
+        p = models.Pipeline(name="arts-pages")
+        db.add(p)
+        db.flush()
+        run = models.PipelineRun(pipeline_id=p.id, correlation_id="c")
+        db.add(run)
+        db.flush()
+        for i in range(5):
+            kind = models.ArtifactKind.CSV_ROWS if i % 2 else models.ArtifactKind.GENERIC
+            db.add(models.Artifact(pipeline_run_id=run.id, kind=kind, uri=f"/tmp/{i}"))
+        db.commit()
+
+        client = TestClient(app)
+        assert len(client.get(f"/runs/{run.id}/artifacts?kind=CSV_ROWS").json()) == 2
+        assert client.get(f"/runs/{run.id}/artifacts?kind=NOPE").json() == []
+
+        ids, cursor = [], ""
+        while True:
+            res = client.get(f"/runs/{run.id}/artifacts?kind=GENERIC&limit=2&cursor={cursor}")
+            assert res.status_code == 200
+            ids += [a["id"] for a in res.json()]
+            cursor = res.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert len(ids) == 3 and ids == sorted(ids)
+    finally:
+        db.close()
+
+
+def test_artifact_rows_pages_through_the_row_index(tmp_path):
+    input_csv = tmp_path / "input.csv"
+    with input_csv.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["id", "text", "n"])
+        for i in range(2500):
+            w.writerow([i, f"line {i}\nwrapped" if i % 7 == 0 else f"row {i}", i * 2])
+
+    db = SessionLocal()
+    try:
+        p = _make_csv_pipeline(db, str(input_csv))
+        run = Orchestrator(db).start_run(p.id)
+        w = WorkerRunner(db, worker_id="t")
+        while w.process_next():
+            pass
+        art = db.scalars(
+            select(models.Artifact).where(models.Artifact.pipeline_run_id == run.id)
+        ).first()
+
+        client = TestClient(app)
+        url = f"/artifacts/{art.id}/rows"
+        page = client.get(url, params={"offset": 2100, "limit": 3}).json()
+        assert page["total"] == 2500 and page["columns"] == ["id", "text", "n"]
+        assert page["rows"][0] == {"id": "2100", "text": "line 2100\nwrapped", "n": "4200"}
+        assert [r["id"] for r in page["rows"]] == ["2100", "2101", "2102"]
+        assert page["next_offset"] == 2103
+
+        last = client.get(url, params={"offset": 2498, "columns": "n"}).json()
+        assert last["rows"] == [{"n": "4996"}, {"n": "4998"}]
+        assert last["columns"] == ["n"] and last["next_offset"] is None
+        assert client.get(url, params={"columns": "nope"}).status_code == 400
+        assert client.get(url, params={"limit": 0}).status_code == 422
+        assert client.get("/artifacts/999999/rows").status_code == 404
+    finally:
+        db.close()
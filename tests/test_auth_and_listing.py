@@ -4,6 +4,7 @@ from app.infra.db import Base, engine, SessionLocal
 from app import models
 from app.core.orchestrator import Orchestrator
 from app.core.config import settings
+from app.api import pagination
 
 
 def setup_function():
@@ -104,3 +105,55 @@ def test_list_runs_and_block_runs():
     finally:
         db.close()
         settings.API_KEY = None
+
+
+def test_cursor_pages_cover_every_row_once(monkeypatch):
+    from datetime import datetime, timedelta
+
+    monkeypatch.setattr(settings, "API_KEY", None)
+    client = TestClient(app)
+    db = SessionLocal()
+    try:
+        p = _mk_pipeline(db, name="keyset")
+        t0 = datetime(2024, 1, 1)
+        # ties on started_at and a NULL (queued) run must not be skipped or repeated
+        starts = [t0, t0, t0 + timedelta(minutes=1), None, t0 + timedelta(minutes=2)]
+        for s in starts:
+            db.add(models.PipelineRun(pipeline_id=p.id, correlation_id="c", started_at=s))
+        db.commit()
+
+        for order in ("-started_at", "started_at", "-id"):
+            seen, cursor = [], None
+            while True:
+                url = f"/runs?page_size=2&order={order}&total=none"
+                res = client.get(url + (f"&cursor={cursor}" if cursor else ""))
+                assert res.status_code == 200
+                body = res.json()
+                assert body["total"] is None
+                seen += [r["id"] for r in body["items"]]
+                cursor = body["next_cursor"]
+                if not cursor:
+                    break
+            assert sorted(seen) == sorted(set(seen)) and len(seen) == len(starts)
+
+        first = client.get("/runs?page_size=2&order=-started_at").json()
+        assert first["total"] == len(starts)
+        assert first["items"][0]["started_at"].startswith("2024-01-01T00:02")
+        # a cursor only continues the order it was issued for
+        bad = client.get(f"/runs?order=started_at&cursor={first['next_cursor']}")
+        assert bad.status_code == 400
+        assert client.get("/runs?cursor=not-a-cursor").status_code == 400
+        assert client.get("/runs?order=bogus").status_code == 400
+
+        # cached totals are bounded, the least recently used dropped first
+        monkeypatch.setattr(pagination, "CACHED_TOTALS", 2)
+        pagination._totals.clear()
+        for status in ("queued", "running", "succeeded"):
+            client.get(f"/runs?status={status}&total=cached")
+        assert len(pagination._totals) == 2
+        assert list(pagination._totals) == [
+            ("runs", "running", None),
+            ("runs", "succeeded", None),
+        ]
+    finally:
+        db.close()
@@ -0,0 +1,202 @@
+import hashlib
+import pytest
+from pathlib import Path
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, select
+from app.core.config import settings
+from app.core.storage import collect_garbage
+from app.infra import cas
+from app.infra.db import Base, engine, SessionLocal
+from app import models
+from app.core.orchestrator import Orchestrator
+from app.main import app
+from app.workers.runner import WorkerRunner
+
+
+def setup_function():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+@pytest.fixture(autouse=True)
+def _own_store(tmp_path, monkeypatch):
+    # a fresh store per test: blobs left by other tests would dedupe
+    monkeypatch.setattr(settings, "ARTIFACTS_DIR", str(tmp_path / "artifacts"))
+    monkeypatch.setattr(settings, "ARTIFACT_CODEC", "none")
+
+
+def _pipeline(db, src, out):
+    p = models.Pipeline(name="cas")
+    db.add(p)
+    db.flush()
+    blocks = [
+        models.Block(pipeline_id=p.id, type=models.BlockType.CSV_READER, name="csv", config_json={"input_path": str(src)}),
+        models.Block(pipeline_id=p.id, type=models.BlockType.LLM_SENTIMENT, name="sent", config_json={}),
+        models.Block(pipeline_id=p.id, type=models.BlockType.CSV_WRITER, name="out", config_json={"output_path": str(out)}),
+    ]
+    db.add_all(blocks)
+    db.flush()
+    for a, b in zip(blocks, blocks[1:]):
+        db.add(models.Edge(pipeline_id=p.id, from_block_id=a.id, to_block_id=b.id))
+    db.commit()
+    return p, blocks
+
+
+def _run(db, pipeline_id):
+    run = Orchestrator(db).start_run(pipeline_id)
+    w = WorkerRunner(db, worker_id="w1")
+    while w.process_next():
+        pass
+    assert db.get(models.PipelineRun, run.id).status == models.RunStatus.SUCCEEDED
+    return run.id
+
+
+def test_repeated_runs_share_blobs(tmp_path):
+    src = tmp_path / "in.csv"
+    src.write_text("id,text\n1,good\n2,bad\n", encoding="utf-8")
+    out = tmp_path / "out.csv"
+    db = SessionLocal()
+    try:
+        p, blocks = _pipeline(db, src, out)
+        first, second = _run(db, p.id), _run(db, p.id)
+
+        sent = db.scalars(
+            select(models.Artifact)
+            .where(models.Artifact.block_id == blocks[1].id)
+            .order_by(models.Artifact.id)
+        ).all()
+        assert [a.pipeline_run_id for a in sent] == [first, second]
+        assert sent[0].uri == sent[1].uri and sent[0].uri.startswith("cas://")
+        digest = cas.digest_of(sent[0].uri)
+        blob = cas.blob_path(digest)
+        assert hashlib.sha256(blob.read_bytes()).hexdigest() == digest
+        assert sent[0].meta_json["sha256"] == digest
+        # both run files are links to the one stored copy
+        for a in sent:
+            assert cas.resolve_uri(a.uri).stat().st_ino == blob.stat().st_ino
+            assert Path(a.meta_json["path"]).stat().st_ino == blob.stat().st_ino
+
+        # the writer's target is outside ARTIFACTS_DIR; its content is the
+        # sentiment output's, so it is counted against the same blob
+        written = db.scalars(
+            select(models.Artifact).where(models.Artifact.block_id == blocks[2].id)
+        ).all()
+        assert {a.uri for a in written} == {sent[0].uri}
+        assert written[0].meta_json["path"] == str(out)
+        assert db.get(models.Blob, digest).refcount == 4
+    finally:
+        db.close()
+
+
+def test_upload_is_stored_by_digest_and_collected(tmp_path):
+    client = TestClient(app)
+    db = SessionLocal()
+    try:
+        p = models.Pipeline(name="cas-upload")
+        db.add(p)
+        db.commit()
+        run = Orchestrator(db).start_run(p.id)
+        data = b"hello blob\n" * 100
+        ids = [
+            client.post(
+                f"/runs/{run.id}/artifacts/upload",
+                files={"file": (name, data, "text/plain")},
+            ).json()["id"]
+            for name in ("a.txt", "b.txt")
+        ]
+        arts = [db.get(models.Artifact, i) for i in ids]
+        digest = hashlib.sha256(data).hexdigest()
+        assert {a.uri for a in arts} == {cas.uri_for(digest)}
+        assert db.get(models.Blob, digest).refcount == 2
+
+        res = client.get(f"/artifacts/{ids[1]}/download")
+        assert res.content == data
+        assert 'filename="b.txt"' in res.headers["content-disposition"]
+
+        assert client.get("/admin/blobs/verify").json() == {"checked": 1, "corrupt": []}
+        cas.blob_path(digest).write_bytes(b"tampered")
+        assert client.get("/admin/blobs/verify").json()["corrupt"] == [digest]
+
+        db.execute(delete(models.Artifact).where(models.Artifact.pipeline_run_id == run.id))
+        db.commit()
+        assert collect_garbage(db, grace_seconds=0)["blobs"] >= 1
+        assert not cas.blob_path(digest).exists()
+        assert db.get(models.Blob, digest) is None
+    finally:
+        db.close()
+
+
+def test_compressed_blobs_read_transparently(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ARTIFACT_CODEC", "gzip")
+    src = tmp_path / "in.csv"
+    src.write_text("id,text\n" + "".join(f"{i},good text {i}\n" for i in range(200)), encoding="utf-8")
+    out = tmp_path / "out.csv"
+    client = TestClient(app)
+    db = SessionLocal()
+    try:
+        p, blocks = _pipeline(db, src, out)
+        _run(db, p.id)
+        sent = db.scalars(
+            select(models.Artifact).where(models.Artifact.block_id == blocks[1].id)
+        ).one()
+        digest = cas.digest_of(sent.uri)
+        path, codec = cas.stored(digest)
+        assert codec == "gzip" and path.suffix == ".gz"
+        assert sent.meta_json["codec"] == "gzip" and sent.meta_json["ratio"] > 1
+        # the run file was dropped and the writer decompressed as it read:
+        # only the compressed copy is on disk
+        assert not Path(sent.meta_json["path"]).exists()
+        assert not cas.cache_path(digest).exists()
+        assert out.read_bytes() and out.stat().st_nlink == 1
+
+        url = f"/artifacts/{sent.id}/download"
+        raw = client.get(url, headers={"Accept-Encoding": "gzip"})
+        assert raw.headers["content-encoding"] == "gzip"
+        assert raw.content == out.read_bytes()  # decoded by the client
+        assert raw.headers["etag"] == f'"{digest}-gzip"'
+        ident = client.get(url, headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in ident.headers
+        assert ident.content == out.read_bytes()
+        assert not cas.cache_path(digest).exists()
+
+        # readers that seek get a plain copy, held to PLAIN_CACHE_MAX_BYTES
+        plain = cas.resolve_uri(sent.uri)
+        assert plain == cas.cache_path(digest)
+        assert hashlib.sha256(plain.read_bytes()).hexdigest() == digest
+        monkeypatch.setattr(settings, "PLAIN_CACHE_MAX_BYTES", 1)
+        assert cas.trim_cache() == len(out.read_bytes())
+        assert not plain.exists() and cas.stored(digest)
+        assert cas.resolve_uri(sent.uri).read_bytes() == out.read_bytes()
+    finally:
+        db.close()
+
+
+def test_outputs_hashed_while_written_match_their_content(tmp_path):
+    path = tmp_path / "part.csv"
+    f, raw = cas.open_hashing(path)
+    f.write("id,text\r\n1,é\r\n")
+    f.close()
+    assert raw.hashed() == cas.hash_file(path)
+    # a resumed writer hashes what is already there, then what it appends
+    f, raw = cas.open_hashing(path, resume=True)
+    f.write("2,b\r\n")
+    f.flush()
+    assert f.tell() == path.stat().st_size
+    f.close()
+    assert raw.hashed() == cas.hash_file(path)
+
+    src = tmp_path / "in.csv"
+    src.write_text("id,text\n1,good\n2,bad\n", encoding="utf-8")
+    db = SessionLocal()
+    try:
+        p, _ = _pipeline(db, src, tmp_path / "out.csv")
+        run_id = _run(db, p.id)
+        arts = db.scalars(
+            select(models.Artifact).where(models.Artifact.pipeline_run_id == run_id)
+        ).all()
+        digests = [cas.digest_of(a.uri) for a in arts if cas.digest_of(a.uri)]
+        # the writer's copy has the LLM output's digest without being hashed again
+        assert len(digests) >= 2 and digests[-1] == digests[-2]
+        assert all(cas.verify(d) for d in digests)
+    finally:
+        db.close()
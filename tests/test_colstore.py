@@ -0,0 +1,172 @@
+import csv
+import os
+from pathlib import Path
+from sqlalchemy import select
+from app.infra import colstore
+from app.infra.db import Base, engine, SessionLocal
+from app import models
+from app.core.config import settings
+from app.core.orchestrator import Orchestrator
+from app.llm import langchain_client
+from app.workers.runner import WorkerRunner
+
+
+def setup_function():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+def test_store_roundtrip_and_linked_columns(tmp_path):
+    src = tmp_path / "in.csv"
+    src.write_text('id,text\n1,héllo\n2,"a,b"\n3,\n', encoding="utf-8")
+    store = colstore.from_csv(src, tmp_path / "rows.cols", batch_rows=2)
+    assert store.columns == ["id", "text"] and store.rows == 3
+
+    # add a column chunked differently from the input; input files are linked
+    w = colstore.StoreWriter(tmp_path / "out.cols", ["id", "text", "n"], linked=store)
+    w.append({"n": ["x"]}, 1)
+    w.append({"n": ["y", "z"]}, 2)
+    w.close(3)
+    out = colstore.ColumnStore(tmp_path / "out.cols")
+    assert os.path.samefile(out.file_for("text"), store.file_for("text"))
+
+    values = [v for _, cols in out.iter_rows(["n"]) for v in cols[0]]
+    assert values == ["x", "y", "z"]
+    assert out.to_csv_bytes().decode("utf-8").splitlines() == [
+        "id,text,n",
+        "1,héllo,x",
+        '2,"a,b",y',
+        "3,,z",
+    ]
+    # windows skip whole chunks and cut across chunk boundaries
+    assert out.window(1, 2, ["n", "id"]) == [{"n": "y", "id": "2"}, {"n": "z", "id": "3"}]
+    assert out.window(3, 5) == []
+
+
+def _make_pipeline(session, name, input_path, output_path, sent_cfg=None):
+    p = models.Pipeline(name=name)
+    session.add(p)
+    session.flush()
+    blocks = [
+        models.Block(
+            pipeline_id=p.id,
+            type=models.BlockType.CSV_READER,
+            name="csv",
+            config_json={"input_path": input_path},
+        ),
+        models.Block(
+            pipeline_id=p.id,
+            type=models.BlockType.LLM_SENTIMENT,
+            name="sent",
+            config_json=sent_cfg or {},
+        ),
+        models.Block(
+            pipeline_id=p.id,
+            type=models.BlockType.CSV_WRITER,
+            name="out",
+            config_json={"output_path": output_path},
+        ),
+    ]
+    session.add_all(blocks)
+    session.flush()
+    session.add_all(
+        [
+            models.Edge(pipeline_id=p.id, from_block_id=blocks[0].id, to_block_id=blocks[1].id),
+            models.Edge(pipeline_id=p.id, from_block_id=blocks[1].id, to_block_id=blocks[2].id),
+        ]
+    )
+    session.commit()
+    return p
+
+
+def _write_input(path, n):
+    with path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["id", "text", "lang"])
+        for i in range(n):
+            w.writerow([i, "good" if i % 2 else "bad, really bad", "en"])
+
+
+def _run(db, p):
+    run = Orchestrator(db).start_run(p.id)
+    w = WorkerRunner(db, worker_id="w1")
+    while w.process_next():
+        pass
+    db.refresh(run)
+    return run
+
+
+def test_colstore_intermediates_write_same_csv(tmp_path, monkeypatch):
+    src = tmp_path / "in.csv"
+    _write_input(src, 20)
+    db = SessionLocal()
+    try:
+        csv_run = _run(db, _make_pipeline(db, "csv", str(src), str(tmp_path / "a.csv")))
+        monkeypatch.setattr(settings, "INTERMEDIATE_FORMAT", "colstore")
+        monkeypatch.setattr(settings, "STEP_BATCH_ROWS", 8)
+        col_run = _run(db, _make_pipeline(db, "col", str(src), str(tmp_path / "b.csv")))
+
+        assert csv_run.status == col_run.status == models.RunStatus.SUCCEEDED
+        assert (tmp_path / "b.csv").read_bytes() == (tmp_path / "a.csv").read_bytes()
+
+        arts = {
+            a.kind: a
+            for a in db.scalars(
+                select(models.Artifact).where(models.Artifact.pipeline_run_id == col_run.id)
+            )
+        }
+        rows = arts[models.ArtifactKind.CSV_ROWS]
+        sent = db.scalars(
+            select(models.Artifact).where(
+                models.Artifact.pipeline_run_id == col_run.id,
+                models.Artifact.kind == models.ArtifactKind.SENTIMENT_CSV,
+            ).order_by(models.Artifact.id)
+        ).first()
+        assert sent.meta_json == {
+            "format": "colstore",
+            "rows": 20,
+            "columns": ["id", "text", "lang", "sentiment", "score"],
+        }
+        # the sentiment store reuses the input columns instead of rewriting them
+        s_store, r_store = colstore.ColumnStore(sent.uri), colstore.ColumnStore(rows.uri)
+        assert os.path.samefile(s_store.file_for("lang"), r_store.file_for("lang"))
+        assert sent.preview_json["rows"][1]["sentiment"] == "POSITIVE"
+    finally:
+        db.close()
+
+
+def test_colstore_retry_resumes_from_checkpoint(tmp_path, monkeypatch):
+    src = tmp_path / "in.csv"
+    _write_input(src, 10)
+    calls = []
+    real_predict = langchain_client.llm_predict
+
+    def flaky(prompt, system=None):
+        calls.append(prompt)
+        if len(calls) == 7:
+            raise RuntimeError("provider 503")
+        return real_predict(prompt, system)
+
+    monkeypatch.setattr(langchain_client, "llm_predict", flaky)
+    monkeypatch.setattr(settings, "INTERMEDIATE_FORMAT", "colstore")
+    db = SessionLocal()
+    try:
+        p = _make_pipeline(
+            db,
+            "col-retry",
+            str(src),
+            str(tmp_path / "out.csv"),
+            sent_cfg={
+                "checkpoint_every": 4,
+                "retry": {"max_attempts": 2, "backoff_seconds": 0},
+            },
+        )
+        run = _run(db, p)
+        assert run.status == models.RunStatus.SUCCEEDED
+        assert len(calls) == 11
+        with Path(tmp_path / "out.csv").open(newline="", encoding="utf-8") as f:
+            out = list(csv.DictReader(f))
+        assert [r["id"] for r in out] == [str(i) for i in range(10)]
+        assert [r["sentiment"] for r in out[:2]] == ["NEGATIVE", "POSITIVE"]
+    finally:
+        db.close()
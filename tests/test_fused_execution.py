@@ -0,0 +1,156 @@
+import csv
+from sqlalchemy import select
+from app.infra.db import Base, engine, SessionLocal
+from app import models
+from app.core import lineage
+from app.core.config import settings
+from app.core.orchestrator import Orchestrator
+from app.llm import langchain_client
+from app.workers.runner import WorkerRunner
+
+
+def setup_function():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+def _make_pipeline(session, name, input_path, output_path, execution="auto", sent_cfg=None):
+    p = models.Pipeline(name=name, execution=execution)
+    session.add(p)
+    session.flush()
+    b1 = models.Block(
+        pipeline_id=p.id,
+        type=models.BlockType.CSV_READER,
+        name="csv",
+        config_json={"input_path": input_path},
+    )
+    b2 = models.Block(
+        pipeline_id=p.id,
+        type=models.BlockType.LLM_SENTIMENT,
+        name="sent",
+        config_json=sent_cfg or {},
+    )
+    b3 = models.Block(
+        pipeline_id=p.id,
+        type=models.BlockType.CSV_WRITER,
+        name="out",
+        config_json={"output_path": output_path},
+    )
+    session.add_all([b1, b2, b3])
+    session.flush()
+    session.add_all(
+        [
+            models.Edge(pipeline_id=p.id, from_block_id=b1.id, to_block_id=b2.id),
+            models.Edge(pipeline_id=p.id, from_block_id=b2.id, to_block_id=b3.id),
+        ]
+    )
+    session.commit()
+    return p
+
+
+def _write_input(path):
+    with path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["id", "text"])
+        w.writerow([1, "good product"])
+        w.writerow([2, "bad, really bad"])
+        w.writerow([3, "meh"])
+
+
+def _drain(db, worker_id="w1"):
+    wr = WorkerRunner(db, worker_id=worker_id)
+    n = 0
+    while wr.process_next():
+        n += 1
+    return n
+
+
+def test_fused_run_matches_queued_output_in_one_claim(tmp_path):
+    src = tmp_path / "in.csv"
+    _write_input(src)
+    db = SessionLocal()
+    try:
+        queued = _make_pipeline(db, "queued", str(src), str(tmp_path / "q.csv"), "queued")
+        fused = _make_pipeline(db, "fused", str(src), str(tmp_path / "f.csv"), "fused")
+
+        q_run = Orchestrator(db).start_run(queued.id)
+        assert _drain(db) == 3
+
+        f_run = Orchestrator(db).start_run(fused.id)
+        items = db.scalars(
+            select(models.BlockQueue).where(models.BlockQueue.pipeline_run_id == f_run.id)
+        ).all()
+        assert len(items) == 1 and items[0].fused
+        assert _drain(db) == 1
+
+        db.refresh(q_run)
+        db.refresh(f_run)
+        assert q_run.status == f_run.status == models.RunStatus.SUCCEEDED
+        assert (tmp_path / "f.csv").read_bytes() == (tmp_path / "q.csv").read_bytes()
+
+        brs = db.scalars(
+            select(models.BlockRun).where(models.BlockRun.pipeline_run_id == f_run.id)
+        ).all()
+        assert len(brs) == 3
+        assert all(br.status == models.RunStatus.SUCCEEDED and br.attempts == 1 for br in brs)
+
+        # only the reader's input (in place) and the sink output are persisted
+        rows_art, out_art = db.scalars(
+            select(models.Artifact)
+            .where(models.Artifact.pipeline_run_id == f_run.id)
+            .order_by(models.Artifact.id)
+        ).all()
+        assert (rows_art.kind, rows_art.uri) == (models.ArtifactKind.CSV_ROWS, str(src))
+        assert (out_art.kind, out_art.meta_json["path"]) == (
+            models.ArtifactKind.SENTIMENT_CSV,
+            str(tmp_path / "f.csv"),
+        )
+        assert out_art.preview_json["rows"][0]["sentiment"] == "POSITIVE"
+        # lineage skips the in-memory LLM output to the persisted input
+        assert lineage.inputs_of(db, out_art.id) == [rows_art]
+    finally:
+        db.close()
+
+
+def test_fused_run_retries_whole_dag(tmp_path, monkeypatch):
+    src = tmp_path / "in.csv"
+    _write_input(src)
+    calls = {"n": 0}
+    real_predict = langchain_client.llm_predict
+
+    def flaky(prompt, system=None):
+        calls["n"] += 1
+        if calls["n"] == 2:
+            raise RuntimeError("rate limited")
+        return real_predict(prompt, system)
+
+    monkeypatch.setattr(langchain_client, "llm_predict", flaky)
+    monkeypatch.setattr(settings, "FUSED_MAX_BLOCKS", 5)
+
+    db = SessionLocal()
+    try:
+        p = _make_pipeline(
+            db,
+            "auto",
+            str(src),
+            str(tmp_path / "out.csv"),
+            sent_cfg={"retry": {"max_attempts": 2, "backoff_seconds": 0}},
+        )
+        run = Orchestrator(db).start_run(p.id)
+        assert _drain(db) == 2
+
+        db.refresh(run)
+        assert run.status == models.RunStatus.SUCCEEDED
+        sent = db.scalar(
+            select(models.BlockRun)
+            .join(models.Block, models.Block.id == models.BlockRun.block_id)
+            .where(
+                models.BlockRun.pipeline_run_id == run.id,
+                models.Block.name == "sent",
+            )
+        )
+        assert sent.attempts == 2 and sent.status == models.RunStatus.SUCCEEDED
+        with (tmp_path / "out.csv").open(newline="", encoding="utf-8") as f:
+            assert len(list(csv.DictReader(f))) == 3
+    finally:
+        db.close()
@@ -46,3 +46,44 @@ def test_import_cycle_rejected():
     r = client.post("/pipelines/import", json=spec)
     assert r.status_code == 400, r.text
     assert "cycle" in r.text.lower()
+
+
+def test_import_rejects_fused_incremental_pipelines():
+    client = TestClient(app)
+    spec = {
+        "name": "fused-incremental",
+        "execution": "fused",
+        "blocks": [
+            {"name": "csv", "type": "CSV_READER", "config": {"input_path": "in.csv", "incremental": True}},
+            {"name": "out", "type": "CSV_WRITER", "config": {"output_path": "out.csv", "write_mode": "append"}},
+        ],
+        "edges": [{"from": "csv", "to": "out"}],
+    }
+    r = client.post("/pipelines/import", json=spec)
+    assert r.status_code == 400
+    assert "fused execution" in r.json()["detail"]
+    spec["execution"] = "auto"
+    assert client.post("/pipelines/import", json=spec).status_code == 200
+
+
+def test_import_rejects_stream_edges_without_a_segment_consumer():
+    client = TestClient(app)
+    spec = {
+        "name": "bad-stream",
+        "blocks": [
+            {"name": "csv", "type": "CSV_READER", "config": {"input_path": "in.csv"}},
+            {"name": "sent", "type": "LLM_SENTIMENT"},
+            {"name": "out", "type": "FILE_WRITER", "config": {"output_path": "out.csv"}},
+        ],
+        "edges": [{"from": "csv", "to": "sent"}, {"from": "sent", "to": "out", "mode": "stream"}],
+    }
+    r = client.post("/pipelines/import", json=spec)
+    assert r.status_code == 400
+    assert "Stream edge 'sent' -> 'out'" in r.json()["detail"]
+
+    spec["edges"] = [{"from": "csv", "to": "sent", "mode": "stream"}]
+    assert client.post("/pipelines/import", json=spec).status_code == 400
+
+    spec["blocks"][2] = {"name": "out", "type": "CSV_WRITER", "config": {"output_path": "out.csv"}}
+    spec["edges"] = [{"from": "csv", "to": "sent"}, {"from": "sent", "to": "out", "mode": "stream"}]
+    assert client.post("/pipelines/import", json=spec).status_code == 200
@@ -0,0 +1,184 @@
+import csv
+from sqlalchemy import select
+from app.infra.db import Base, engine, SessionLocal
+from app import models
+from app.core.orchestrator import Orchestrator
+from app.workers.fused import should_fuse
+from app.workers.runner import WorkerRunner
+
+
+def setup_function():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+def _make_pipeline(db, reader_cfg, writer_cfg):
+    p = models.Pipeline(name="incremental")
+    db.add(p)
+    db.flush()
+    blocks = [
+        models.Block(pipeline_id=p.id, type=models.BlockType.CSV_READER, name="csv", config_json=reader_cfg),
+        models.Block(pipeline_id=p.id, type=models.BlockType.LLM_SENTIMENT, name="sent", config_json={}),
+        models.Block(pipeline_id=p.id, type=models.BlockType.CSV_WRITER, name="out", config_json=writer_cfg),
+    ]
+    db.add_all(blocks)
+    db.flush()
+    for a, b in zip(blocks, blocks[1:]):
+        db.add(models.Edge(pipeline_id=p.id, from_block_id=a.id, to_block_id=b.id))
+    db.commit()
+    return p, blocks[0]
+
+
+def _run(db, pipeline_id):
+    run = Orchestrator(db).start_run(pipeline_id)
+    w = WorkerRunner(db, worker_id="w1")
+    while w.process_next():
+        pass
+    return db.get(models.PipelineRun, run.id)
+
+
+def _read(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def test_offset_watermark_processes_only_appended_rows(tmp_path, monkeypatch):
+    from app.llm import langchain_client
+
+    calls = []
+
+    def predict(prompt, system=None):
+        calls.append(prompt)
+        return "POSITIVE"
+
+    monkeypatch.setattr(langchain_client, "llm_predict", predict)
+    src = tmp_path / "log.csv"
+    out = tmp_path / "out.csv"
+    src.write_text("id,text\n1,a\n2,b\n3,c\n", encoding="utf-8")
+    db = SessionLocal()
+    try:
+        p, reader = _make_pipeline(
+            db,
+            {"input_path": str(src), "incremental": True},
+            {"output_path": str(out), "write_mode": "append"},
+        )
+        assert _run(db, p.id).status == models.RunStatus.SUCCEEDED
+        assert len(calls) == 3
+
+        # a partially written last line waits for the next run
+        with src.open("a", encoding="utf-8") as f:
+            f.write("4,d\n5,e\n6,f")
+        assert _run(db, p.id).status == models.RunStatus.SUCCEEDED
+        assert len(calls) == 5
+        assert [r["id"] for r in _read(out)] == ["1", "2", "3", "4", "5"]
+
+        wm = db.scalars(select(models.InputWatermark)).one()
+        assert wm.block_id == reader.id and wm.rows == 5
+        assert wm.byte_offset == src.stat().st_size - len("6,f")
+
+        assert _run(db, p.id).status == models.RunStatus.SUCCEEDED
+        assert len(calls) == 5
+        assert len(_read(out)) == 5
+    finally:
+        db.close()
+
+
+def test_id_watermark_merges_into_previous_output(tmp_path):
+    src = tmp_path / "log.csv"
+    out = tmp_path / "out.csv"
+    src.write_text("id,text\n1,a\n2,b\n", encoding="utf-8")
+    db = SessionLocal()
+    try:
+        p, _ = _make_pipeline(
+            db,
+            {"input_path": str(src), "incremental": True, "watermark": "id"},
+            {"output_path": str(out), "write_mode": "merge", "merge_key": "id"},
+        )
+        assert _run(db, p.id).status == models.RunStatus.SUCCEEDED
+        src.write_text("id,text\n1,a\n2,b\n10,c\n3,d\n", encoding="utf-8")
+        assert _run(db, p.id).status == models.RunStatus.SUCCEEDED
+        assert [r["id"] for r in _read(out)] == ["1", "2", "10", "3"]
+        assert db.scalars(select(models.InputWatermark)).one().max_id == "10"
+    finally:
+        db.close()
+
+
+
+def test_merge_upserts_by_key_in_place(tmp_path):
+    from app.steps.csv_writer import _merge_csv
+
+    dst, src = tmp_path / "out.csv", tmp_path / "new.csv"
+    dst.write_text("id,text\n1,a\n,keyless\n2,b\n1,a2\n", encoding="utf-8")
+    src.write_text("id,text,lang\n3,c,en\n2,b2,es\n,keyless\n3,c2,fr\n", encoding="utf-8")
+    _merge_csv(src, dst, "id")
+    assert [(r["id"], r["text"], r["lang"]) for r in _read(dst)] == [
+        ("1", "a2", ""),
+        ("", "keyless", ""),
+        ("2", "b2", "es"),
+        ("3", "c2", "fr"),
+        ("", "keyless", ""),
+    ]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["new.csv", "out.csv"]
+
+
+def test_failed_run_does_not_append_its_rows(tmp_path):
+    src = tmp_path / "log.csv"
+    out = tmp_path / "out.csv"
+    src.write_text("id,text\n1,a\n2,b\n", encoding="utf-8")
+    db = SessionLocal()
+    try:
+        p, _ = _make_pipeline(
+            db,
+            {"input_path": str(src), "incremental": True},
+            {"output_path": str(out), "write_mode": "append"},
+        )
+        # a second writer that cannot write (its target is a directory) fails the run
+        broken = models.Block(
+            pipeline_id=p.id,
+            type=models.BlockType.CSV_WRITER,
+            name="broken",
+            config_json={"output_path": str(tmp_path), "retry": {"max_attempts": 1}},
+        )
+        db.add(broken)
+        db.flush()
+        sent = db.scalars(select(models.Block).where(models.Block.name == "sent")).one()
+        db.add(models.Edge(pipeline_id=p.id, from_block_id=sent.id, to_block_id=broken.id))
+        db.commit()
+        failed = _run(db, p.id)
+        assert failed.status == models.RunStatus.FAILED
+        # the good writer finished, but its rows wait for a successful run
+        writer = db.scalars(select(models.Block).where(models.Block.name == "out")).one()
+        done = db.scalars(
+            select(models.BlockRun).where(
+                models.BlockRun.pipeline_run_id == failed.id,
+                models.BlockRun.block_id == writer.id,
+            )
+        ).one()
+        assert done.status == models.RunStatus.SUCCEEDED
+        assert not out.exists()
+
+        broken.config_json = {"output_path": str(tmp_path / "other.csv")}
+        db.commit()
+        assert _run(db, p.id).status == models.RunStatus.SUCCEEDED
+        assert [r["id"] for r in _read(out)] == ["1", "2"]
+    finally:
+        db.close()
+
+
+def test_fused_pipelines_with_incremental_blocks_run_queued(tmp_path):
+    src = tmp_path / "log.csv"
+    src.write_text("id,text\n1,a\n", encoding="utf-8")
+    db = SessionLocal()
+    try:
+        p, _ = _make_pipeline(
+            db,
+            {"input_path": str(src), "incremental": True},
+            {"output_path": str(tmp_path / "out.csv"), "write_mode": "append"},
+        )
+        p.execution = "fused"
+        db.commit()
+        assert not should_fuse(db, p)
+        assert _run(db, p.id).status == models.RunStatus.SUCCEEDED
+        assert db.scalars(select(models.InputWatermark)).one().rows == 1
+    finally:
+        db.close()
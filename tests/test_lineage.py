@@ -0,0 +1,96 @@
+from sqlalchemy import select
+from app.core import lineage
+from app.infra.db import Base, engine, SessionLocal
+from app import models
+from app.core.orchestrator import Orchestrator
+from app.workers.runner import WorkerRunner
+
+
+def setup_function():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+def _make_pipeline(db, src, out):
+    p = models.Pipeline(name="lineage")
+    db.add(p)
+    db.flush()
+    blocks = [
+        models.Block(pipeline_id=p.id, type=models.BlockType.CSV_READER, name="csv", config_json={"input_path": str(src)}),
+        models.Block(pipeline_id=p.id, type=models.BlockType.LLM_SENTIMENT, name="sent", config_json={}),
+        models.Block(pipeline_id=p.id, type=models.BlockType.CSV_WRITER, name="out", config_json={"output_path": str(out), "retry": {"max_attempts": 1}}),
+    ]
+    db.add_all(blocks)
+    db.flush()
+    for a, b in zip(blocks, blocks[1:]):
+        db.add(models.Edge(pipeline_id=p.id, from_block_id=a.id, to_block_id=b.id))
+    db.commit()
+    return p, blocks
+
+
+def _artifact(db, run_id, kind):
+    return db.scalars(
+        select(models.Artifact).where(
+            models.Artifact.pipeline_run_id == run_id, models.Artifact.kind == kind
+        )
+    ).all()
+
+
+def test_lineage_links_outputs_to_their_inputs(tmp_path):
+    src = tmp_path / "in.csv"
+    src.write_text("id,text\n1,a\n2,b\n", encoding="utf-8")
+    db = SessionLocal()
+    try:
+        p, (reader, sent, writer) = _make_pipeline(db, src, tmp_path / "out.csv")
+        run = Orchestrator(db).start_run(p.id)
+        w = WorkerRunner(db, worker_id="w1")
+        while w.process_next():
+            pass
+        assert db.get(models.PipelineRun, run.id).status == models.RunStatus.SUCCEEDED
+
+        rows_art = _artifact(db, run.id, models.ArtifactKind.CSV_ROWS)[0]
+        sent_arts = _artifact(db, run.id, models.ArtifactKind.SENTIMENT_CSV)
+        produced = {a.block_id: a for a in sent_arts}
+        assert rows_art.block_id == reader.id
+        assert lineage.inputs_of(db, produced[sent.id].id) == [rows_art]
+        assert lineage.inputs_of(db, produced[writer.id].id) == [produced[sent.id]]
+        assert lineage.parent_outputs(db, run.id, writer.id) == [produced[sent.id]]
+    finally:
+        db.close()
+
+
+def test_writer_fails_fast_without_upstream_output(tmp_path, monkeypatch):
+    from app.llm import langchain_client
+
+    calls = []
+
+    def predict(prompt, system=None):
+        calls.append(prompt)
+        return "POSITIVE"
+
+    monkeypatch.setattr(langchain_client, "llm_predict", predict)
+    src = tmp_path / "in.csv"
+    src.write_text("id,text\n1,a\n2,b\n", encoding="utf-8")
+    db = SessionLocal()
+    try:
+        p, (_, sent, writer) = _make_pipeline(db, src, tmp_path / "out.csv")
+        run = Orchestrator(db).start_run(p.id)
+        w = WorkerRunner(db, worker_id="w1")
+        assert w.process_next()  # reader
+        assert w.process_next()  # sentiment
+        assert len(calls) == 2
+        for art in _artifact(db, run.id, models.ArtifactKind.SENTIMENT_CSV):
+            db.delete(art)
+        db.commit()
+
+        while w.process_next():
+            pass
+        assert len(calls) == 2  # nothing recomputed
+        br = db.scalars(
+            select(models.BlockRun).where(models.BlockRun.block_id == writer.id)
+        ).one()
+        assert br.status == models.RunStatus.FAILED
+        assert "produced no SENTIMENT_CSV" in br.error_msg
+        assert not (tmp_path / "out.csv").exists()
+    finally:
+        db.close()
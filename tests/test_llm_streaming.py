@@ -0,0 +1,59 @@
+import csv
+from app.steps._llm_common import enrich_csv
+from app.steps.batch import PREVIEW_ROWS
+
+
+def test_enrich_csv_streams_rows_and_keeps_small_preview(tmp_path):
+    src = tmp_path / "in.csv"
+    with src.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["id", "text", "lang"])
+        for i in range(50):
+            w.writerow([i, f"message {i}", "en"])
+    out = tmp_path / "out" / "labels.csv"
+
+    seen = []
+
+    def enrich(row):
+        seen.append(row["id"])
+        return {"label": "X", "n": len(seen)}
+
+    preview = enrich_csv(src, out, enrich, ("label", "n"))
+
+    assert len(seen) == 50
+    assert len(preview) == PREVIEW_ROWS
+    assert preview[0] == {"id": "0", "text": "message 0", "lang": "en", "label": "X", "n": 1}
+    with out.open(newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 50
+    assert list(rows[0].keys()) == ["id", "text", "lang", "label", "n"]
+    assert rows[-1]["n"] == "50"
+
+
+def test_enrich_csv_header_only_input(tmp_path):
+    src = tmp_path / "in.csv"
+    src.write_text("id,text\n", encoding="utf-8")
+    out = tmp_path / "out.csv"
+    preview = enrich_csv(src, out, lambda r: {"toxicity": "TOXIC"}, ("toxicity",))
+    assert preview == []
+    assert out.read_text(encoding="utf-8").splitlines() == ["id,text,toxicity"]
+
+
+def test_transform_csv_hands_fixed_size_column_batches(tmp_path):
+    from app.steps.batch import transform_csv
+
+    src = tmp_path / "in.csv"
+    src.write_text("id,text\n" + "".join(f"{i},m{i}\n" for i in range(10)), encoding="utf-8")
+    out = tmp_path / "out.csv"
+    sizes = []
+
+    def process(batch):
+        sizes.append(len(batch))
+        return {"upper": [t.upper() for t in batch.column("text")]}
+
+    transform_csv(src, [(out, ("upper",))], process, batch_rows=4)
+
+    assert sizes == [4, 4, 2]
+    with out.open(newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert [r["upper"] for r in rows] == [f"M{i}" for i in range(10)]
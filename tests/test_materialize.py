@@ -0,0 +1,116 @@
+from sqlalchemy import select
+from app.infra import cas
+from app.infra.artifacts import materialize
+from app.infra.db import Base, engine, SessionLocal
+from app import models
+from app.core.orchestrator import Orchestrator
+from app.workers.runner import WorkerRunner
+
+
+def setup_function():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+def test_materialize_links_only_immutable_sources(tmp_path):
+    src = tmp_path / "src.csv"
+    src.write_bytes(b"id,text\n" + b"1,abc\n" * 1000)
+    copied = materialize(src, tmp_path / "copy.csv")
+    assert copied in ("reflink", "copy_file_range", "sendfile", "copy")
+    assert (tmp_path / "copy.csv").read_bytes() == src.read_bytes()
+    assert (tmp_path / "copy.csv").stat().st_ino != src.stat().st_ino
+
+    assert materialize(src, tmp_path / "link.csv", immutable=True) == "hardlink"
+    assert (tmp_path / "link.csv").stat().st_ino == src.stat().st_ino
+    # linking again is a no-op and leaves no temporary file behind
+    assert materialize(src, tmp_path / "link.csv", immutable=True) == "hardlink"
+    assert src.stat().st_nlink == 2
+    assert not list(tmp_path.glob(".*.tmp"))
+    # re-materializing replaces the link instead of writing through it
+    materialize(tmp_path / "copy.csv", tmp_path / "link.csv")
+    assert src.stat().st_nlink == 1
+
+
+def test_writer_records_materialization_method(tmp_path):
+    src = tmp_path / "in.csv"
+    src.write_text("id,text\n1,a\n2,b\n", encoding="utf-8")
+    out = tmp_path / "out.csv"
+    db = SessionLocal()
+    try:
+        p = models.Pipeline(name="materialize")
+        db.add(p)
+        db.flush()
+        blocks = [
+            models.Block(pipeline_id=p.id, type=models.BlockType.CSV_READER, name="csv", config_json={"input_path": str(src)}),
+            models.Block(pipeline_id=p.id, type=models.BlockType.LLM_SENTIMENT, name="sent", config_json={}),
+            models.Block(pipeline_id=p.id, type=models.BlockType.CSV_WRITER, name="out", config_json={"output_path": str(out)}),
+        ]
+        db.add_all(blocks)
+        db.flush()
+        for a, b in zip(blocks, blocks[1:]):
+            db.add(models.Edge(pipeline_id=p.id, from_block_id=a.id, to_block_id=b.id))
+        db.commit()
+        run = Orchestrator(db).start_run(p.id)
+        w = WorkerRunner(db, worker_id="w1")
+        while w.process_next():
+            pass
+        assert db.get(models.PipelineRun, run.id).status == models.RunStatus.SUCCEEDED
+
+        written = db.scalars(
+            select(models.Artifact).where(models.Artifact.block_id == blocks[2].id)
+        ).one()
+        upstream = db.scalars(
+            select(models.Artifact).where(models.Artifact.block_id == blocks[1].id)
+        ).one()
+        # the target is outside ARTIFACTS_DIR and may be edited in place,
+        # so it never shares an inode with the stored blob
+        assert written.meta_json["materialized"] != "hardlink"
+        blob = cas.resolve_uri(upstream.uri)
+        assert out.stat().st_ino != blob.stat().st_ino
+        assert written.uri == upstream.uri
+        assert out.read_bytes() == blob.read_bytes()
+        out.write_text("edited\n", encoding="utf-8")
+        assert blob.read_bytes() != out.read_bytes()
+    finally:
+        db.close()
+
+
+def test_writer_target_inside_artifacts_dir_is_not_linked(tmp_path, monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "ARTIFACTS_DIR", str(tmp_path / "artifacts"))
+    src = tmp_path / "in.csv"
+    src.write_text("id,text\n1,a\n2,b\n", encoding="utf-8")
+    # like pipelines/sample_required_pipeline.json: a target next to the run directories
+    out = tmp_path / "artifacts" / "sample_sentiment.csv"
+    db = SessionLocal()
+    try:
+        p = models.Pipeline(name="materialize")
+        db.add(p)
+        db.flush()
+        blocks = [
+            models.Block(pipeline_id=p.id, type=models.BlockType.CSV_READER, name="csv", config_json={"input_path": str(src)}),
+            models.Block(pipeline_id=p.id, type=models.BlockType.LLM_SENTIMENT, name="sent", config_json={}),
+            models.Block(pipeline_id=p.id, type=models.BlockType.CSV_WRITER, name="out", config_json={"output_path": str(out)}),
+        ]
+        db.add_all(blocks)
+        db.flush()
+        for a, b in zip(blocks, blocks[1:]):
+            db.add(models.Edge(pipeline_id=p.id, from_block_id=a.id, to_block_id=b.id))
+        db.commit()
+        run = Orchestrator(db).start_run(p.id)
+        w = WorkerRunner(db, worker_id="w1")
+        while w.process_next():
+            pass
+        assert db.get(models.PipelineRun, run.id).status == models.RunStatus.SUCCEEDED
+
+        written = db.scalars(
+            select(models.Artifact).where(models.Artifact.block_id == blocks[2].id)
+        ).one()
+        assert written.meta_json["materialized"] != "hardlink"
+        assert out.stat().st_nlink == 1
+        with out.open("a", encoding="utf-8") as f:
+            f.write("3,c\n")
+        assert cas.verify(cas.digest_of(written.uri))
+    finally:
+        db.close()
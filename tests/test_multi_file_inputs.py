@@ -0,0 +1,76 @@
+import bz2
+import csv
+import gzip
+import lzma
+import pytest
+from sqlalchemy import select
+from app.infra import cas, inputs
+from app.infra.db import Base, engine, SessionLocal
+from app import models
+from app.core.orchestrator import Orchestrator
+from app.workers.runner import WorkerRunner
+
+
+def setup_function():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+def _partition(opener, path, ids):
+    with opener(path, "wt", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["id", "text"])
+        for i in ids:
+            w.writerow([i, f"row {i}\nnext line"])
+
+
+def test_glob_of_compressed_partitions_becomes_one_csv_rows(tmp_path):
+    parts = tmp_path / "daily"
+    parts.mkdir()
+    _partition(gzip.open, parts / "2024-01-01.csv.gz", range(0, 3))
+    _partition(bz2.open, parts / "2024-01-02.csv.bz2", range(3, 5))
+    _partition(lzma.open, parts / "2024-01-03.csv.xz", range(5, 9))
+    db = SessionLocal()
+    try:
+        p = models.Pipeline(name="partitions")
+        db.add(p)
+        db.flush()
+        db.add(
+            models.Block(
+                pipeline_id=p.id,
+                type=models.BlockType.CSV_READER,
+                name="csv",
+                config_json={"input_path": str(parts / "*.csv.*"), "workers": 2},
+            )
+        )
+        db.commit()
+        run = Orchestrator(db).start_run(p.id)
+        assert WorkerRunner(db, worker_id="w1").process_next()
+        assert db.get(models.PipelineRun, run.id).status == models.RunStatus.SUCCEEDED
+
+        art = db.scalars(
+            select(models.Artifact).where(models.Artifact.kind == models.ArtifactKind.CSV_ROWS)
+        ).one()
+        with open(cas.resolve_uri(art.uri), newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        assert [r["id"] for r in rows] == [str(i) for i in range(9)]
+        assert rows[8]["text"] == "row 8\nnext line"
+
+        manifest = art.meta_json["manifest"]
+        assert [(f["codec"], f["rows"], f["row_start"]) for f in manifest["files"]] == [
+            ("gz", 3, 0),
+            ("bz2", 2, 3),
+            ("xz", 4, 5),
+        ]
+        assert art.meta_json["rows"] == manifest["rows"] == 9
+    finally:
+        db.close()
+
+
+def test_partitions_must_share_a_header(tmp_path):
+    (tmp_path / "a.csv").write_text("id,text\n1,a\n", encoding="utf-8")
+    (tmp_path / "b.csv").write_text("id,body\n2,b\n", encoding="utf-8")
+    paths = inputs.resolve(str(tmp_path))
+    assert not inputs.is_plain(paths)
+    with pytest.raises(ValueError):
+        inputs.combine(paths, tmp_path / "out" / "rows.csv", workers=1)
@@ -0,0 +1,161 @@
+import os
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, select
+from app.core.config import settings
+from app.core.storage import collect_garbage
+from app.infra import cas, objectstore
+from app.infra.db import Base, engine, SessionLocal
+from app.infra.objectstore import S3Backend
+from app.infra.s3local import FilesystemS3
+from app import models
+from app.core.orchestrator import Orchestrator
+from app.main import app
+from app.workers.runner import WorkerRunner
+
+
+def setup_function():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+def test_multipart_upload_and_ranged_download(tmp_path):
+    client = FilesystemS3(tmp_path / "s3")
+    store = S3Backend(client, "bucket", prefix="p/", part_size=1000, threads=4)
+    src = tmp_path / "big.bin"
+    data = os.urandom(10_500)
+    src.write_bytes(data)
+
+    store.put("big", src)
+    assert client.calls["upload_part"] == 11
+    assert client.calls["complete_multipart_upload"] == 1
+    assert (tmp_path / "s3" / "bucket" / "p" / "big").read_bytes() == data
+
+    dst = tmp_path / "out" / "big.bin"
+    assert store.get("big", dst)
+    assert dst.read_bytes() == data
+    assert client.calls["get_object"] == 11  # one ranged GET per part
+    assert not store.get("nope", tmp_path / "nope")
+
+    small = tmp_path / "small.txt"
+    small.write_bytes(b"tiny")
+    store.put("small", small)
+    assert client.calls["put_object"] == 1
+
+
+def test_nodes_exchange_artifacts_through_the_bucket(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "STORAGE_BACKEND", "s3")
+    monkeypatch.setattr(settings, "S3_ENDPOINT_URL", f"file://{tmp_path / 's3'}")
+    monkeypatch.setattr(settings, "S3_PART_SIZE", 64)
+    monkeypatch.setattr(settings, "ARTIFACT_CODEC", "none")
+    monkeypatch.setattr(settings, "ARTIFACTS_DIR", str(tmp_path / "node-a"))
+    monkeypatch.setattr(settings, "LOCALITY_WINDOW_SECONDS", 0)
+    src = tmp_path / "in.csv"
+    src.write_text("id,text\n" + "".join(f"{i},good {i}\n" for i in range(50)), encoding="utf-8")
+    out = tmp_path / "out.csv"
+
+    db = SessionLocal()
+    try:
+        p = models.Pipeline(name="s3")
+        db.add(p)
+        db.flush()
+        blocks = [
+            models.Block(pipeline_id=p.id, type=models.BlockType.CSV_READER, name="csv", config_json={"input_path": str(src)}),
+            models.Block(pipeline_id=p.id, type=models.BlockType.LLM_SENTIMENT, name="sent", config_json={}),
+            models.Block(pipeline_id=p.id, type=models.BlockType.CSV_WRITER, name="out", config_json={"output_path": str(out)}),
+        ]
+        db.add_all(blocks)
+        db.flush()
+        for a, b in zip(blocks, blocks[1:]):
+            db.add(models.Edge(pipeline_id=p.id, from_block_id=a.id, to_block_id=b.id))
+        db.commit()
+        run = Orchestrator(db).start_run(p.id)
+
+        # the reader runs on node A; its input goes to the bucket too
+        assert WorkerRunner(db, worker_id="a").process_next()
+        rows = db.scalars(select(models.Artifact)).one()
+        assert rows.uri.startswith(cas.SCHEME)
+
+        # node B has an empty disk and reads everything from the bucket
+        monkeypatch.setattr(settings, "ARTIFACTS_DIR", str(tmp_path / "node-b"))
+        w = WorkerRunner(db, worker_id="b")
+        while w.process_next():
+            pass
+        assert db.get(models.PipelineRun, run.id).status == models.RunStatus.SUCCEEDED
+        assert cas.stored(cas.digest_of(rows.uri))[0].is_relative_to(tmp_path / "node-b")
+
+        # and node C serves node B's output without having run anything
+        monkeypatch.setattr(settings, "ARTIFACTS_DIR", str(tmp_path / "node-c"))
+        sent = db.scalars(
+            select(models.Artifact).where(models.Artifact.block_id == blocks[1].id)
+        ).one()
+        res = TestClient(app).get(f"/artifacts/{sent.id}/download")
+        assert res.status_code == 200 and res.content == out.read_bytes()
+
+        digest = cas.digest_of(sent.uri)
+        remote = tmp_path / "s3" / settings.S3_BUCKET / cas.remote_key(digest)
+        assert remote.read_bytes() == out.read_bytes()
+        db.execute(delete(models.Artifact))
+        db.commit()
+        collect_garbage(db, grace_seconds=0)
+        assert not remote.exists()
+    finally:
+        db.close()
+
+
+def test_fetched_blobs_are_an_lru_bounded_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "STORAGE_BACKEND", "s3")
+    monkeypatch.setattr(settings, "S3_ENDPOINT_URL", f"file://{tmp_path / 's3'}")
+    monkeypatch.setattr(settings, "ARTIFACT_CODEC", "none")
+    monkeypatch.setattr(settings, "ARTIFACTS_DIR", str(tmp_path / "node-a"))
+    digests = [cas.put_stream([bytes([i]) * 1000])[0] for i in range(3)]
+
+    monkeypatch.setattr(settings, "ARTIFACTS_DIR", str(tmp_path / "node-b"))
+    monkeypatch.setattr(settings, "LOCAL_CACHE_MAX_BYTES", 2000)
+    calls = objectstore.backend().client.calls
+    for d in digests[:2]:
+        cas.resolve_uri(cas.uri_for(d))
+    # the second blob was read longest ago; reading the first again is a hit
+    gets = calls["get_object"]
+    os.utime(cas.blob_path(digests[1]), (1, 1))
+    assert cas.resolve_uri(cas.uri_for(digests[0])).read_bytes() == bytes([0]) * 1000
+    assert calls["get_object"] == gets
+
+    cas.resolve_uri(cas.uri_for(digests[2]))
+    assert cas.stored(digests[0]) and cas.stored(digests[2])
+    assert cas.stored(digests[1]) is None
+
+
+def test_child_is_reserved_for_the_parents_worker(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "STORAGE_BACKEND", "s3")
+    monkeypatch.setattr(settings, "S3_ENDPOINT_URL", f"file://{tmp_path / 's3'}")
+    monkeypatch.setattr(settings, "ARTIFACTS_DIR", str(tmp_path / "artifacts"))
+    monkeypatch.setattr(settings, "LOCALITY_WINDOW_SECONDS", 60)
+    src = tmp_path / "in.csv"
+    src.write_text("id,text\n1,good\n", encoding="utf-8")
+    db = SessionLocal()
+    try:
+        p = models.Pipeline(name="locality")
+        db.add(p)
+        db.flush()
+        reader = models.Block(pipeline_id=p.id, type=models.BlockType.CSV_READER, name="csv", config_json={"input_path": str(src)})
+        sent = models.Block(pipeline_id=p.id, type=models.BlockType.LLM_SENTIMENT, name="sent", config_json={})
+        db.add_all([reader, sent])
+        db.flush()
+        db.add(models.Edge(pipeline_id=p.id, from_block_id=reader.id, to_block_id=sent.id))
+        db.commit()
+        Orchestrator(db).start_run(p.id)
+        a, b = WorkerRunner(db, worker_id="a"), WorkerRunner(db, worker_id="b")
+
+        assert a.process_next()
+        item = db.scalars(select(models.BlockQueue).where(models.BlockQueue.block_id == sent.id)).one()
+        assert item.preferred_worker == "a"
+        assert b._claim_next() is None
+
+        # once the window closes any worker may take it
+        item.prefer_until = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+        claimed = b._claim_next()
+        assert claimed and claimed.block_id == sent.id
+    finally:
+        db.close()
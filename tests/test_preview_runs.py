@@ -0,0 +1,98 @@
+import csv
+from pathlib import Path
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from app.infra import sampling
+from app.infra.db import Base, engine, SessionLocal
+from app import models
+from app.main import app
+from app.workers.runner import WorkerRunner
+
+
+def setup_function():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+def _write_input(path, n):
+    with path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["id", "lang", "text"])
+        for i in range(n):
+            w.writerow([i, "en" if i % 4 else "es", f"message {i}"])
+
+
+def _read(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def test_sample_is_deterministic_and_stratified(tmp_path, monkeypatch):
+    src = tmp_path / "in.csv"
+    _write_input(src, 40)
+    a = sampling.sample_csv(src, tmp_path / "a.csv", rows=8, seed=3)
+    sampling.sample_csv(src, tmp_path / "b.csv", rows=8, seed=3)
+    assert a == {"rows": 8, "of": 40}
+    assert (tmp_path / "a.csv").read_bytes() == (tmp_path / "b.csv").read_bytes()
+    ids = [int(r["id"]) for r in _read(tmp_path / "a.csv")]
+    assert ids == sorted(ids)
+
+    sampling.sample_csv(src, tmp_path / "s.csv", fraction=0.25, method="stratified", by="lang")
+    langs = [r["lang"] for r in _read(tmp_path / "s.csv")]
+    assert langs.count("es") == 2 and langs.count("en") == 8
+
+    # a run of consecutive rows longer than a chunk is copied piecewise
+    monkeypatch.setattr(sampling.cas, "CHUNK", 5)
+    sampling.sample_csv(src, tmp_path / "all.csv", rows=40)
+    assert (tmp_path / "all.csv").read_bytes() == src.read_bytes()
+
+
+def test_preview_run_samples_input_and_keeps_real_output(tmp_path):
+    src = tmp_path / "in.csv"
+    out = tmp_path / "out.csv"
+    _write_input(src, 50)
+    db = SessionLocal()
+    try:
+        p = models.Pipeline(name="preview")
+        db.add(p)
+        db.flush()
+        blocks = [
+            models.Block(pipeline_id=p.id, type=models.BlockType.CSV_READER, name="csv", config_json={"input_path": str(src)}),
+            models.Block(pipeline_id=p.id, type=models.BlockType.LLM_SENTIMENT, name="sent", config_json={}),
+            models.Block(pipeline_id=p.id, type=models.BlockType.CSV_WRITER, name="out", config_json={"output_path": str(out)}),
+        ]
+        db.add_all(blocks)
+        db.flush()
+        for a, b in zip(blocks, blocks[1:]):
+            db.add(models.Edge(pipeline_id=p.id, from_block_id=a.id, to_block_id=b.id))
+        db.commit()
+
+        client = TestClient(app)
+        assert client.post(f"/pipelines/{p.id}/run?sample=1.5").status_code == 400
+        res = client.post(f"/pipelines/{p.id}/run?sample=5&seed=7")
+        assert res.status_code == 200
+        run_id = res.json()["run"]["id"]
+        assert res.json()["run"]["sample"]["rows"] == 5
+
+        w = WorkerRunner(db, worker_id="w1")
+        while w.process_next():
+            pass
+        assert db.get(models.PipelineRun, run_id).status == models.RunStatus.SUCCEEDED
+
+        arts = db.scalars(
+            select(models.Artifact).where(models.Artifact.pipeline_run_id == run_id)
+        ).all()
+        assert arts and all(a.preview for a in arts)
+        rows_art = next(a for a in arts if a.kind == models.ArtifactKind.CSV_ROWS)
+        assert rows_art.meta_json["sample"]["of"] == 50
+        written = next(
+            a for a in arts if a.block_run_id and Path(a.meta_json["path"]).name == "out.csv"
+        )
+        assert "preview" in Path(written.meta_json["path"]).parts
+        assert len(_read(written.meta_json["path"])) == 5
+        assert not out.exists()
+
+        listed = client.get(f"/runs/{run_id}/artifacts").json()
+        assert all(a["preview"] for a in listed)
+    finally:
+        db.close()
@@ -1,5 +1,6 @@
 from datetime import datetime
 from sqlalchemy import select
+from app.infra import cas
 from app.infra.db import Base, engine, SessionLocal
 from app import models
 from app.core.orchestrator import Orchestrator
@@ -61,3 +62,131 @@ def test_success_marks_run_succeeded(tmp_path):
         assert run_ref.status == models.RunStatus.SUCCEEDED
     finally:
         db.close()
+
+
+def test_llm_retry_resumes_from_checkpoint(tmp_path, monkeypatch):
+    from app.llm import langchain_client
+
+    csvp = tmp_path / "in.csv"
+    csvp.write_text(
+        "id,text\n" + "".join(f"{i},message {i}\n" for i in range(1, 11)),
+        encoding="utf-8",
+    )
+    calls = []
+
+    def flaky(prompt: str, system: str | None = None) -> str:
+        calls.append(prompt)
+        if len(calls) == 7:
+            raise RuntimeError("provider 503")
+        return "POSITIVE"
+
+    monkeypatch.setattr(langchain_client, "llm_predict", flaky)
+
+    db = SessionLocal()
+    try:
+        p = _make_pipeline_csv(db, input_path=str(csvp))
+        b2 = models.Block(
+            pipeline_id=p.id,
+            type=models.BlockType.LLM_SENTIMENT,
+            name="sent",
+            config_json={
+                "checkpoint_every": 4,
+                "retry": {"max_attempts": 2, "backoff_seconds": 0},
+            },
+        )
+        db.add(b2)
+        db.flush()
+        csv_block = db.scalars(
+            select(models.Block).where(
+                models.Block.pipeline_id == p.id, models.Block.name == "csv"
+            )
+        ).one()
+        db.add(
+            models.Edge(pipeline_id=p.id, from_block_id=csv_block.id, to_block_id=b2.id)
+        )
+        db.commit()
+
+        run = Orchestrator(db).start_run(p.id)
+        w = WorkerRunner(db, worker_id="t")
+        while w.process_next():
+            pass
+
+        assert db.get(models.PipelineRun, run.id).status == models.RunStatus.SUCCEEDED
+        # 6 rows done + 1 failed call, then only the 4 remaining rows
+        assert len(calls) == 11
+        br = db.scalars(
+            select(models.BlockRun).where(
+                models.BlockRun.pipeline_run_id == run.id,
+                models.BlockRun.block_id == b2.id,
+            )
+        ).one()
+        assert br.attempts == 2
+        art = db.scalars(
+            select(models.Artifact).where(
+                models.Artifact.block_run_id == br.id,
+                models.Artifact.kind == models.ArtifactKind.SENTIMENT_CSV,
+            )
+        ).one()
+        lines = open(cas.resolve_uri(art.uri), encoding="utf-8").read().splitlines()
+        assert lines[0] == "id,text,sentiment,score"
+        assert [l.split(",")[0] for l in lines[1:]] == [str(i) for i in range(1, 11)]
+        assert len(art.preview_json["rows"]) == 5
+    finally:
+        db.close()
+
+
+def test_resumed_attempt_never_truncates_a_stored_blob(tmp_path, monkeypatch):
+    from app.llm import langchain_client
+    from app.steps import runtime
+
+    csvp = tmp_path / "in.csv"
+    csvp.write_text(
+        "id,text\n" + "".join(f"{i},message {i}\n" for i in range(1, 11)),
+        encoding="utf-8",
+    )
+    stored = {}
+
+    def predict(prompt: str, system: str | None = None) -> str:
+        if "blob" in stored:
+            # the retry is running: the first attempt's blob is intact
+            assert stored["blob"].stat().st_size == stored["size"]
+        return "POSITIVE"
+
+    real_record = runtime.lineage.record
+
+    def record(db, art, inputs):
+        if art.kind != models.ArtifactKind.CSV_ROWS and "blob" not in stored:
+            # outputs are stored (linked into the blob store); fail before commit
+            stored["digest"] = cas.digest_of(art.uri)
+            stored["blob"] = cas.stored(stored["digest"])[0]
+            stored["size"] = stored["blob"].stat().st_size
+            raise RuntimeError("database went away")
+        return real_record(db, art, inputs)
+
+    monkeypatch.setattr(langchain_client, "llm_predict", predict)
+    monkeypatch.setattr(runtime.lineage, "record", record)
+    db = SessionLocal()
+    try:
+        p = _make_pipeline_csv(db, input_path=str(csvp))
+        csv_block = db.scalars(select(models.Block).where(models.Block.pipeline_id == p.id)).one()
+        b2 = models.Block(
+            pipeline_id=p.id,
+            type=models.BlockType.LLM_SENTIMENT,
+            name="sent",
+            config_json={"checkpoint_every": 4, "retry": {"max_attempts": 2, "backoff_seconds": 0}},
+        )
+        db.add(b2)
+        db.flush()
+        db.add(models.Edge(pipeline_id=p.id, from_block_id=csv_block.id, to_block_id=b2.id))
+        db.commit()
+
+        run = Orchestrator(db).start_run(p.id)
+        w = WorkerRunner(db, worker_id="t")
+        while w.process_next():
+            pass
+
+        assert db.get(models.PipelineRun, run.id).status == models.RunStatus.SUCCEEDED
+        assert "blob" in stored and stored["blob"].stat().st_size == stored["size"]
+        assert cas.verify(stored["digest"])
+    finally:
+        db.close()
@@ -0,0 +1,119 @@
+import csv
+import hashlib
+from sqlalchemy import select
+from app.infra import cas, profiling, rowindex
+from app.infra.db import Base, engine, SessionLocal
+from app import models
+from app.core.orchestrator import Orchestrator
+from app.workers.runner import WorkerRunner
+
+
+def setup_function():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+def test_index_handles_quoted_newlines_and_blank_lines(tmp_path):
+    src = tmp_path / "in.csv"
+    src.write_bytes(b'id,text\r\n1,"two\nlines ""q"""\r\n\r\n2,b\r\n3,c')
+    index = rowindex.build(src)
+    assert index.rows == 3
+    assert rowindex.read_rows(src, index, 0, 1) == [{"id": "1", "text": 'two\nlines "q"'}]
+    assert rowindex.read_rows(src, index, 1, 10) == [
+        {"id": "2", "text": "b"},
+        {"id": "3", "text": "c"},
+    ]
+
+    sidecar = tmp_path / "in.rowidx"
+    index.save(sidecar)
+    assert list(rowindex.load_valid(sidecar, src).offsets) == list(index.offsets)
+    src.write_bytes(b"id,text\r\n9,z\r\n")
+    assert rowindex.load_valid(sidecar, src) is None
+
+
+def test_index_from_an_offset_covers_only_the_tail(tmp_path):
+    src = tmp_path / "in.csv"
+    src.write_bytes(b'id,text\r\n1,a\r\n2,"b\nb"\r\n3,c\r\n4,d\r\n')
+    full = rowindex.build(src)
+    tail = rowindex.build(src, start=full.offsets[2])
+    assert tail.header_end == full.header_end
+    assert list(tail.offsets) == list(full.offsets[2:])
+    assert rowindex.read_rows(src, tail, 0, 5) == [
+        {"id": "3", "text": "c"},
+        {"id": "4", "text": "d"},
+    ]
+    assert rowindex.build(src, start=src.stat().st_size).rows == 0
+
+
+def test_profile_is_computed_in_the_index_scan(tmp_path):
+    src = tmp_path / "in.csv"
+    data = b'id,score,flag,text,empty\n1,0.5,true,"short",\n2,3,False,"' + b"x" * 100 + b'",\n\n3,,true,"a\nb",\n'
+    src.write_bytes(data)
+    profiler = profiling.Profiler()
+    assert rowindex.build(src, profiler).rows == 3
+    prof = profiler.result()
+    assert prof["rows"] == 3
+    assert prof["bytes"] == len(data)
+    assert prof["sha256"] == hashlib.sha256(data).hexdigest()
+    cols = {c["name"]: c for c in prof["schema"]}
+    assert cols["id"] == {"name": "id", "type": "int", "nulls": 0}
+    assert cols["score"]["type"] == "float" and cols["score"]["nulls"] == 1
+    assert cols["flag"]["type"] == "bool"
+    assert cols["empty"]["type"] == "empty" and cols["empty"]["nulls"] == 3
+    assert cols["text"]["type"] == "string"
+    assert cols["text"]["lengths"]["0-15"] == 2
+    assert cols["text"]["lengths"]["64-255"] == 1
+
+
+def test_csv_reader_records_index_and_shards_seek_with_it(tmp_path):
+    src = tmp_path / "in.csv"
+    with src.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["id", "text"])
+        for i in range(9):
+            w.writerow([i, f"line {i}\nstill {i}" if i % 3 == 0 else "good"])
+    db = SessionLocal()
+    try:
+        p = models.Pipeline(name="indexed")
+        db.add(p)
+        db.flush()
+        b1 = models.Block(
+            pipeline_id=p.id,
+            type=models.BlockType.CSV_READER,
+            name="csv",
+            config_json={"input_path": str(src)},
+        )
+        b2 = models.Block(
+            pipeline_id=p.id,
+            type=models.BlockType.LLM_SENTIMENT,
+            name="sent",
+            config_json={"shards": 2},
+        )
+        db.add_all([b1, b2])
+        db.flush()
+        db.add(models.Edge(pipeline_id=p.id, from_block_id=b1.id, to_block_id=b2.id))
+        db.commit()
+
+        run = Orchestrator(db).start_run(p.id)
+        worker = WorkerRunner(db, worker_id="w1")
+        for _ in range(5):
+            worker.process_next()
+        assert db.get(models.PipelineRun, run.id).status == models.RunStatus.SUCCEEDED
+
+        rows_art = db.scalars(
+            select(models.Artifact).where(models.Artifact.kind == models.ArtifactKind.CSV_ROWS)
+        ).one()
+        assert rows_art.meta_json["rows"] == 9
+        assert rows_art.meta_json["bytes"] == src.stat().st_size
+        assert [c["type"] for c in rows_art.meta_json["schema"]] == ["int", "string"]
+        assert rowindex.load_valid(rows_art.meta_json["row_index"], src).rows == 9
+
+        out = db.scalars(
+            select(models.Artifact).where(models.Artifact.kind == models.ArtifactKind.SENTIMENT_CSV)
+        ).one()
+        with open(cas.resolve_uri(out.uri), newline="", encoding="utf-8") as f:
+            got = list(csv.DictReader(f))
+        assert [r["id"] for r in got] == [str(i) for i in range(9)]
+        assert got[3]["text"] == "line 3\nstill 3"
+    finally:
+        db.close()
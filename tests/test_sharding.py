@@ -0,0 +1,155 @@
+import csv
+from sqlalchemy import select
+from app.core import lineage
+from app.infra import cas
+from app.infra.db import Base, engine, SessionLocal
+from app import models
+from app.core.orchestrator import Orchestrator
+from app.workers.runner import WorkerRunner
+
+
+def setup_function():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+def _make_pipeline(session, input_path: str, sent_cfg: dict):
+    p = models.Pipeline(name="sharded-demo")
+    session.add(p)
+    session.flush()
+    b1 = models.Block(
+        pipeline_id=p.id,
+        type=models.BlockType.CSV_READER,
+        name="csv",
+        config_json={"input_path": input_path},
+    )
+    b2 = models.Block(
+        pipeline_id=p.id,
+        type=models.BlockType.LLM_SENTIMENT,
+        name="sent",
+        config_json=sent_cfg,
+    )
+    session.add_all([b1, b2])
+    session.flush()
+    session.add(models.Edge(pipeline_id=p.id, from_block_id=b1.id, to_block_id=b2.id))
+    session.commit()
+    return p, b2
+
+
+def _write_input(path, n):
+    with path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["id", "text"])
+        for i in range(n):
+            w.writerow([i, "good" if i % 2 else "bad, really bad"])
+
+
+def test_sharded_block_runs_on_many_workers_and_merges_in_order(tmp_path):
+    src = tmp_path / "in.csv"
+    _write_input(src, 10)
+    db = SessionLocal()
+    try:
+        p, sent = _make_pipeline(db, str(src), {"shards": 3})
+        run = Orchestrator(db).start_run(p.id)
+        workers = [WorkerRunner(db, worker_id=f"w{i}") for i in range(3)]
+
+        assert workers[0].process_next()  # csv reader
+        assert workers[0].process_next()  # plans shards
+        shard_items = db.scalars(
+            select(models.BlockQueue).where(models.BlockQueue.block_id == sent.id)
+        ).all()
+        assert sorted(q.shard_index for q in shard_items) == [0, 1, 2]
+
+        # shards are picked up by different workers
+        for w in reversed(workers):
+            assert w.process_next()
+        assert not workers[0].process_next()
+
+        shards = db.scalars(select(models.BlockShard)).all()
+        assert {s.worker_id for s in shards} == {"w0", "w1", "w2"}
+        assert [(s.row_start, s.row_end) for s in sorted(shards, key=lambda s: s.shard_index)] == [
+            (0, 3),
+            (3, 6),
+            (6, 10),
+        ]
+        assert db.get(models.PipelineRun, run.id).status == models.RunStatus.SUCCEEDED
+
+        arts = db.scalars(
+            select(models.Artifact).where(
+                models.Artifact.kind == models.ArtifactKind.SENTIMENT_CSV
+            )
+        ).all()
+        assert len(arts) == 1
+        with open(cas.resolve_uri(arts[0].uri), newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        assert [r["id"] for r in rows] == [str(i) for i in range(10)]
+        assert rows[0]["sentiment"] == "NEGATIVE" and rows[1]["sentiment"] == "POSITIVE"
+    finally:
+        db.close()
+
+
+def test_shard_failure_exhausts_retries_and_fails_run(tmp_path, monkeypatch):
+    from app.llm import langchain_client
+
+    def boom(prompt: str, system: str | None = None) -> str:
+        raise RuntimeError("LLM down")
+
+    monkeypatch.setattr(langchain_client, "llm_predict", boom)
+    src = tmp_path / "in.csv"
+    _write_input(src, 4)
+    db = SessionLocal()
+    try:
+        p, _ = _make_pipeline(
+            db, str(src), {"shard_rows": 2, "retry": {"max_attempts": 2}}
+        )
+        run = Orchestrator(db).start_run(p.id)
+        w = WorkerRunner(db, worker_id="w")
+        while w.process_next():
+            pass
+        assert db.get(models.PipelineRun, run.id).status == models.RunStatus.FAILED
+        br = db.scalars(
+            select(models.BlockRun).where(models.BlockRun.shard_count.is_not(None))
+        ).one()
+        assert br.status == models.RunStatus.FAILED and br.shard_count == 2
+    finally:
+        db.close()
+
+
+
+def test_sharded_block_reads_its_parents_input(tmp_path):
+    first, second = tmp_path / "first.csv", tmp_path / "second.csv"
+    _write_input(first, 10)
+    second.write_text("id,text\n100,good\n101,bad\n102,good\n", encoding="utf-8")
+    db = SessionLocal()
+    try:
+        p = models.Pipeline(name="sharded-two-readers")
+        db.add(p)
+        db.flush()
+        # the run's first CSV_ROWS comes from a reader the sharded block does not read
+        other, reader, sent = (
+            models.Block(pipeline_id=p.id, type=models.BlockType.CSV_READER, name="other", config_json={"input_path": str(first)}),
+            models.Block(pipeline_id=p.id, type=models.BlockType.CSV_READER, name="csv", config_json={"input_path": str(second)}),
+            models.Block(pipeline_id=p.id, type=models.BlockType.LLM_SENTIMENT, name="sent", config_json={"shards": 2}),
+        )
+        db.add_all([other, reader, sent])
+        db.flush()
+        db.add(models.Edge(pipeline_id=p.id, from_block_id=reader.id, to_block_id=sent.id))
+        db.commit()
+
+        run = Orchestrator(db).start_run(p.id)
+        w = WorkerRunner(db, worker_id="w1")
+        while w.process_next():
+            pass
+        assert db.get(models.PipelineRun, run.id).status == models.RunStatus.SUCCEEDED
+
+        art = db.scalars(
+            select(models.Artifact).where(models.Artifact.block_id == sent.id)
+        ).one()
+        with open(cas.resolve_uri(art.uri), newline="", encoding="utf-8") as f:
+            assert [r["id"] for r in csv.DictReader(f)] == ["100", "101", "102"]
+        source = db.scalars(
+            select(models.Artifact).where(models.Artifact.block_id == reader.id)
+        ).one()
+        assert [a.id for a in lineage.inputs_of(db, art.id)] == [source.id]
+    finally:
+        db.close()
@@ -0,0 +1,157 @@
+import csv
+from pathlib import Path
+from sqlalchemy import select
+from app.infra.db import Base, engine, SessionLocal
+from app import models
+from app.core.orchestrator import Orchestrator
+from app.core.serialization import export_pipeline_spec
+from app.llm import langchain_client
+from app.workers.runner import WorkerRunner
+
+
+def setup_function():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+def _make_pipeline(session, input_path: str, output_path: str):
+    p = models.Pipeline(name="stream-demo")
+    session.add(p)
+    session.flush()
+    b1 = models.Block(
+        pipeline_id=p.id,
+        type=models.BlockType.CSV_READER,
+        name="csv",
+        config_json={"input_path": input_path},
+    )
+    b2 = models.Block(
+        pipeline_id=p.id,
+        type=models.BlockType.LLM_SENTIMENT,
+        name="sent",
+        config_json={"segment_rows": 3},
+    )
+    b3 = models.Block(
+        pipeline_id=p.id,
+        type=models.BlockType.CSV_WRITER,
+        name="out",
+        config_json={"output_path": output_path},
+    )
+    session.add_all([b1, b2, b3])
+    session.flush()
+    session.add_all(
+        [
+            models.Edge(pipeline_id=p.id, from_block_id=b1.id, to_block_id=b2.id),
+            models.Edge(
+                pipeline_id=p.id, from_block_id=b2.id, to_block_id=b3.id, mode="stream"
+            ),
+        ]
+    )
+    session.commit()
+    return p, b3
+
+
+def test_stream_child_enqueued_after_first_segment(tmp_path, monkeypatch):
+    src = tmp_path / "in.csv"
+    with src.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["id", "text"])
+        for i in range(8):
+            w.writerow([i, "good" if i % 2 else "bad"])
+    out = tmp_path / "out.csv"
+
+    db = SessionLocal()
+    try:
+        p, writer = _make_pipeline(db, str(src), str(out))
+        run = Orchestrator(db).start_run(p.id)
+
+        seen = {}
+        real_predict = langchain_client.llm_predict
+
+        def spy(prompt, system=None):
+            seen["calls"] = seen.get("calls", 0) + 1
+            if seen["calls"] == 5:
+                # rows 1-3 are sealed; the writer must already be queued
+                probe = SessionLocal()
+                try:
+                    seen["writer_queued"] = probe.scalar(
+                        select(models.BlockQueue.id).where(
+                            models.BlockQueue.pipeline_run_id == run.id,
+                            models.BlockQueue.block_id == writer.id,
+                        )
+                    ) is not None
+                finally:
+                    probe.close()
+            return real_predict(prompt, system)
+
+        monkeypatch.setattr(langchain_client, "llm_predict", spy)
+
+        wr = WorkerRunner(db, worker_id="w1")
+        for _ in range(10):
+            if not wr.process_next():
+                break
+
+        assert seen["writer_queued"] is True
+        db.refresh(run)
+        assert run.status == models.RunStatus.SUCCEEDED
+
+        segments = db.scalars(
+            select(models.StreamSegment).order_by(models.StreamSegment.seq)
+        ).all()
+        assert [s.rows for s in segments] == [3, 3, 2]
+        sent_path = Path(segments[-1].uri)
+        assert segments[-1].byte_end == sent_path.stat().st_size
+        assert out.read_bytes() == sent_path.read_bytes()
+
+        spec = export_pipeline_spec(db, p.id)
+        assert {"from": "sent", "to": "out", "mode": "stream"} in spec["edges"]
+        assert {"from": "csv", "to": "sent"} in spec["edges"]
+    finally:
+        db.close()
+
+
+def test_consumer_waits_for_a_producer_retry_without_holding_a_worker(tmp_path, monkeypatch):
+    src = tmp_path / "in.csv"
+    src.write_text(
+        "id,text\n" + "".join(f"{i},message {i}\n" for i in range(8)), encoding="utf-8"
+    )
+    out = tmp_path / "out.csv"
+    calls = []
+
+    def flaky(prompt, system=None):
+        calls.append(prompt)
+        if len(calls) == 5:
+            raise RuntimeError("provider 503")
+        return "POSITIVE"
+
+    monkeypatch.setattr(langchain_client, "llm_predict", flaky)
+    db = SessionLocal()
+    try:
+        p, writer = _make_pipeline(db, str(src), str(out))
+        sent = db.scalars(select(models.Block).where(models.Block.name == "sent")).one()
+        sent.config_json = {"segment_rows": 3, "retry": {"max_attempts": 2, "backoff_seconds": 0}}
+        # a consumer that polled instead of yielding would time out and fail
+        writer.config_json = {"output_path": str(out), "stream_timeout": 2}
+        db.commit()
+        run = Orchestrator(db).start_run(p.id)
+        wr = WorkerRunner(db, worker_id="w1")
+        while wr.process_next():
+            pass
+
+        db.refresh(run)
+        assert run.status == models.RunStatus.SUCCEEDED
+        br = db.scalars(
+            select(models.BlockRun).where(
+                models.BlockRun.pipeline_run_id == run.id,
+                models.BlockRun.block_id == writer.id,
+            )
+        ).one()
+        assert br.attempts == 1 and br.error_msg is None
+        paused = db.scalars(
+            select(models.LogRecord).where(models.LogRecord.message == "block_paused")
+        ).all()
+        assert paused
+        assert [r["id"] for r in csv.DictReader(out.open(encoding="utf-8"))] == [
+            str(i) for i in range(8)
+        ]
+    finally:
+        db.close()
@@ -1,3 +1,4 @@
+import json
 from datetime import datetime, timedelta
 from fastapi.testclient import TestClient
 from sqlalchemy import select
@@ -114,3 +115,47 @@ def test_webhook_failed_and_cleanup(monkeypatch):
             db2.close()
     finally:
         db.close()
+
+
+def test_timeline_stream_since_and_limit():
+    from datetime import datetime, timedelta
+
+    db = SessionLocal()
+    try:
+        p = _make_csv_pipeline(db, "unused.csv")
+        block = p.blocks[0]
+        t0 = datetime(2024, 1, 1)
+        run = models.PipelineRun(
+            pipeline_id=p.id, correlation_id="c", status=models.RunStatus.SUCCEEDED,
+            started_at=t0, finished_at=t0 + timedelta(minutes=10),
+        )
+        db.add(run)
+        db.flush()
+        for i in range(5):
+            db.add(models.LogRecord(
+                pipeline_run_id=run.id,
+                message=f"step_{i}",
+                created_at=t0 + timedelta(minutes=i + 1),
+                extra_json={"block_id": block.id},
+            ))
+        db.commit()
+
+        client = TestClient(app)
+        res = client.get(f"/runs/{run.id}/timeline/stream")
+        assert res.status_code == 200
+        assert res.headers["content-type"].startswith("application/x-ndjson")
+        events = [json.loads(line) for line in res.text.splitlines()]
+        assert [e["type"] for e in events] == (
+            ["run_started"] + [f"step_{i}" for i in range(5)] + ["run_finished"]
+        )
+        assert {e["block_name"] for e in events[1:-1]} == {"csv"}
+        assert events == client.get(f"/runs/{run.id}/timeline").json()
+
+        since = (t0 + timedelta(minutes=3)).isoformat()
+        res = client.get(f"/runs/{run.id}/timeline/stream", params={"since": since, "limit": 2})
+        assert [json.loads(l)["type"] for l in res.text.splitlines()] == [
+            "step_2", "step_3", "run_finished"
+        ]
+        assert client.get("/runs/999999/timeline/stream").status_code == 404
+    finally:
+        db.close()
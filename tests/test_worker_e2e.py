@@ -257,3 +257,71 @@ def test_e2e_llm_failure(monkeypatch, tmp_path):
         assert failed >= 1
     finally:
         db.close()
+
+
+def test_e2e_multi_classify_single_pass(monkeypatch, tmp_path):
+    from app.llm import langchain_client
+
+    calls = []
+    real_predict = langchain_client.llm_predict
+
+    def counting(prompt: str, system: str | None = None) -> str:
+        calls.append(system)
+        return real_predict(prompt, system=system)
+
+    monkeypatch.setattr(langchain_client, "llm_predict", counting)
+
+    input_csv = tmp_path / "input.csv"
+    input_csv.write_text(
+        "id,text\n1,good product and great support\n2,you are an idiot\n3,ok\n",
+        encoding="utf-8",
+    )
+    out_sent = tmp_path / "sentiment_output.csv"
+    out_tox = tmp_path / "toxicity_output.csv"
+    spec = {
+        "name": "e2e-multi",
+        "replace_if_exists": True,
+        "blocks": [
+            {"name": "csv", "type": "CSV_READER", "config": {"input_path": str(input_csv)}},
+            {"name": "classify", "type": "LLM_MULTI_CLASSIFY"},
+            {
+                "name": "w_sent",
+                "type": "CSV_WRITER",
+                "config": {"output_path": str(out_sent), "source_kind": "SENTIMENT_CSV"},
+            },
+            {
+                "name": "w_tox",
+                "type": "CSV_WRITER",
+                "config": {"output_path": str(out_tox), "source_kind": "TOXICITY_CSV"},
+            },
+        ],
+        "edges": [
+            {"from": "csv", "to": "classify"},
+            {"from": "classify", "to": "w_sent"},
+            {"from": "classify", "to": "w_tox"},
+        ],
+    }
+    client = TestClient(app)
+    r = client.post("/pipelines/import", json=spec)
+    assert r.status_code == 200, r.text
+    r2 = client.post(f"/pipelines/{r.json()['pipeline_id']}/run")
+    assert r2.status_code == 200, r2.text
+
+    db = SessionLocal()
+    try:
+        w = WorkerRunner(db, worker_id="e2e-multi")
+        while w.process_next():
+            pass
+    finally:
+        db.close()
+
+    # one model call per row covers both tasks
+    assert len(calls) == 3
+    with out_sent.open(newline="", encoding="utf-8") as f:
+        sent_rows = list(csv.DictReader(f))
+    with out_tox.open(newline="", encoding="utf-8") as f:
+        tox_rows = list(csv.DictReader(f))
+    assert list(sent_rows[0].keys()) == ["id", "text", "sentiment", "score"]
+    assert list(tox_rows[0].keys()) == ["id", "text", "toxicity"]
+    assert sent_rows[0]["sentiment"] == "POSITIVE"
+    assert tox_rows[1]["toxicity"] == "TOXIC"